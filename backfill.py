@@ -0,0 +1,330 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Contoh penggunaan:
+#   python backfill.py --bucket agi2_automatic_restore_bucket --prefix sea_uat_202408 --concurrency 2
+#   python backfill.py --manifest backfill.json --state-file backfill_state.json
+#
+# Format manifest (JSON list), field selain uri opsional:
+#   [{"id": "uat-0801", "uri": "gs://bucket/sea_uat_20240801.bak", "instance": "seacloud-clone",
+#     "depends_on": ["uat-0731"]}]
+
+
+class BackfillItem:
+    def __init__(self, item_id, bucket_name, file_name, size_bytes=0, instance_name=None, depends_on=()):
+        self.item_id = item_id
+        self.bucket_name = bucket_name
+        self.file_name = file_name
+        self.size_bytes = size_bytes
+        self.instance_name = instance_name
+        self.depends_on = list(depends_on)
+        self.done = threading.Event()
+        self.ok = False
+
+    def __repr__(self):
+        return f"{self.item_id} ({self.file_name})"
+
+
+def _split_uri(uri):
+    if not uri.startswith('gs://'):
+        raise ValueError(f"URI {uri} bukan gs://")
+    bucket_name, _, file_name = uri[len('gs://'):].partition('/')
+    return bucket_name, file_name
+
+
+# Fungsi untuk membaca daftar restore dari manifest JSON
+def load_manifest(path, storage_client):
+    with open(path) as f:
+        entries = json.load(f)
+    items = []
+    for entry in entries:
+        bucket_name, file_name = _split_uri(entry['uri'])
+        size = entry.get('size')
+        if size is None:
+            blob = storage_client.bucket(bucket_name).get_blob(file_name)
+            size = blob.size if blob else 0
+        items.append(BackfillItem(
+            entry.get('id', file_name), bucket_name, file_name, size,
+            entry.get('instance'), entry.get('depends_on', []),
+        ))
+    return items
+
+
+# Fungsi untuk membuat daftar restore dari semua file .bak/.gz dengan prefix tertentu
+def list_prefix(storage_client, bucket_name, prefix):
+    items = []
+    for blob in storage_client.list_blobs(bucket_name, prefix=prefix):
+        if blob.name.endswith(('.bak', '.gz')) and not blob.name.startswith('_'):
+            items.append(BackfillItem(blob.name, bucket_name, blob.name, blob.size or 0))
+    return items
+
+
+# Fungsi untuk menyusun rencana: urutan topologis global (tie-break nama file, sehingga
+# backup bertanggal diproses kronologis), lalu dikelompokkan per instance. Item tanpa
+# instance dibagi ke instance pool dengan total byte terkecil.
+def plan(items, instance_pool):
+    by_id = {item.item_id: item for item in items}
+    for item in items:
+        for dep in item.depends_on:
+            if dep not in by_id:
+                raise ValueError(f"{item} bergantung pada {dep} yang tidak ada di manifest")
+
+    ordered = []
+    state = {}
+
+    def visit(item, path):
+        if state.get(item.item_id) == 'done':
+            return
+        if state.get(item.item_id) == 'visiting':
+            raise ValueError(f"Dependency melingkar: {' -> '.join(path + [item.item_id])}")
+        state[item.item_id] = 'visiting'
+        for dep in sorted(item.depends_on):
+            visit(by_id[dep], path + [item.item_id])
+        state[item.item_id] = 'done'
+        ordered.append(item)
+
+    for item in sorted(items, key=lambda i: i.file_name):
+        visit(item, [])
+
+    load = {name: 0 for name in instance_pool}
+    for item in ordered:
+        if item.instance_name:
+            load[item.instance_name] = load.get(item.instance_name, 0) + item.size_bytes
+    for item in ordered:
+        if not item.instance_name:
+            item.instance_name = min(load, key=load.get)
+            load[item.instance_name] += item.size_bytes
+
+    groups = {}
+    for item in ordered:
+        groups.setdefault(item.instance_name, []).append(item)
+    return groups
+
+
+# State resume: id item yang sudah berhasil disimpan ke file setelah setiap restore
+class BackfillState:
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self.completed = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.completed = set(json.load(f).get('completed', []))
+
+    def mark_done(self, item_id):
+        with self._lock:
+            self.completed.add(item_id)
+            if self._path:
+                tmp_path = self._path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump({'completed': sorted(self.completed)}, f)
+                os.replace(tmp_path, self._path)
+
+
+# Progress dan throughput seluruh batch
+class Progress:
+    def __init__(self, items):
+        self._lock = threading.Lock()
+        self._total = len(items)
+        self._total_bytes = sum(item.size_bytes for item in items)
+        self._done = 0
+        self._failed = 0
+        self._done_bytes = 0
+        self._started = time.monotonic()
+
+    def update(self, item, ok):
+        with self._lock:
+            if ok:
+                self._done += 1
+                self._done_bytes += item.size_bytes
+            else:
+                self._failed += 1
+            elapsed = time.monotonic() - self._started
+            rate = self._done_bytes / elapsed if elapsed else 0
+            remaining = (self._total_bytes - self._done_bytes) / rate if rate else float('inf')
+            print(
+                f"[{self._done + self._failed}/{self._total}] {'OK' if ok else 'GAGAL'} {item} di {item.instance_name} | "
+                f"{self._done_bytes / 1024 ** 3:.1f}/{self._total_bytes / 1024 ** 3:.1f} GB | "
+                f"{rate / 1024 ** 2:.1f} MB/detik | sisa ~{remaining / 60:.0f} menit",
+                flush=True,
+            )
+
+    @property
+    def failed(self):
+        return self._failed
+
+
+def run_instance_group(app, instance_name, items, by_id, state, progress, keep_running):
+    pending = [item for item in items if not item.done.is_set()]
+    if not pending:
+        return
+
+    try:
+        # Instance dinyalakan sekali untuk seluruh kelompok
+        app.start_cloud_sql(instance_name, app.project)
+        app.wait_until_sql_ready(app.project, instance_name)
+
+        for item in pending:
+            for dep in item.depends_on:
+                by_id[dep].done.wait()
+            failed_deps = [dep for dep in item.depends_on if not by_id[dep].ok]
+            if failed_deps:
+                logging.error(f"{item} dilewati karena dependency gagal: {', '.join(failed_deps)}")
+                item.done.set()
+                progress.update(item, False)
+                continue
+            try:
+                app.run_restore_job(item, instance_name)
+                item.ok = True
+                state.mark_done(item.item_id)
+            except Exception as e:
+                logging.error(f"Restore {item} gagal: {e}")
+            finally:
+                item.done.set()
+                progress.update(item, item.ok)
+    except Exception as e:
+        logging.error(f"Kelompok instance {instance_name} gagal: {e}")
+    finally:
+        # Item yang belum diproses ditandai gagal agar item lain yang menunggunya tidak macet
+        for item in pending:
+            if not item.done.is_set():
+                item.done.set()
+                progress.update(item, False)
+        if not keep_running:
+            app.stop_cloud_sql(instance_name, app.project)
+
+
+# Fungsi untuk memasukkan item ke antrean RestoreScheduler (sebelum worker berjalan, agar
+# pilihan pertama sudah memakai shortest-job-first) dan mencetak perkiraan waktu selesai
+def schedule_items(app, items, instance_pool, run_job=None):
+    scheduler = app.create_restore_scheduler(instance_pool, run_job=run_job)
+    jobs = {scheduler.submit(item.bucket_name, item.file_name, item.size_bytes).job_id: item for item in items}
+    for job_id, finish in sorted(scheduler.predicted_completions().items(), key=lambda entry: entry[1]):
+        print(f"  - {jobs[job_id]} perkiraan selesai {finish:%Y-%m-%d %H:%M} UTC")
+    return scheduler, jobs
+
+
+# Fungsi untuk menjalankan item tanpa dependency dan tanpa instance tetap lewat RestoreScheduler
+# (shortest-job-first + aging di seluruh pool). Semua instance pool dinyalakan lebih dulu.
+def run_scheduled(app, items, instance_pool, state, progress, keep_running):
+    pending = [item for item in items if not item.done.is_set()]
+    if not pending:
+        return
+
+    def run_job(job, instance_name):
+        item = jobs[job.job_id]
+        item.instance_name = instance_name
+        try:
+            app.run_restore_job(item, instance_name)
+            item.ok = True
+            state.mark_done(item.item_id)
+        finally:
+            item.done.set()
+            progress.update(item, item.ok)
+
+    scheduler, jobs = schedule_items(app, pending, instance_pool, run_job=run_job)
+    try:
+        with ThreadPoolExecutor(max_workers=len(instance_pool)) as executor:
+            list(executor.map(lambda name: app.start_cloud_sql(name, app.project), instance_pool))
+            list(executor.map(lambda name: app.wait_until_sql_ready(app.project, name), instance_pool))
+
+        scheduler.start()
+        scheduler.join()
+    finally:
+        for item in pending:
+            if not item.done.is_set():
+                item.done.set()
+                progress.update(item, False)
+        if not keep_running:
+            for instance_name in instance_pool:
+                app.stop_cloud_sql(instance_name, app.project)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill restore banyak backup dari GCS ke Cloud SQL')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--manifest', help='File JSON berisi daftar restore')
+    source.add_argument('--prefix', help='Prefix object di bucket (pakai bersama --bucket)')
+    parser.add_argument('--bucket', help='Bucket sumber untuk --prefix')
+    parser.add_argument('--instance', action='append', help='Instance tujuan (bisa lebih dari satu)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Jumlah instance yang diproses paralel')
+    parser.add_argument('--state-file', default='backfill_state.json', help='File state untuk resume')
+    parser.add_argument('--keep-running', action='store_true', help='Jangan matikan instance setelah selesai')
+    parser.add_argument('--dry-run', action='store_true', help='Tampilkan rencana saja')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+    # main_final berisi client dan fungsi restore yang sama dengan Cloud Function
+    import main_final as app
+
+    if args.manifest:
+        items = load_manifest(args.manifest, app.storage_client)
+    else:
+        if not args.bucket:
+            parser.error('--prefix membutuhkan --bucket')
+        items = list_prefix(app.storage_client, args.bucket, args.prefix)
+
+    instance_pool = args.instance or app.RESTORE_INSTANCE_POOL
+    state = BackfillState(args.state_file)
+
+    # Item tanpa dependency dan tanpa instance tetap dijadwalkan oleh RestoreScheduler;
+    # selebihnya diproses berurutan per kelompok instance
+    if not any(item.depends_on or item.instance_name for item in items):
+        pool = instance_pool[:args.concurrency]
+        for item in items:
+            if item.item_id in state.completed:
+                item.ok = True
+                item.done.set()
+        print(f"{len(items)} restore dijadwalkan di {', '.join(pool)} (shortest-job-first + aging)")
+        if args.dry_run:
+            schedule_items(app, [item for item in items if not item.done.is_set()], pool)
+            return 0
+        progress = Progress([item for item in items if not item.done.is_set()])
+        run_scheduled(app, items, pool, state, progress, args.keep_running)
+        return 1 if progress.failed else 0
+
+    groups = plan(items, instance_pool)
+    by_id = {item.item_id: item for item in items}
+
+    for instance_name, group in groups.items():
+        print(f"{instance_name}: {len(group)} restore, {sum(i.size_bytes for i in group) / 1024 ** 3:.1f} GB")
+        for item in group:
+            resumed = ' (sudah selesai, dilewati)' if item.item_id in state.completed else ''
+            print(f"  - {item}{resumed}")
+    if args.dry_run:
+        return 0
+
+    # Dependency lintas instance bisa deadlock jika tidak semua kelompok instance berjalan bersamaan
+    cross_instance = any(
+        by_id[dep].instance_name != item.instance_name for item in items for dep in item.depends_on
+    )
+    if cross_instance and args.concurrency < len(groups):
+        parser.error(f'Ada dependency lintas instance, --concurrency minimal {len(groups)}')
+
+    # Item yang sudah selesai di run sebelumnya langsung ditandai berhasil
+    for item in items:
+        if item.item_id in state.completed:
+            item.ok = True
+            item.done.set()
+
+    progress = Progress([item for item in items if not item.done.is_set()])
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [
+            executor.submit(run_instance_group, app, instance_name, group, by_id, state, progress, args.keep_running)
+            for instance_name, group in groups.items()
+        ]
+        for future in futures:
+            future.result()
+
+    return 1 if progress.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,9 +6,8 @@ import logging
 from google.cloud import storage
 from google.auth import default
 from google.cloud.sql.connector import Connector
-from googleapiclient.discovery import build
 import pymysql
-import subprocess
+from sqladmin_client import SqlAdminClient
 
 # Inisialisasi logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
@@ -16,7 +15,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(mes
 # Inisialisasi client Google Cloud Storage dan SQL Admin API
 storage_client = storage.Client()
 credentials, project = default()
-sqladmin_service = build('sqladmin', 'v1', credentials=credentials)
+sqladmin_client = SqlAdminClient(credentials)
 
 # Nama bucket dan file
 BUCKET_NAME = 'aggibak'
@@ -72,22 +71,17 @@ def download_and_extract_gzip(bucket_name, file_name, destination_dir):
 # Fungsi untuk menghidupkan instance Cloud SQL
 def start_cloud_sql(instance_name):
     logging.info(f"Menyalakan Cloud SQL instance: {instance_name}")
-    subprocess.run(f"gcloud sql instances patch {instance_name} --activation-policy=ALWAYS", shell=True)
+    return sqladmin_client.set_activation_policy(project, instance_name, 'ALWAYS')
 
 # Fungsi untuk mematikan instance Cloud SQL
 def stop_cloud_sql(instance_name):
     logging.info(f"Mematikan Cloud SQL instance: {instance_name}")
-    subprocess.run(f"gcloud sql instances patch {instance_name} --activation-policy=NEVER", shell=True)
+    return sqladmin_client.set_activation_policy(project, instance_name, 'NEVER')
 
 # Fungsi untuk mengecek apakah Cloud SQL instance sudah siap
 def wait_until_sql_ready(project, instance_name):
     while True:
-        instance_status = sqladmin_service.instances().get(
-            project=project,
-            instance=instance_name
-        ).execute()
-
-        status = instance_status['state']
+        status = sqladmin_client.get_instance_state(project, instance_name, use_cache=False)
         logging.info(f"Status Cloud SQL instance '{instance_name}': {status}")
 
         if status == 'RUNNABLE':
@@ -4,18 +4,18 @@ import zipfile
 from google.cloud import storage
 from google.auth import default
 from google.cloud.sql.connector import Connector
-from googleapiclient.discovery import build
 import pymysql
-import subprocess
+from partitioned_load import PartitionedCsvLoader
+from typed_csv import TypedCsvParser
+from sqladmin_client import SqlAdminClient
 from airflow import DAG
 from airflow.operators.python import PythonOperator
-from airflow.operators.bash import BashOperator
 from datetime import datetime
 
 # Inisialisasi client Google Cloud Storage dan SQL Admin API
 storage_client = storage.Client()
 credentials, project = default()
-sqladmin_service = build('sqladmin', 'v1', credentials=credentials)
+sqladmin_client = SqlAdminClient(credentials)
 
 # Konfigurasi Airflow
 default_args = {
@@ -32,6 +32,14 @@ CLOUD_SQL_INSTANCE = 'storage-to-sql-server-2019'
 CLOUD_SQL_USER = 'sqlserver'
 CLOUD_SQL_PASSWORD = 'sqlserver'
 TEMP_DIR = '/tmp'
+TARGET_TABLE = 'nama_tabel'
+TARGET_COLUMNS = ['kolom1', 'kolom2']
+LOAD_WORKERS = 4  # Jumlah partisi/koneksi paralel saat load CSV
+LOAD_USE_STAGING = False  # True: load ke tabel staging per partisi lalu dipindah ke tabel target di akhir
+# Dengan LOAD_USE_STAGING = False, load yang gagal meninggalkan sebagian partisi di TARGET_TABLE;
+# kosongkan tabel sebelum task diulang
+# Tipe kolom CSV (int, float, bool, date, datetime, str); kolom yang tidak disebut ditebak dari sampel file
+TARGET_SCHEMA = {}
 
 # Fungsi untuk mengecek file baru di Cloud Storage
 def check_new_file(**kwargs):
@@ -69,49 +77,44 @@ def upload_to_cloud_sql(**kwargs):
         extracted_files = [kwargs['ti'].xcom_pull(key='file_name')]
 
     connector = Connector()
-    conn = connector.connect(
-        INSTANCE_CONNECTION_NAME,
-        "pymysql",
-        user=CLOUD_SQL_USER,
-        password=CLOUD_SQL_PASSWORD,
-        db=DATABASE_NAME
-    )
 
+    # Setiap worker membuka koneksinya sendiri
+    def connect():
+        return connector.connect(
+            INSTANCE_CONNECTION_NAME,
+            "pymysql",
+            user=CLOUD_SQL_USER,
+            password=CLOUD_SQL_PASSWORD,
+            db=DATABASE_NAME
+        )
+
+    # File CSV dibagi per rentang byte dan di-load paralel dengan beberapa koneksi.
+    # Setiap partisi di-parse per blok menjadi kolom bertipe (pyarrow/numpy jika tersedia).
+    parser = TypedCsvParser(TARGET_COLUMNS, schema=TARGET_SCHEMA)
+    loader = PartitionedCsvLoader(
+        connect, TARGET_TABLE, TARGET_COLUMNS, workers=LOAD_WORKERS, use_staging=LOAD_USE_STAGING,
+        rows_from_partition=parser.batches
+    )
     try:
-        with conn.cursor() as cursor:
-            for file_name in extracted_files:
-                file_path = os.path.join(TEMP_DIR, file_name)
-                with open(file_path, 'r') as f:
-                    data = f.read()
-
-                # Assume CSV, split by comma
-                for line in data.splitlines():
-                    values = line.split(',')
-                    cursor.execute(
-                        "INSERT INTO nama_tabel (kolom1, kolom2) VALUES (%s, %s)", (values[0], values[1])
-                    )
-            conn.commit()
-            print(f"File {file_name} berhasil dimasukkan ke Cloud SQL")
+        for file_name in extracted_files:
+            file_path = os.path.join(TEMP_DIR, file_name)
+            result = loader.load(file_path)
+            print(f"File {file_name} berhasil dimasukkan ke Cloud SQL ({result['rows']} baris)")
     finally:
-        conn.close()
+        connector.close()
 
 # Fungsi untuk menghidupkan Cloud SQL
 def start_cloud_sql():
-    subprocess.run(f"gcloud sql instances patch {CLOUD_SQL_INSTANCE} --activation-policy=ALWAYS", shell=True)
+    return sqladmin_client.set_activation_policy(project, CLOUD_SQL_INSTANCE, 'ALWAYS')
 
 # Fungsi untuk mematikan Cloud SQL
 def stop_cloud_sql():
-    subprocess.run(f"gcloud sql instances patch {CLOUD_SQL_INSTANCE} --activation-policy=NEVER", shell=True)
+    return sqladmin_client.set_activation_policy(project, CLOUD_SQL_INSTANCE, 'NEVER')
 
 # Fungsi untuk mengecek apakah Cloud SQL siap
 def wait_until_sql_ready():
     while True:
-        instance_status = sqladmin_service.instances().get(
-            project=project,
-            instance=CLOUD_SQL_INSTANCE
-        ).execute()
-
-        status = instance_status['state']
+        status = sqladmin_client.get_instance_state(project, CLOUD_SQL_INSTANCE, use_cache=False)
         print(f"Status Cloud SQL instance '{CLOUD_SQL_INSTANCE}': {status}")
 
         if status == 'RUNNABLE':
@@ -136,9 +139,9 @@ with DAG('gcs_to_cloud_sql_dag', default_args=default_args, schedule_interval='@
     )
 
     # Task 3: Start Cloud SQL instance
-    start_sql_task = BashOperator(
+    start_sql_task = PythonOperator(
         task_id='start_cloud_sql',
-        bash_command=f"gcloud sql instances patch {CLOUD_SQL_INSTANCE} --activation-policy=ALWAYS"
+        python_callable=start_cloud_sql
     )
 
     # Task 4: Tunggu sampai Cloud SQL siap
@@ -155,9 +158,9 @@ with DAG('gcs_to_cloud_sql_dag', default_args=default_args, schedule_interval='@
     )
 
     # Task 6: Stop Cloud SQL instance
-    stop_sql_task = BashOperator(
+    stop_sql_task = PythonOperator(
         task_id='stop_cloud_sql',
-        bash_command=f"gcloud sql instances patch {CLOUD_SQL_INSTANCE} --activation-policy=NEVER"
+        python_callable=stop_cloud_sql
     )
 
     # Menentukan urutan eksekusi task
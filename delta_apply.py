@@ -0,0 +1,228 @@
+import gzip
+import hashlib
+import io
+import json
+import logging
+import re
+import time
+from google.api_core.exceptions import NotFound
+from tsql import fetch_all, quote_string, quote_table
+
+# Lokasi fingerprint per tabel dari refresh sebelumnya
+DELTA_STATE_PREFIX = '_delta'
+STATEMENTS_PER_BATCH = 200  # Jumlah statement INSERT yang dikirim dalam satu round trip
+
+_NAME = r'((?:\[[^\]]+\]|"[^"]+"|\w+)(?:\s*\.\s*(?:\[[^\]]+\]|"[^"]+"|\w+))*)'
+INSERT_RE = re.compile(r'^\s*INSERT\s+(?:INTO\s+)?' + _NAME, re.IGNORECASE)
+IDENTITY_RE = re.compile(r'^\s*SET\s+IDENTITY_INSERT\s+' + _NAME, re.IGNORECASE)
+CREATE_TABLE_RE = re.compile(r'^\s*CREATE\s+TABLE\s+' + _NAME, re.IGNORECASE)
+GO_RE = re.compile(r'^\s*GO\s*$', re.IGNORECASE)
+
+OTHER = '__other__'  # Statement yang bukan milik tabel tertentu (SET, index, view, dll.)
+
+# Tabel yang punya foreign key ke salah satu tabel yang di-load ulang
+REFERENCING_TABLES_QUERY = """
+SELECT DISTINCT s.name, t.name
+FROM sys.foreign_keys fk
+JOIN sys.tables t ON t.object_id = fk.parent_object_id
+JOIN sys.schemas s ON s.schema_id = t.schema_id
+WHERE fk.referenced_object_id IN ({object_ids})
+"""
+
+
+# Fungsi untuk menormalkan nama tabel, contoh: [dbo].[Orders] -> dbo.orders
+def normalize_table(name):
+    parts = [p.strip().strip('[]"') for p in re.split(r'\s*\.\s*', name.strip())]
+    if len(parts) == 1:
+        parts.insert(0, 'dbo')
+    return '.'.join(parts[-2:]).lower()
+
+
+# Fungsi untuk membaca dump SQL (.gz) secara streaming dan menghasilkan
+# (jenis, tabel, statement). jenis: 'data' (INSERT / IDENTITY_INSERT), 'ddl' (CREATE TABLE), 'other'.
+# Statement dipisah oleh baris GO dan oleh baris yang diawali INSERT / SET IDENTITY_INSERT.
+def iter_statements(binary_stream, encoding='utf-8'):
+    text = io.TextIOWrapper(gzip.GzipFile(fileobj=binary_stream), encoding=encoding, errors='replace')
+    current = []
+
+    def flush():
+        statement = ''.join(current).strip()
+        current.clear()
+        if not statement:
+            return None
+        for kind, regex in (('data', INSERT_RE), ('data', IDENTITY_RE), ('ddl', CREATE_TABLE_RE)):
+            match = regex.match(statement)
+            if match:
+                return kind, normalize_table(match.group(1)), statement
+        return 'other', OTHER, statement
+
+    for line in text:
+        if GO_RE.match(line):
+            item = flush()
+            if item:
+                yield item
+            continue
+        if current and (INSERT_RE.match(line) or IDENTITY_RE.match(line)):
+            item = flush()
+            if item:
+                yield item
+        current.append(line)
+    item = flush()
+    if item:
+        yield item
+
+
+# Fungsi untuk menghitung fingerprint konten per tabel (data dan DDL dipisah)
+def fingerprint_dump(open_stream):
+    data_hashes = {}
+    ddl_hashes = {}
+    ddl_statements = {}
+    with open_stream() as stream:
+        for kind, table, statement in iter_statements(stream):
+            target = data_hashes if kind == 'data' else ddl_hashes
+            target.setdefault(table, hashlib.sha256()).update(statement.encode('utf-8') + b'\0')
+            if kind == 'ddl':
+                ddl_statements.setdefault(table, []).append(statement)
+            elif kind == 'data':
+                # Tabel tanpa CREATE TABLE di dump tetap tercatat
+                ddl_hashes.setdefault(table, hashlib.sha256())
+    return {
+        'data': {table: h.hexdigest() for table, h in data_hashes.items()},
+        'ddl': {table: h.hexdigest() for table, h in ddl_hashes.items()},
+    }, ddl_statements
+
+
+# Refresh delta untuk dump SQL .gz: hanya tabel yang isinya berubah yang di-truncate
+# dan di-load ulang, database tidak di-drop. Jika skema (DDL atau object lain) berubah,
+# apply() mengembalikan 'full' dan pemanggil harus melakukan import penuh.
+class DeltaApplier:
+    def __init__(self, storage_client, state_bucket, database_name, engine, open_stream):
+        self._storage_client = storage_client
+        self._state_bucket = state_bucket
+        self._database_name = database_name
+        self._engine = engine  # Engine yang terhubung ke database target
+        self._open_stream = open_stream  # Fungsi yang membuka stream biner dump .gz
+        self._fingerprints = None
+        self._ddl_statements = None
+
+    def _state_blob(self):
+        return self._storage_client.bucket(self._state_bucket).blob(f"{DELTA_STATE_PREFIX}/{self._database_name}.json")
+
+    def load_previous(self):
+        try:
+            return json.loads(self._state_blob().download_as_bytes())
+        except NotFound:
+            return None
+
+    def fingerprints(self):
+        if self._fingerprints is None:
+            started = time.monotonic()
+            self._fingerprints, self._ddl_statements = fingerprint_dump(self._open_stream)
+            logging.info(
+                f"Fingerprint {len(self._fingerprints['ddl'])} tabel dalam {time.monotonic() - started:.1f} detik"
+            )
+        return self._fingerprints
+
+    # Fungsi untuk menyimpan fingerprint sebagai acuan refresh berikutnya
+    def save_fingerprints(self):
+        self._state_blob().upload_from_string(json.dumps(self.fingerprints()), content_type='application/json')
+
+    # Fungsi untuk menentukan tabel yang berubah. Mengembalikan None jika butuh import penuh.
+    def plan(self):
+        previous = self.load_previous()
+        current = self.fingerprints()
+        if previous is None:
+            logging.warning("Belum ada fingerprint sebelumnya, perlu import penuh")
+            return None
+        if current['ddl'] != previous['ddl']:
+            changed_ddl = {t for t in current['ddl'].keys() | previous['ddl'].keys()
+                           if current['ddl'].get(t) != previous['ddl'].get(t)}
+            logging.warning(f"Skema berubah ({', '.join(sorted(changed_ddl))}), perlu import penuh")
+            return None
+        tables = current['ddl'].keys()
+        return sorted(t for t in tables if current['data'].get(t) != previous['data'].get(t))
+
+    def _execute_batch(self, connection, statements):
+        if statements:
+            connection.exec_driver_sql('\n'.join(statements))
+            statements.clear()
+
+    def _clear_table(self, connection, table):
+        schema, name = table.split('.', 1)
+        try:
+            connection.exec_driver_sql(f"TRUNCATE TABLE {quote_table(schema, name)}")
+        except Exception:
+            # TRUNCATE tidak boleh untuk tabel yang direferensikan foreign key
+            connection.exec_driver_sql(f"DELETE FROM {quote_table(schema, name)}")
+
+    # Fungsi untuk menentukan tabel yang constraint-nya dimatikan selama load: tabel yang
+    # berubah (FK keluar) dan tabel yang mereferensikannya (FK masuk), bukan semua tabel
+    def _constraint_tables(self, connection, changed):
+        object_ids = ', '.join(
+            f"OBJECT_ID({quote_string(quote_table(*table.split('.', 1)))})" for table in changed
+        )
+        rows = fetch_all(connection, REFERENCING_TABLES_QUERY.format(object_ids=object_ids))
+        return sorted(set(changed) | {f"{schema}.{name}".lower() for schema, name in rows})
+
+    def _set_constraints(self, connection, tables, check):
+        action = 'WITH CHECK CHECK' if check else 'NOCHECK'
+        connection.exec_driver_sql('\n'.join(
+            f"ALTER TABLE {quote_table(*table.split('.', 1))} {action} CONSTRAINT ALL" for table in tables
+        ))
+        connection.commit()
+
+    def apply(self):
+        changed = self.plan()
+        if changed is None:
+            return 'full'
+        if not changed:
+            logging.info("Tidak ada tabel yang berubah, refresh dilewati")
+            self.save_fingerprints()
+            return 'applied'
+
+        started = time.monotonic()
+        changed_set = set(changed)
+        logging.info(f"{len(changed)} tabel berubah: {', '.join(changed)}")
+
+        with self._engine.connect() as connection:
+            constraint_tables = self._constraint_tables(connection, changed)
+            self._set_constraints(connection, constraint_tables, check=False)
+            try:
+                # Tabel berubah yang tidak punya data lagi cukup dikosongkan
+                loaded = set()
+                for table in changed_set - self.fingerprints()['data'].keys():
+                    self._clear_table(connection, table)
+                connection.commit()
+
+                current_table = None
+                pending = []
+                with self._open_stream() as stream:
+                    for kind, table, statement in iter_statements(stream):
+                        if kind != 'data' or table not in changed_set:
+                            continue
+                        if table != current_table:
+                            # Satu transaksi per tabel: truncate + load lalu commit
+                            self._execute_batch(connection, pending)
+                            connection.commit()
+                            current_table = table
+                            if table not in loaded:
+                                self._clear_table(connection, table)
+                                loaded.add(table)
+                        pending.append(statement)
+                        if len(pending) >= STATEMENTS_PER_BATCH:
+                            self._execute_batch(connection, pending)
+                    self._execute_batch(connection, pending)
+                    connection.commit()
+            except Exception:
+                connection.rollback()
+                # Error pengaktifan constraint hanya dicatat agar error asli tidak tertutup
+                try:
+                    self._set_constraints(connection, constraint_tables, check=True)
+                except Exception as e:
+                    logging.error(f"Gagal mengaktifkan kembali constraint setelah refresh gagal: {e}")
+                raise
+            self._set_constraints(connection, constraint_tables, check=True)
+
+        self.save_fingerprints()
+        logging.info(f"Refresh delta selesai dalam {time.monotonic() - started:.1f} detik")
+        return 'applied'
@@ -0,0 +1,193 @@
+import gzip
+import json
+import logging
+import queue
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from verify_restore import build_manifest, manifest_name
+
+COPY_CHUNK = 16 * 1024 * 1024
+# BAK yang akan dikompresi diexport dulu ke nama sementara yang unik, agar tidak menimpa
+# export BAK tanpa kompresi dengan nama yang sama. Prefix '_' dilewati hello_gcs.
+EXPORT_TMP_PREFIX = '_export_tmp'
+
+
+# Fungsi untuk membuat nama file export dengan format yang dibaca check_file_name:
+# <region>_<environment>_<YYYYMMDD>.bak (BAK), .bak.gz (BAK terkompresi) atau .gz (SQL dump)
+def export_file_name(region, environment, file_type='BAK', day=None, compress=False):
+    day = day or datetime.now(timezone.utc)
+    base = f"{region.lower()}_{environment.lower()}_{day:%Y%m%d}"
+    if file_type == 'SQL':
+        return f"{base}.gz"
+    return f"{base}.bak.gz" if compress else f"{base}.bak"
+
+
+# Fungsi untuk menentukan tipe import dari nama file backup: 'BAK' (.bak / .bak.gz),
+# 'SQL' (.gz selain .bak.gz) atau None jika format tidak dikenal
+def backup_file_type(file_name):
+    if file_name.endswith(('.bak', '.bak.gz')):
+        return 'BAK'
+    if file_name.endswith('.gz'):
+        return 'SQL'
+    return None
+
+
+class ExportJob:
+    def __init__(self, instance_name, database, region, environment, file_type='BAK',
+                 striped=False, stripe_count=None, compress=False):
+        if file_type not in ('BAK', 'SQL'):
+            raise ValueError(f"Tipe export {file_type} tidak didukung (BAK atau SQL)")
+        if striped and (file_type != 'BAK' or compress):
+            raise ValueError("Export striped hanya untuk BAK tanpa kompresi")
+        self.instance_name = instance_name
+        self.database = database
+        self.region = region
+        self.environment = environment
+        self.file_type = file_type
+        self.striped = striped
+        self.stripe_count = stripe_count
+        self.compress = compress
+        self.file_name = None
+        self.seconds = None
+        self.error = None
+
+    def __repr__(self):
+        return f"ExportJob({self.instance_name}/{self.database}, {self.file_type})"
+
+
+# Pipeline export Cloud SQL -> GCS (kebalikan alur restore).
+# - setiap instance punya antrean sendiri karena Cloud SQL hanya menjalankan satu operasi
+#   import/export per instance; antrean instance yang berbeda berjalan paralel
+# - offload=True memakai serverless export sehingga instance yang melayani tidak terbebani
+# - SQL dump ditulis ke .gz (dikompresi Cloud SQL); BAK opsional dikompresi ke .bak.gz
+#   dari object sementara di _export_tmp/ (streaming GCS -> GCS), dan export striped ditulis
+#   ke folder <nama>.bak
+# - manifest verifikasi (row count + checksum) opsional ditulis ke _manifests/<nama file>.manifest.json
+#
+# export_bucket sebaiknya bukan bucket trigger restore, agar hasil export tidak langsung
+# direstore lagi oleh hello_gcs.
+class ExportPipeline:
+    def __init__(self, admin_client, project, storage_client, export_bucket, offload=True, manifest_connect=None):
+        self._admin_client = admin_client
+        self._project = project
+        self._storage_client = storage_client
+        self._export_bucket = export_bucket
+        self._offload = offload
+        # manifest_connect(instance_name, database) -> engine; None jika manifest tidak dibuat
+        self._manifest_connect = manifest_connect
+        self._queues = {}
+        self._workers = []
+        self._done = []
+        self._names = set()
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        # Nama file hanya memuat region, environment dan tanggal, jadi tidak boleh ada dua
+        # export dengan kombinasi yang sama dalam satu hari. Nama disimpan di job agar export
+        # yang baru jalan setelah pergantian hari tetap memakai nama yang sudah dicadangkan.
+        name = export_file_name(job.region, job.environment, job.file_type, compress=job.compress)
+        with self._lock:
+            if name in self._names:
+                raise ValueError(f"Export lain sudah memakai nama {name}")
+            self._names.add(name)
+            job.file_name = name
+            if job.instance_name not in self._queues:
+                self._queues[job.instance_name] = queue.Queue()
+                worker = threading.Thread(target=self._worker, args=(self._queues[job.instance_name],), daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            self._queues[job.instance_name].put(job)
+        logging.info(f"{job} masuk antrean {job.instance_name}")
+        return job
+
+    def _worker(self, jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            try:
+                self.run_job(job)
+            except Exception as e:
+                job.error = e
+                logging.error(f"Export {job} gagal: {e}")
+            finally:
+                with self._lock:
+                    self._done.append(job)
+
+    # Fungsi untuk menunggu semua export selesai lalu menghentikan worker
+    def join(self):
+        with self._lock:
+            queues = list(self._queues.values())
+        for jobs in queues:
+            jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+        return list(self._done)
+
+    def run_job(self, job):
+        started = time.monotonic()
+        file_name = job.file_name or export_file_name(
+            job.region, job.environment, job.file_type, compress=job.compress
+        )
+        if job.compress:
+            exported_name = f"{EXPORT_TMP_PREFIX}/{uuid.uuid4().hex}.bak"
+        else:
+            exported_name = file_name
+        uri = f"gs://{self._export_bucket}/{exported_name}"
+        logging.warning(f"=========== Export {job.instance_name}/{job.database} -> {uri}")
+
+        if job.file_type == 'SQL':
+            operation = self._admin_client.export_sql(
+                self._project, job.instance_name, job.database, uri, offload=self._offload
+            )
+        else:
+            operation = self._admin_client.export_bak(
+                self._project, job.instance_name, job.database, uri,
+                striped=job.striped, stripe_count=job.stripe_count, offload=self._offload
+            )
+        self._admin_client.wait_for_operation(self._project, operation)
+
+        job.file_name = file_name
+        if job.compress:
+            try:
+                self._compress(exported_name, job.file_name)
+            finally:
+                # Object sementara tidak boleh tertinggal walaupun kompresi gagal
+                self._delete_quietly(exported_name)
+
+        if self._manifest_connect:
+            self._write_manifest(job)
+
+        job.seconds = round(time.monotonic() - started, 1)
+        logging.warning(f"=========== Export {job.instance_name}/{job.database} selesai: {job.file_name} ({job.seconds} detik)")
+        return job
+
+    # Fungsi untuk kompresi streaming object export ke .gz
+    def _compress(self, source_name, target_name):
+        bucket = self._storage_client.bucket(self._export_bucket)
+        source = bucket.blob(source_name)
+        with source.open('rb', chunk_size=COPY_CHUNK) as f_in:
+            with bucket.blob(target_name).open('wb', chunk_size=COPY_CHUNK) as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out, COPY_CHUNK)
+
+    def _delete_quietly(self, name):
+        try:
+            self._storage_client.bucket(self._export_bucket).blob(name).delete()
+        except Exception as e:
+            logging.error(f"Gagal menghapus object sementara {name}: {e}")
+
+    # Manifest diambil dari database sumber setelah export; instance hasil restore tidak
+    # menerima tulisan lain, jadi isinya sama dengan isi file export
+    def _write_manifest(self, job):
+        engine = self._manifest_connect(job.instance_name, job.database)
+        try:
+            manifest = build_manifest(engine, job.database)
+        finally:
+            engine.dispose()
+        self._storage_client.bucket(self._export_bucket).blob(manifest_name(job.file_name)).upload_from_string(
+            json.dumps(manifest), content_type='application/json'
+        )
@@ -0,0 +1,195 @@
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import sqlalchemy
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from googleapiclient.errors import HttpError
+from tsql import quote_name, autocommit_connection
+
+# Lokasi pointer instance aktif per environment di bucket
+CLONE_STATE_BLOB = '_clones/environments.json'
+CLONE_CONFLICT_RETRIES = 10  # Clone ditolak (409) selama source sedang menjalankan operasi lain
+CLONE_CONFLICT_WAIT = 30
+
+
+# Refresh banyak environment dari satu golden instance: backup di-restore dan diverifikasi
+# sekali di golden, lalu setiap environment dibuat ulang dengan instances().clone secara paralel.
+# Nama instance Cloud SQL tidak bisa diubah dan tidak bisa langsung dipakai lagi setelah
+# dihapus, jadi setiap refresh membuat instance baru <instance_prefix>-<waktu>. Instance aktif
+# per environment dicatat di CLONE_STATE_BLOB (dan label 'environment'), generasi sebelumnya
+# dihapus setelah clone baru siap.
+#
+# environments: daftar dict {'name', 'instance_prefix', opsional 'database' (nama database di
+# environment), 'users' ([{'name', 'password'}]), 'settings' (patch settings, contoh tier),
+# 'keep_previous'}
+#
+# Clone mewarisi tier golden saat clone dibuat. Tanpa 'tier' di settings environment, clone
+# dikembalikan ke base_tier (tier golden di luar scale-up restore; default tier golden saat ini).
+class GoldenCloner:
+    def __init__(self, admin_client, project, golden_instance, storage_client, state_bucket, connect, workers=4,
+                 base_tier=None):
+        self._admin_client = admin_client
+        self._project = project
+        self._golden_instance = golden_instance
+        self._storage_client = storage_client
+        self._state_bucket = state_bucket
+        self._connect = connect  # connect(connection_name) -> engine ke database master
+        self._workers = workers
+        self._base_tier = base_tier
+
+    # ---- Pointer environment -> instance (read-modify-write dengan precondition generation) ----
+
+    def _blob(self):
+        return self._storage_client.bucket(self._state_bucket).blob(CLONE_STATE_BLOB)
+
+    def load_state(self):
+        blob = self._blob()
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            return {}, 0
+        return json.loads(data), blob.generation
+
+    def _set_active(self, environment, entry, attempts=5):
+        for _ in range(attempts):
+            state, generation = self.load_state()
+            previous = state.get(environment)
+            state[environment] = entry
+            try:
+                self._blob().upload_from_string(
+                    json.dumps(state), content_type='application/json', if_generation_match=generation
+                )
+                return previous
+            except PreconditionFailed:
+                # Environment lain selesai di saat yang sama, ulangi dari awal
+                time.sleep(0.5)
+        raise RuntimeError(f"Gagal memperbarui pointer environment {environment} karena konflik penulisan berulang")
+
+    # ---- Langkah per environment ----
+
+    def _clone(self, destination):
+        for attempt in range(CLONE_CONFLICT_RETRIES):
+            try:
+                return self._admin_client.clone_instance(self._project, self._golden_instance, destination)
+            except HttpError as e:
+                if e.resp.status != 409 or attempt == CLONE_CONFLICT_RETRIES - 1:
+                    raise
+                logging.warning(f"=========== Clone {destination} menunggu operasi lain di {self._golden_instance}")
+                time.sleep(CLONE_CONFLICT_WAIT)
+
+    def _wait_runnable(self, instance_name):
+        while self._admin_client.get_instance_state(self._project, instance_name, use_cache=False) != 'RUNNABLE':
+            time.sleep(10)
+
+    def _golden_base_tier(self):
+        if self._base_tier is None:
+            self._base_tier = self._admin_client.get_instance(
+                self._project, self._golden_instance, use_cache=False
+            )['settings']['tier']
+        return self._base_tier
+
+    def _patch(self, instance_name, environment):
+        settings = dict(environment.get('settings', {}))
+        settings.setdefault('tier', self._golden_base_tier())
+        settings['userLabels'] = {
+            **settings.get('userLabels', {}),
+            'environment': environment['name'],
+            'golden-source': self._golden_instance,
+        }
+        operation = self._admin_client.patch_instance(self._project, instance_name, body={'settings': settings})
+        self._admin_client.wait_for_operation(self._project, operation)
+        self._wait_runnable(instance_name)
+
+    def _sync_users(self, instance_name, users):
+        existing = {user['name'] for user in self._admin_client.list_users(self._project, instance_name)}
+        for user in users:
+            if user['name'] in existing:
+                operation = self._admin_client.update_user(self._project, instance_name, user['name'], user['password'])
+            else:
+                operation = self._admin_client.insert_user(self._project, instance_name, user['name'], user['password'])
+            self._admin_client.wait_for_operation(self._project, operation)
+
+    def _rename_database(self, instance_name, connection_name, source_database, target_database):
+        engine = self._connect(connection_name)
+        try:
+            with autocommit_connection(engine) as connection:
+                connection.execute(sqlalchemy.text(
+                    f"ALTER DATABASE {quote_name(source_database)} MODIFY NAME = {quote_name(target_database)}"
+                ))
+        finally:
+            engine.dispose()
+        self._admin_client.invalidate(self._project, instance_name, instance=False)
+
+    def refresh(self, environment, source_database):
+        started = time.monotonic()
+        # Detik + suffix acak: nama instance yang baru dihapus tidak bisa dipakai lagi
+        destination = (
+            f"{environment['instance_prefix']}-{datetime.now(timezone.utc):%Y%m%d%H%M%S}-{uuid.uuid4().hex[:4]}"
+        )
+        logging.warning(f"=========== Clone {self._golden_instance} -> {destination} ({environment['name']})")
+
+        created = False
+        try:
+            operation = self._clone(destination)
+            created = True
+            self._admin_client.wait_for_operation(self._project, operation)
+            self._wait_runnable(destination)
+
+            self._patch(destination, environment)
+            self._sync_users(destination, environment.get('users', []))
+
+            instance = self._admin_client.get_instance(self._project, destination, use_cache=False)
+            target_database = environment.get('database') or source_database
+            if target_database != source_database:
+                self._rename_database(destination, instance['connectionName'], source_database, target_database)
+        except Exception:
+            # Clone setengah jadi tidak dipakai, hapus agar tidak menambah biaya
+            if created:
+                try:
+                    self._admin_client.delete_instance(self._project, destination)
+                except Exception as e:
+                    logging.error(f"Gagal menghapus clone {destination}: {e}")
+            raise
+
+        entry = {
+            'instance': destination,
+            'connection_name': instance['connectionName'],
+            'database': target_database,
+            'refreshed_at': datetime.now(timezone.utc).isoformat(),
+        }
+        previous = self._set_active(environment['name'], entry)
+        if previous and previous['instance'] != destination and not environment.get('keep_previous'):
+            logging.warning(f"=========== Menghapus generasi sebelumnya {previous['instance']} ({environment['name']})")
+            try:
+                self._admin_client.delete_instance(self._project, previous['instance'])
+            except Exception as e:
+                logging.error(f"Gagal menghapus instance lama {previous['instance']}: {e}")
+
+        entry['seconds'] = round(time.monotonic() - started, 1)
+        logging.warning(f"=========== Environment {environment['name']} siap di {destination} ({entry['seconds']} detik)")
+        return entry
+
+    # Fungsi untuk refresh semua environment secara paralel. Environment yang gagal tidak
+    # membatalkan yang lain; error dilempar setelah semuanya selesai.
+    def refresh_all(self, environments, source_database):
+        # Base tier dibaca sekali sebelum clone paralel dimulai
+        self._golden_base_tier()
+        results = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = {
+                environment['name']: executor.submit(self.refresh, environment, source_database)
+                for environment in environments
+            }
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    logging.error(f"Refresh environment {name} gagal: {e}")
+                    errors[name] = e
+        if errors:
+            raise RuntimeError(f"Refresh environment gagal: {', '.join(errors)}")
+        return results
@@ -1,17 +1,22 @@
 import os
-import gzip
-import shutil
 import logging
-import subprocess
 import time
 import functions_framework 
 from google.cloud import storage
 from google.auth import default 
-from googleapiclient.discovery import build 
-from googleapiclient.errors import HttpError
 from google.cloud.sql.connector import Connector, IPTypes
 import sqlalchemy
 import pytds
+from sqladmin_client import SqlAdminClient
+from pipeline import StageGraph
+from staging_cache import StagingCache
+from restore_tuning import read_file_list, bak_restore_options, TuningHistory
+from restore_scheduler import ImportRateHistory
+from restore_progress import RestoreProgressMonitor, AdaptiveDeadline, GcsProgressSink, wait_for_import
+from staging_planner import (
+    StagingPlanner, StagingHistory, ResourceProfiler, extract_in_memory, extract_via_disk, extract_to_gcs,
+    MEMORY, LOCAL_DISK, GCS_STREAM, DIRECT, STAGING_PREFIX
+)
 
 # Inisialisasi logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
@@ -19,16 +24,27 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(mes
 # Inisialisasi client Google Cloud Storage dan SQL Admin API
 storage_client = storage.Client()
 credentials, project = default()
-sqladmin_service = build('sqladmin', 'v1', credentials=credentials)
+sqladmin_client = SqlAdminClient(credentials)
 
 # Nama bucket dan file
 BUCKET_NAME = 'aggibak'
 DATABASE_NAME = 'master'
+TARGET_DATABASE = 'coba1'  # Database hasil restore
 INSTANCE_CONNECTION_NAME = 'poc-arthagraha:asia-southeast2:seacloud'
 CLOUD_SQL_INSTANCE = 'seacloud'
 CLOUD_SQL_USER = 'sqlserver'
 CLOUD_SQL_PASSWORD = '1234'
 TEMP_DIR = '/tmp'  # Direktori sementara untuk unzip file
+RESTORE_TUNING = os.environ.get('RESTORE_TUNING', 'false').lower() == 'true'  # Opsi transfer RESTORE dari daftar file backup
+
+STAGING_CACHE = os.environ.get('STAGING_CACHE', 'false').lower() == 'true'  # Cache hasil ekstraksi per object generation
+PROFILE_PYTHON_HEAP = os.environ.get('PROFILE_PYTHON_HEAP', 'false').lower() == 'true'  # Ukur puncak heap Python (tracemalloc) per tahap
+
+tuning_history = TuningHistory(storage_client, BUCKET_NAME)
+staging_cache = StagingCache(storage_client, BUCKET_NAME)
+import_rates = ImportRateHistory(storage_client, BUCKET_NAME)
+progress_sink = GcsProgressSink(storage_client, BUCKET_NAME)
+staging_history = StagingHistory(storage_client, BUCKET_NAME)
 
 # # Fungsi untuk memastikan direktori ada
 # def ensure_directory_exists(directory):
@@ -36,7 +52,21 @@ TEMP_DIR = '/tmp'  # Direktori sementara untuk unzip file
 #         os.makedirs(directory)
 #         logging.info(f"Directory {directory} created.")
 
-def download_and_extract_gzip(bucket_name, file_name, destination_dir):
+# Fungsi untuk memilih strategi staging dari ukuran object, rasio kompresi, memori dan disk yang tersedia
+def plan_staging(bucket_name, file_name):
+    blob = storage_client.bucket(bucket_name).get_blob(file_name)
+    if blob is None:
+        raise FileNotFoundError(f"gs://{bucket_name}/{file_name} tidak ditemukan")
+    planner = StagingPlanner(TEMP_DIR, history=staging_history)
+    return planner.plan(blob, needs_extraction=file_name.endswith('.gz'))
+
+# Fungsi untuk staging file sesuai rencana. Mengembalikan path lokal hasil ekstraksi, atau
+# URI gs:// untuk strategi yang diimport langsung dari GCS lewat Admin API.
+def download_and_extract_gzip(bucket_name, file_name, destination_dir, plan=None):
+    strategy = plan['strategy'] if plan else LOCAL_DISK
+    if strategy == DIRECT:
+        return [f"gs://{bucket_name}/{file_name}"]
+
     # Memastikan direktori sementara ada
     # ensure_directory_exists(destination_dir)
 
@@ -51,19 +81,31 @@ def download_and_extract_gzip(bucket_name, file_name, destination_dir):
     blob = bucket.blob(file_name)
     gzip_file_path = os.path.join(destination_dir, file_name)
 
-    logging.info(f"Trying to download file from GCS: {file_name} to {gzip_file_path}")
+    def extract_to(extracted_file_path):
+        logging.info(f"Trying to download file from GCS: {file_name} ({strategy})")
+
+        if strategy == MEMORY:
+            # Object terkompresi cukup di memori, tidak perlu salinan .gz di disk
+            extract_in_memory(blob, extracted_file_path)
+        else:
+            # Simpan file GZIP ke lokal lalu ekstrak
+            extract_via_disk(blob, gzip_file_path, extracted_file_path)
+        logging.info(f"File {file_name} berhasil di-download dan diekstrak")
 
     try:
-        # Simpan file GZIP ke lokal
-        blob.download_to_filename(gzip_file_path)
-        logging.info(f"File {file_name} berhasil di-download ke {gzip_file_path}")
+        if strategy == GCS_STREAM:
+            # Tidak cukup memori/disk lokal, ekstraksi streaming langsung ke object GCS
+            return [extract_to_gcs(blob, BUCKET_NAME)]
 
-        # Ekstraksi file GZIP
         extracted_file_path = os.path.join(destination_dir, file_name.replace('.gz', ''))  # Menghilangkan .gz dari nama file
 
-        with gzip.open(gzip_file_path, 'rb') as f_in:
-            with open(extracted_file_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
+        if STAGING_CACHE:
+            # Download dan ekstraksi dilewati jika object (dan generation) yang sama sudah pernah diekstrak
+            extracted_file_path = staging_cache.fetch(
+                bucket_name, file_name, os.path.basename(extracted_file_path), extract_to
+            )
+        else:
+            extract_to(extracted_file_path)
         logging.info(f"File {file_name} berhasil diekstrak ke {extracted_file_path}")
 
         return [extracted_file_path]
@@ -77,12 +119,7 @@ def start_cloud_sql(project, instance_name):
     logging.info(f"TAHAP 2 : Start Cloud SQL")
     try:
         # Menggunakan API Cloud SQL untuk mengubah kebijakan aktivasi
-        request = sqladmin_service.instances().patch(
-            project=project,
-            instance=instance_name,
-            body={"settings": {"activationPolicy": "ALWAYS"}}
-        )
-        response = request.execute()
+        response = sqladmin_client.set_activation_policy(project, instance_name, 'ALWAYS')
         logging.info(f"Cloud SQL instance '{instance_name}' sedang dinyalakan.")
         return response
     except Exception as e:
@@ -95,12 +132,7 @@ def stop_cloud_sql(project, instance_name):
     logging.info(f"TAHAP 4 : Matikan Cloud SQL")
     try:
         # Menggunakan API Cloud SQL untuk mengubah kebijakan aktivasi
-        request = sqladmin_service.instances().patch(
-            project=project,
-            instance=instance_name,
-            body={"settings": {"activationPolicy": "NEVER"}}
-        )
-        response = request.execute()
+        response = sqladmin_client.set_activation_policy(project, instance_name, 'NEVER')
         logging.info(f"Cloud SQL instance '{instance_name}' sedang dimatikan.")
         return response
     except Exception as e:
@@ -112,12 +144,7 @@ def stop_cloud_sql(project, instance_name):
 def wait_until_sql_ready(project, instance_name):
     logging.info(f"TAHAP 3 : Tunggu Cloud SQL Siap")
     while True:
-        instance_status = sqladmin_service.instances().get(
-            project=project,
-            instance=instance_name
-        ).execute()
-
-        status = instance_status['state']
+        status = sqladmin_client.get_instance_state(project, instance_name, use_cache=False)
         logging.info(f"Status Cloud SQL instance '{instance_name}': {status}")
 
         if status == 'RUNNABLE':
@@ -155,15 +182,42 @@ def upload_to_cloud_sql(file_path):
 
     try:
         with engine.connect() as connection:
-            # Query untuk restore database
+            # Daftar file di backup dipakai untuk ukuran restore dan opsi tuning. Tanpa tuning,
+            # kegagalan membacanya tidak boleh menggagalkan restore
+            restore_options = ''
+            try:
+                file_list = read_file_list(connection, file_path)
+            except Exception as e:
+                if RESTORE_TUNING:
+                    raise
+                connection.rollback()
+                logging.warning(f"Daftar file backup tidak terbaca, ukuran restore tidak diketahui: {e}")
+                file_list = []
+            if RESTORE_TUNING:
+                restore_options = ', ' + bak_restore_options(file_list)
+
+            # Query untuk restore database (STATS: pesan progress setiap 5%)
             restore_query = f"""
-            RESTORE DATABASE coba1
+            RESTORE DATABASE {TARGET_DATABASE}
             FROM DISK = N'{file_path}'
-            WITH RECOVERY
+            WITH RECOVERY, STATS = 5{restore_options}
             """
 
-            # Eksekusi query restore
-            connection.execute(sqlalchemy.text(restore_query))
+            # Eksekusi query restore, progress dipantau dari koneksi lain lewat sys.dm_exec_requests.
+            # Batas waktu mengikuti kecepatan import historis dan progress yang teramati.
+            size_bytes = sum(f['size'] for f in file_list)
+            session_id = connection.execute(sqlalchemy.text("SELECT @@SPID")).scalar()
+            monitor = RestoreProgressMonitor(
+                engine, os.path.basename(file_path),
+                deadline=AdaptiveDeadline(import_rates.estimate_seconds(CLOUD_SQL_INSTANCE, size_bytes)),
+                on_progress=progress_sink, session_id=session_id
+            )
+            started = time.monotonic()
+            monitor.run(connection.execute, sqlalchemy.text(restore_query))
+            elapsed = time.monotonic() - started
+            import_rates.record(CLOUD_SQL_INSTANCE, size_bytes, elapsed)
+            if size_bytes:
+                tuning_history.record('bak', RESTORE_TUNING, size_bytes, elapsed)
             logging.info(f"Database {DATABASE_NAME} berhasil direstore dari file {file_path}")
     except Exception as e:
         logging.error(f"Error saat melakukan restore database: {str(e)}")
@@ -171,6 +225,48 @@ def upload_to_cloud_sql(file_path):
     finally:
         engine.dispose()
 
+# Fungsi untuk restore satu file hasil staging: file lokal lewat RESTORE, object GCS lewat import Admin API
+def restore_staged_file(path):
+    if not path.startswith('gs://'):
+        try:
+            upload_to_cloud_sql(path)
+        finally:
+            # Artifact boleh di-evict lagi setelah tidak dipakai restore
+            staging_cache.release(path)
+        return
+
+    source_bucket, _, object_name = path[len('gs://'):].partition('/')
+    try:
+        # File divalidasi dulu agar database lama tidak terhapus untuk import yang pasti gagal
+        if not object_name.lower().endswith('.bak'):
+            raise ValueError(f"File {path} bukan file BAK, tidak dapat diimport")
+        blob = storage_client.bucket(source_bucket).get_blob(object_name)
+        if blob is None:
+            raise FileNotFoundError(f"File {path} tidak ditemukan")
+        size_bytes = blob.size
+
+        # Import BAK Admin API tidak bisa menimpa database yang sudah ada
+        if TARGET_DATABASE in sqladmin_client.list_databases(project, CLOUD_SQL_INSTANCE, use_cache=False):
+            sqladmin_client.wait_for_operation(project, sqladmin_client.delete_database(project, CLOUD_SQL_INSTANCE, TARGET_DATABASE))
+
+        operation = sqladmin_client.import_bak(project, CLOUD_SQL_INSTANCE, TARGET_DATABASE, uri=path)
+        engine = connect_with_connector()
+        try:
+            started = time.monotonic()
+            wait_for_import(
+                sqladmin_client, project, operation, os.path.basename(path),
+                deadline=AdaptiveDeadline(import_rates.estimate_seconds(CLOUD_SQL_INSTANCE, size_bytes)),
+                on_progress=progress_sink, engine=engine
+            )
+            import_rates.record(CLOUD_SQL_INSTANCE, size_bytes, time.monotonic() - started)
+        finally:
+            engine.dispose()
+        logging.info(f"Database {TARGET_DATABASE} berhasil diimport dari {path}")
+    finally:
+        # Object hasil ekstraksi gcs_stream hanya sementara
+        if source_bucket == BUCKET_NAME and object_name.startswith(f"{STAGING_PREFIX}/"):
+            storage_client.bucket(BUCKET_NAME).blob(object_name).delete()
+
 # Fungsi utama untuk menangani event dari Cloud Storage menggunakan CloudEvent
 @functions_framework.cloud_event
 def hello_gcs(cloud_event):
@@ -181,31 +277,41 @@ def hello_gcs(cloud_event):
 
     logging.info(f"Event diterima. File baru ditemukan: {file_name} di bucket: {bucket_name}")
 
-    # Jika file adalah file GZIP, ekstrak terlebih dahulu
-    if file_name.endswith('.gz'):
-
-        extracted_files = download_and_extract_gzip(bucket_name, file_name, TEMP_DIR)
-
-        # Step 2: Menyalakan Cloud SQL
-        start_cloud_sql(project, CLOUD_SQL_INSTANCE)
+    # Object internal pipeline (cache, state, riwayat) diawali '_' dan tidak perlu direstore
+    if file_name and file_name.startswith('_'):
+        return
 
-        # Tunggu hingga Cloud SQL siap
-        wait_until_sql_ready(project, CLOUD_SQL_INSTANCE)
+    # Tahap disusun sebagai dependency graph: instance dinyalakan sejak event diterima,
+    # bersamaan dengan perencanaan dan staging file. Pemakaian puncak setiap tahap diukur.
+    profiler = ResourceProfiler(TEMP_DIR, trace_python=PROFILE_PYTHON_HEAP)
+    graph = StageGraph(profiler=profiler)
 
-        # Step 3: Upload file yang diekstrak ke Cloud SQL
-        for extracted_file in extracted_files:
-            upload_to_cloud_sql(extracted_file)
-    else:
-        logging.info(f"File {file_name} bukan GZIP, langsung upload ke Cloud SQL")
+    # Step 2: Menyalakan Cloud SQL dan tunggu hingga siap
+    graph.add('start_sql', lambda: start_cloud_sql(project, CLOUD_SQL_INSTANCE))
+    graph.add('sql_ready', lambda start_sql: wait_until_sql_ready(project, CLOUD_SQL_INSTANCE), deps=['start_sql'])
 
-        # Step 2: Menyalakan Cloud SQL
-        start_cloud_sql(project, CLOUD_SQL_INSTANCE)
+    # Strategi staging (memory, local_disk, gcs_stream, direct) dipilih dari ukuran object
+    # dan memori/disk yang tersedia; file non-GZIP diimport langsung dari GCS
+    graph.add('plan', lambda: plan_staging(bucket_name, file_name))
+    graph.add('staging', lambda plan: download_and_extract_gzip(bucket_name, file_name, TEMP_DIR, plan), deps=['plan'])
 
-        # Tunggu hingga Cloud SQL siap
-        wait_until_sql_ready(project, CLOUD_SQL_INSTANCE)
+    # Step 3: Restore file hasil staging ke Cloud SQL
+    def restore(staging, sql_ready):
+        if not staging:
+            raise RuntimeError(f"File {file_name} gagal di-download atau diekstrak")
+        for staged_file in staging:
+            restore_staged_file(staged_file)
 
-        # Step 3: Upload file langsung ke Cloud SQL
-        upload_to_cloud_sql(file_name)
+    graph.add('restore', restore, deps=['staging', 'sql_ready'])
 
     # Step 4: Mematikan Cloud SQL
-    stop_cloud_sql(project, CLOUD_SQL_INSTANCE)
+    graph.add('stop_sql', lambda: stop_cloud_sql(project, CLOUD_SQL_INSTANCE), deps=['restore'], always=True)
+    if STAGING_CACHE:
+        # Artifact lama/berlebih dibersihkan setelah restore (artifact yang masih di-lease dilewati)
+        graph.add('evict_cache', staging_cache.evict, deps=['restore'], always=True)
+
+    try:
+        graph.run()
+    finally:
+        if 'plan' in graph.results:
+            staging_history.record(graph.results['plan'], profiler.peaks)
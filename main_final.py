@@ -2,9 +2,21 @@ import os, sys, logging, subprocess, time, functions_framework # type: ignore
 from google.auth.transport.requests import Request
 from google.cloud import storage
 from google.auth import default 
-from googleapiclient.discovery import build 
 from googleapiclient.errors import HttpError
 from google.cloud.sql.connector import Connector, IPTypes
+from sqladmin_client import SqlAdminClient
+from prewarm import PrewarmScheduler
+from shadow_restore import ShadowRestore
+from warmup import PostRestoreWarmup
+from restore_scheduler import RestoreScheduler, ImportRateHistory
+from verify_restore import RestoreVerifier
+from delta_apply import DeltaApplier
+from tier_scaling import TierScaler, GB
+from restore_tuning import SqlImportTuning, TuningHistory
+from restore_progress import wait_for_import, AdaptiveDeadline, GcsProgressSink
+from golden_clone import GoldenCloner
+from export_pipeline import ExportPipeline, ExportJob, backup_file_type
+from staging_planner import uncompressed_size
 import sqlalchemy
 import requests
 import pytds
@@ -15,22 +27,62 @@ logging.basicConfig(level=logging.warning, format='%(asctime)s %(levelname)s: %(
 # Set class
 storage_client = storage.Client()
 credentials, project = default()
-sqladmin_service = build('sqladmin', 'v1', credentials=credentials)
+sqladmin_client = SqlAdminClient(credentials)
 
 # Define constant variable
 BUCKET_NAME = 'agi2_automatic_restore_bucket'
-# INSTANCE_CONNECTION_NAME = 'poc-arthagraha:asia-southeast2:seacloud-clone'
+INSTANCE_CONNECTION_NAME = 'poc-arthagraha:asia-southeast2:seacloud-clone'
 CLOUD_SQL_INSTANCE = 'seacloud-clone'
 CLOUD_SQL_USER = 'sqlserver'
 CLOUD_SQL_PASSWORD = '1234'
 TEMP_DIR = '/tmp'  # Direktori sementara untuk unzip file
+PREWARM_LEAD_MINUTES = 10  # Instance dinyalakan sekian menit sebelum perkiraan upload
+PREWARM_GRACE_MINUTES = 30  # Instance dimatikan lagi jika upload tidak datang setelah jendela + tenggang
+INSTANCE_HOURLY_COST = 0.0  # Biaya instance per jam (USD) untuk laporan prewarm
+SHADOW_RESTORE = os.environ.get('SHADOW_RESTORE', 'false').lower() == 'true'  # Restore ke database shadow lalu swap
+POST_RESTORE_WARMUP = os.environ.get('POST_RESTORE_WARMUP', 'false').lower() == 'true'  # Warm-up setelah restore
+WARMUP_HOT_TABLES = []  # Tabel yang di-scan ke buffer pool, contoh: ['dbo.orders']
+WARMUP_QUERIES = []  # Query priming tambahan yang dijalankan setelah restore
+VERIFY_RESTORE = os.environ.get('VERIFY_RESTORE', 'false').lower() == 'true'  # Verifikasi row count + checksum
+VERIFY_WORKERS = 8  # Jumlah koneksi paralel untuk verifikasi
+DELTA_APPLY = os.environ.get('DELTA_APPLY', 'false').lower() == 'true'  # Dump .gz: reload hanya tabel yang berubah
+TIER_SCALE_UP = os.environ.get('TIER_SCALE_UP', 'false').lower() == 'true'  # Naikkan tier sementara selama import
+# Tier sementara berdasarkan ukuran backup (entry dengan min_bytes terbesar yang terpenuhi)
+TIER_SCALE_THRESHOLDS = [
+    {'min_bytes': 20 * GB, 'tier': 'db-custom-8-32768'},
+    {'min_bytes': 100 * GB, 'tier': 'db-custom-16-65536'},
+]
+TIER_HOURLY_COST = {}  # Biaya per jam per tier (USD), contoh: {'db-custom-2-8192': 0.3}
+RESTORE_TUNING = os.environ.get('RESTORE_TUNING', 'false').lower() == 'true'  # Pre-size file + recovery SIMPLE saat import dump
+RESTORE_INSTANCE_POOL = [CLOUD_SQL_INSTANCE]  # Instance tujuan restore untuk scheduler/backfill (satu import per instance)
+RESTORE_PROGRESS = os.environ.get('RESTORE_PROGRESS', 'false').lower() == 'true'  # Tunggu import sambil melaporkan progress
+GOLDEN_CLONE = os.environ.get('GOLDEN_CLONE', 'false').lower() == 'true'  # CLOUD_SQL_INSTANCE jadi golden, environment lain di-clone
+# Environment yang dibuat ulang dari golden instance setelah restore terverifikasi, contoh:
+# {'name': 'uat', 'instance_prefix': 'seacloud-uat', 'database': 'sea_uat_db',
+#  'users': [{'name': 'app_uat', 'password': '...'}], 'settings': {'tier': 'db-custom-2-8192'}}
+GOLDEN_ENVIRONMENTS = []
+CLONE_WORKERS = 4  # Jumlah clone yang berjalan paralel
+EXPORT_BUCKET = 'agi2_automatic_export_bucket'  # Bukan bucket trigger, agar hasil export tidak direstore lagi
+EXPORT_OFFLOAD = True  # Serverless export, instance yang melayani tidak terbebani
+EXPORT_MANIFEST = True  # Tulis manifest verifikasi ke _manifests/ di bucket export
+# Database yang di-export oleh export_databases jika request tidak menyebutkan daftar sendiri, contoh:
+# {'instance': 'seacloud-clone', 'database': 'sea_agi_db', 'region': 'sea', 'environment': 'uat',
+#  'type': 'BAK', 'striped': False, 'stripe_count': None, 'compress': False}
+EXPORT_TARGETS = []
+
+progress_sink = GcsProgressSink(storage_client, BUCKET_NAME)
+
+prewarm_scheduler = PrewarmScheduler(
+    storage_client, sqladmin_client, project, CLOUD_SQL_INSTANCE, BUCKET_NAME,
+    lead_minutes=PREWARM_LEAD_MINUTES, grace_minutes=PREWARM_GRACE_MINUTES, hourly_cost=INSTANCE_HOURLY_COST
+)
 
 def check_file_name(file_name, destination_dir):
 
     # Memeriksa apakah file yang diberikan adalah file GZIP atau BAK
     logging.warning("TAHAP 1 : Download and extract gzip")
     try:
-        if file_name.endswith('.gz'):
+        if backup_file_type(file_name) == 'SQL':
             logging.warning(f"=========== Terdeteksi file {file_name} berformat .gz, segera diproses")
             file_parts = file_name.split('.')[0].split('_')  # Pisah dengan '_' dan hilangkan ekstensi
             file_name = os.path.join(destination_dir, file_name.replace('.gz', ''))  # Menghilangkan .gz dari nama file
@@ -42,7 +94,8 @@ def check_file_name(file_name, destination_dir):
             database_name = f"sea_agi_db"
             return database_name
         
-        elif file_name.endswith('.bak'):
+        elif backup_file_type(file_name) == 'BAK':
+            # .bak.gz (BAK terkompresi hasil export) juga diimport sebagai BAK
             logging.warning(f"=========== Terdeteksi file {file_name} berformat .bak, segera diproses")
             file_parts = file_name.split('.')[0].split('_')  # Pisah dengan '_' dan hilangkan ekstensi
             file_name = os.path.join(destination_dir, file_name.replace('.bak', ''))  # Menghilangkan .gz dari nama file
@@ -60,23 +113,48 @@ def check_file_name(file_name, destination_dir):
         logging.error(f'=========== Terjadi kesalahan dalam pengecekan format file: {e}')
         sys.exit(1)
 
+# Fungsi untuk membuat koneksi menggunakan SQLAlchemy dan pytds
+def connect_with_connector(database='master', connection_name=INSTANCE_CONNECTION_NAME) -> sqlalchemy.engine.base.Engine:
+    connector = Connector()
+
+    def getconn() -> pytds.Connection:
+        conn = connector.connect(
+            connection_name,  # Cloud SQL connection name
+            "pytds",
+            user=CLOUD_SQL_USER,
+            password=CLOUD_SQL_PASSWORD,
+            db=database,
+            ip_type=IPTypes.PRIVATE
+        )
+        return conn
+
+    engine = sqlalchemy.create_engine(
+        "mssql+pytds://",
+        creator=getconn,
+    )
+    return engine
+
+# Fungsi untuk membuat engine ke instance tujuan restore. CLOUD_SQL_INSTANCE memakai
+# INSTANCE_CONNECTION_NAME, instance lain di RESTORE_INSTANCE_POOL dicari connection name-nya.
+def connect_restore_target(instance_name, database='master'):
+    if instance_name == CLOUD_SQL_INSTANCE:
+        return connect_with_connector(database)
+    return connect_to_instance(instance_name, database)
+
 # Fungsi untuk memeriksa status instance Cloud SQL
 def get_instance_status(instance_name, project):
-    request = sqladmin_service.instances().get(project=project, instance=instance_name)
-    response = request.execute()
-    return response['state']
+    return sqladmin_client.get_instance_state(project, instance_name)
 
 # Fungsi untuk menyalakan Cloud SQL instance jika belum aktif
 def start_cloud_sql(instance_name, project):
     logging.warning(f"TAHAP 2 : Start Cloud SQL")
     try:
         # Menggunakan API Cloud SQL untuk mengubah kebijakan aktivasi
-        request = sqladmin_service.instances().patch(
-            project=project,
-            instance=instance_name,
+        response = sqladmin_client.patch_instance(
+            project,
+            instance_name,
             body={"settings": {"activationPolicy": "ALWAYS"}}
         )
-        response = request.execute()
         logging.warning(f"Cloud SQL instance '{instance_name}' sedang dinyalakan.")
         return response
     except Exception as e:
@@ -87,32 +165,32 @@ def stop_cloud_sql(instance_name, project):
     logging.warning(f"=========== Mematikan instance {instance_name}...")
 
     # Patch untuk mengubah activation policy menjadi 'NEVER'
-    request = sqladmin_service.instances().patch(
-        project=project,
-        instance=instance_name,
+    response = sqladmin_client.patch_instance(
+        project,
+        instance_name,
         body={"settings": {"activationPolicy": "NEVER"}}
     )
-    
-    response = request.execute()
     logging.warning(f"Response: {response}")
 
 # Fungsi untuk mengecek apakah Cloud SQL instance sudah siap
 def wait_until_sql_ready(project, instance_name):
+    started = time.monotonic()
+    polls = 0
     while True:
         try:
-            instance_status = sqladmin_service.instances().get(
-                project=project,
-                instance=instance_name
-            ).execute()
-
-            status = instance_status.get('state', 'UNKNOWN')
+            # Cache dilewati agar status selalu terbaru
+            status = sqladmin_client.get_instance_state(project, instance_name, use_cache=False)
             logging.warning(f"=========== Status Cloud SQL instance '{instance_name}': {status}")
 
             if status == 'RUNNABLE':
                 logging.warning(f"=========== Cloud SQL instance '{instance_name}' sudah siap!")
+                if polls:
+                    # Start dingin: catat lama aktivasi untuk laporan prewarm
+                    prewarm_scheduler.record_activation(time.monotonic() - started)
                 break
 
             # Jika belum siap, tunggu 10 detik dan cek ulang
+            polls += 1
             time.sleep(10)
         except HttpError as e:
             logging.error(f"=========== Error checking instance status: {e}")
@@ -143,56 +221,218 @@ def check_and_delete_existing_db(file_name, instance_name, project):
     logging.warning(f"=========== Memeriksa apakah database {file_name} sudah ada...")
 
     # Mendapatkan daftar database dari Cloud SQL
-    request = sqladmin_service.databases().list(project=project, instance=instance_name)
-    response = request.execute()
-
-    # Memproses response untuk mendapatkan list nama database
-    database_list = [db['name'] for db in response.get('items', [])]
+    database_list = sqladmin_client.list_databases(project, instance_name)
 
     # Mengecek apakah file_name ada dalam daftar database
     if file_name in database_list:
         logging.warning(f"=========== Database {file_name} ditemukan, akan dihapus untuk restore.")
         # Menghapus database jika ditemukan
-        delete_request = sqladmin_service.databases().delete(project=project, instance=instance_name, database=file_name)
-        delete_response = delete_request.execute()
+        delete_response = sqladmin_client.delete_database(project, instance_name, file_name)
         logging.warning(f"=========== Database {file_name} berhasil dihapus. Response: {delete_response}")
     else:
         logging.warning(f"=========== Database {file_name} tidak ditemukan, melanjutkan tanpa menghapus.")
 
+# Fungsi untuk membuat body importContext sesuai format file
+def build_import_body(bucket_name, file_name, database_name):
+    file_type = backup_file_type(file_name)
+    return {
+        'importContext': {
+            'fileType': file_type,
+            'uri': f'gs://{bucket_name}/{file_name}',
+            'database': f'{database_name}'
+        }
+    }
+
 # Fungsi untuk mengirim file dari Cloud Storage ke Cloud SQL
 def restore_backup(bucket_name, file_name, instance_name, project):
     database_name = check_file_name(file_name, TEMP_DIR)
     logging.warning(f"=========== TAHAP 4 : Restore file to Cloud SQL")
 
-    if file_name.endswith('.bak'):
-        # Menggunakan Cloud SQL Admin API untuk restore .bak file
-        body = {
-            'importContext': {
-                'fileType': 'BAK',
-                'uri': f'gs://{bucket_name}/{file_name}',
-                'database': f'{database_name}'
-            }
-        }
-        request = sqladmin_service.instances().import_(project=project, instance=instance_name, body=body)
-        response = request.execute()
-        logging.warning(f"=========== Restore .bak file sedang diproses. Response: {response}")
-
-    elif file_name.endswith('.gz'):
-        # Menggunakan Cloud SQL Admin API untuk restore .gz file
-        body = {
-            'importContext': {
-                'fileType': 'SQL',
-                'uri': f'gs://{bucket_name}/{file_name}',
-                'database': f'{database_name}'
-            }
-        }
-        request = sqladmin_service.instances().import_(project=project, instance=instance_name, body=body)
-        response = request.execute()
-        logging.warning(f"=========== Restore .gz file sedang diproses. Response: {response}")
+    # Menggunakan Cloud SQL Admin API untuk restore file .bak (BAK) atau .gz (SQL dump)
+    body = build_import_body(bucket_name, file_name, database_name)
+    response = sqladmin_client.import_(project, instance_name, body)
+    logging.warning(f"=========== Restore {file_name} sedang diproses. Response: {response}")
+    return response
+
+# Fungsi untuk ukuran data yang diimport: dump .gz diperkirakan dari ukuran setelah ekstraksi
+# (metadata atau trailer ISIZE), karena kecepatan import mengikuti data yang di-load
+def import_size_bytes(bucket_name, file_name):
+    blob = storage_client.bucket(bucket_name).get_blob(file_name)
+    return uncompressed_size(blob) if blob else 0
+
+# Fungsi untuk menunggu import Admin API sambil melaporkan progress ke log dan _progress/ di bucket.
+# Persentase dibaca dari RESTORE di server instance yang menjalankan import, batas waktu diturunkan dari kecepatan import historis dan progress; import yang macet dibatalkan.
+# Kecepatan import dicatat untuk instance yang menjalankan import.
+def wait_for_restore(operation, bucket_name, file_name, instance_name):
+    size_bytes = import_size_bytes(bucket_name, file_name)
+    rate_history = ImportRateHistory(storage_client, BUCKET_NAME)
+    expected_seconds = rate_history.estimate_seconds(instance_name, size_bytes)
+
+    engine = connect_restore_target(instance_name)
+    started = time.monotonic()
+    try:
+        result = wait_for_import(
+            sqladmin_client, project, operation, check_file_name(file_name, TEMP_DIR),
+            deadline=AdaptiveDeadline(expected_seconds), on_progress=progress_sink, engine=engine
+        )
+    finally:
+        if engine is not None:
+            engine.dispose()
+    rate_history.record(instance_name, size_bytes, time.monotonic() - started)
+    return result
+
+# Fungsi untuk import SQL dump (.gz) dengan tuning: database dibuat dulu, file di-pre-size
+# dari ukuran dump dan recovery model SIMPLE selama import, lalu settings dikembalikan.
+# Mengembalikan durasi import (detik).
+def restore_sql_dump_tuned(bucket_name, file_name, instance_name, project):
+    database_name = check_file_name(file_name, TEMP_DIR)
+    logging.warning(f"=========== TAHAP 4 : Restore file to Cloud SQL (dengan tuning)")
+
+    dump_size = import_size_bytes(bucket_name, file_name)
+
+    operation = sqladmin_client.insert_database(project, instance_name, database_name)
+    sqladmin_client.wait_for_operation(project, operation)
+
+    engine = connect_restore_target(instance_name)
+    try:
+        with SqlImportTuning(engine, database_name, dump_size):
+            started = time.monotonic()
+            operation = sqladmin_client.import_(project, instance_name, build_import_body(bucket_name, file_name, database_name))
+            wait_for_restore(operation, bucket_name, file_name, instance_name)
+            elapsed = time.monotonic() - started
+    finally:
+        engine.dispose()
+
+    TuningHistory(storage_client, BUCKET_NAME).record('sql', True, dump_size, elapsed)
+    return elapsed
+
+# Fungsi untuk verifikasi database hasil restore terhadap manifest backup atau restore sebelumnya
+def verify_database(database_name, bucket_name, file_name, history_name=None, instance_name=CLOUD_SQL_INSTANCE):
+    logging.warning(f"=========== Verifikasi database {database_name} di {instance_name}")
+    engine = connect_restore_target(instance_name, database_name)
+    try:
+        verifier = RestoreVerifier(storage_client, BUCKET_NAME, workers=VERIFY_WORKERS)
+        return verifier.verify(engine, history_name or database_name, bucket_name, file_name)
+    finally:
+        engine.dispose()
+
+# Fungsi untuk membuat DeltaApplier yang membaca dump .gz langsung (streaming) dari GCS
+def create_delta_applier(bucket_name, file_name, database_name, engine=None):
+    blob = storage_client.bucket(bucket_name).blob(file_name)
+    return DeltaApplier(storage_client, BUCKET_NAME, database_name, engine, lambda: blob.open('rb'))
+
+# Fungsi untuk refresh delta: hanya tabel yang berubah yang di-truncate dan di-load ulang.
+# Mengembalikan (applied, applier); applied False jika tetap butuh import penuh (database
+# belum ada atau skema berubah). applier dipakai ulang untuk menyimpan fingerprint setelah
+# import penuh, agar dump tidak dibaca ulang.
+def apply_delta_refresh(bucket_name, file_name, database_name):
+    if database_name not in sqladmin_client.list_databases(project, CLOUD_SQL_INSTANCE, use_cache=False):
+        logging.warning(f"=========== Database {database_name} belum ada, delta tidak bisa dipakai")
+        return False, None
+
+    logging.warning(f"=========== TAHAP 4 : Refresh delta {file_name} ke {database_name}")
+    engine = connect_with_connector(database_name)
+    try:
+        applier = create_delta_applier(bucket_name, file_name, database_name, engine)
+        return applier.apply() == 'applied', applier
+    finally:
+        engine.dispose()
+
+# Fungsi untuk scale-up instance sebelum restore sesuai ukuran backup
+def scale_up_for_restore(tier_scaler, bucket_name, file_name, instance_name):
+    blob = storage_client.bucket(bucket_name).get_blob(file_name)
+    size_bytes = blob.size if blob else 0
+    return size_bytes, tier_scaler.scale_up(instance_name, size_bytes)
+
+# Fungsi untuk restore ke database shadow lalu swap, database lama tetap bisa dibaca selama import.
+# Mengembalikan durasi import ke shadow (tanpa verifikasi dan swap).
+def restore_backup_shadow(bucket_name, file_name, instance_name, project):
+    database_name = check_file_name(file_name, TEMP_DIR)
+    logging.warning(f"=========== TAHAP 4 : Restore file to Cloud SQL (shadow + swap)")
+
+    engine = connect_restore_target(instance_name)
+    try:
+        verifier = None
+        if VERIFY_RESTORE:
+            # Shadow diverifikasi sebelum swap, riwayat disimpan atas nama database target
+            verifier = lambda shadow: verify_database(
+                shadow, bucket_name, file_name, history_name=database_name, instance_name=instance_name
+            )
+        shadow_restore = ShadowRestore(sqladmin_client, project, instance_name, engine, verifier=verifier)
+        file_type = build_import_body(bucket_name, file_name, database_name)['importContext']['fileType']
+        shadow_restore.run(
+            database_name,
+            lambda target: build_import_body(bucket_name, file_name, target),
+            file_type
+        )
+        return shadow_restore.import_seconds
+    finally:
+        engine.dispose()
+
+# Fungsi untuk membuat ulang environment lain dari golden instance (CLOUD_SQL_INSTANCE) dengan clone.
+# Golden harus terverifikasi dulu; dengan VERIFY_RESTORE verifikasi sudah dilakukan di alur restore.
+# base_tier: tier golden sebelum scale-up restore, tier default untuk clone.
+def refresh_environments(database_name, bucket_name, file_name, base_tier=None):
+    if not VERIFY_RESTORE:
+        verify_database(database_name, bucket_name, file_name)
+
+    logging.warning(f"=========== Refresh {len(GOLDEN_ENVIRONMENTS)} environment dari golden {CLOUD_SQL_INSTANCE}")
+    cloner = GoldenCloner(
+        sqladmin_client, project, CLOUD_SQL_INSTANCE, storage_client, BUCKET_NAME,
+        connect=lambda connection_name: connect_with_connector(connection_name=connection_name),
+        workers=CLONE_WORKERS, base_tier=base_tier
+    )
+    results = cloner.refresh_all(GOLDEN_ENVIRONMENTS, database_name)
+    logging.warning(f"=========== Refresh environment selesai: " + ", ".join(
+        f"{name} -> {result['instance']} ({result['seconds']} detik)" for name, result in results.items()
+    ))
+    return results
+
+# Fungsi untuk warm-up database setelah restore (statistik, index, buffer pool)
+def warm_up_database(database_name):
+    logging.warning(f"=========== TAHAP 5 : Warm-up database {database_name}")
+    engine = connect_with_connector(database_name)
+    try:
+        warmup = PostRestoreWarmup(engine, hot_tables=WARMUP_HOT_TABLES, priming_queries=WARMUP_QUERIES)
+        report = warmup.run()
+        logging.warning(f"=========== Warm-up selesai: " + ", ".join(
+            f"{stage} {result['seconds']} detik / {result['physical_reads']} page" for stage, result in report.items()
+        ))
+        return report
+    finally:
+        engine.dispose()
+
+# Fungsi untuk menjalankan satu job restore dari scheduler sampai import selesai
+def run_restore_job(job, instance_name):
+    if SHADOW_RESTORE:
+        import_seconds = restore_backup_shadow(job.bucket_name, job.file_name, instance_name, project)
+        ImportRateHistory(storage_client, BUCKET_NAME).record(
+            instance_name, import_size_bytes(job.bucket_name, job.file_name), import_seconds
+        )
+        return
+    check_and_delete_existing_db(job.file_name, instance_name, project)
+    operation = restore_backup(job.bucket_name, job.file_name, instance_name, project)
+    wait_for_restore(operation, job.bucket_name, job.file_name, instance_name)
+    if VERIFY_RESTORE:
+        verify_database(
+            check_file_name(job.file_name, TEMP_DIR), job.bucket_name, job.file_name, instance_name=instance_name
+        )
+
+# Fungsi untuk membuat scheduler restore atas RESTORE_INSTANCE_POOL (shortest-job-first + aging).
+# run_job bisa dibungkus pemanggil (contoh: backfill mencatat progress), default run_restore_job.
+def create_restore_scheduler(instance_names=None, run_job=None):
+    rate_history = ImportRateHistory(storage_client, BUCKET_NAME)
+    # Kecepatan import sudah dicatat run_restore_job dengan ukuran setelah ekstraksi
+    return RestoreScheduler(
+        instance_names or RESTORE_INSTANCE_POOL, run_job or run_restore_job, rate_history, record_rates=False
+    )
 
 # Fungsi utama untuk menangani event dari Cloud Storage menggunakan CloudEvent
+# Restore dari event selalu ke CLOUD_SQL_INSTANCE (golden, prewarm, tier scaling dan delta terikat
+# ke instance itu); RESTORE_INSTANCE_POOL hanya dipakai scheduler untuk restore massal (backfill).
 @functions_framework.cloud_event
 def hello_gcs(cloud_event):
+    warmed = False
     try:
         # Mengambil informasi file dari CloudEvent
         event_data = cloud_event.data
@@ -201,18 +441,140 @@ def hello_gcs(cloud_event):
 
         logging.warning(f"=========== Event diterima. File baru ditemukan: {file_name} di bucket: {bucket_name}")
 
-        check_file_name(file_name, TEMP_DIR)
+        # Object internal pipeline (state prewarm, verifikasi, delta, dll.) diawali '_' dan tidak perlu direstore
+        if file_name.startswith('_'):
+            return
+
+        database_name = check_file_name(file_name, TEMP_DIR)
+
+        # Catat waktu kedatangan untuk mempelajari jadwal upload (prewarm)
+        try:
+            warmed = prewarm_scheduler.record_arrival(file_name)
+        except Exception as e:
+            logging.error(f"=========== Gagal mencatat kedatangan untuk prewarm: {e}")
 
         # start_cloud_sql(CLOUD_SQL_INSTANCE, project)
 
         # wait_until_sql_ready(project, CLOUD_SQL_INSTANCE)
 
-        check_and_delete_existing_db(file_name, CLOUD_SQL_INSTANCE, project)
+        # Delta dan tuning hanya untuk SQL dump, bukan BAK terkompresi (.bak.gz)
+        is_sql_dump = backup_file_type(file_name) == 'SQL'
+        use_delta = DELTA_APPLY and is_sql_dump
+
+        delta_applied, delta_applier = False, None
+        if use_delta:
+            delta_applied, delta_applier = apply_delta_refresh(bucket_name, file_name, database_name)
 
-        restore_backup(bucket_name, file_name, CLOUD_SQL_INSTANCE, project)
+        tier_scaler = None
+        scaling = None
+        import_seconds = None  # Durasi import saja, verifikasi tidak ikut dihitung untuk laporan tier
+        try:
+            if TIER_SCALE_UP and not delta_applied:
+                tier_scaler = TierScaler(
+                    sqladmin_client, project, storage_client, BUCKET_NAME, TIER_SCALE_THRESHOLDS, TIER_HOURLY_COST
+                )
+                size_bytes, scaling = scale_up_for_restore(tier_scaler, bucket_name, file_name, CLOUD_SQL_INSTANCE)
+
+            if delta_applied:
+                # Database tidak di-drop, hanya tabel yang berubah yang di-load ulang
+                if VERIFY_RESTORE:
+                    verify_database(database_name, bucket_name, file_name)
+            elif SHADOW_RESTORE:
+                # Database lama baru dihapus setelah database baru tervalidasi dan di-swap
+                import_seconds = restore_backup_shadow(bucket_name, file_name, CLOUD_SQL_INSTANCE, project)
+            else:
+                check_and_delete_existing_db(file_name, CLOUD_SQL_INSTANCE, project)
+
+                if RESTORE_TUNING and is_sql_dump:
+                    # Menunggu import selesai karena settings harus dikembalikan setelahnya
+                    import_seconds = restore_sql_dump_tuned(bucket_name, file_name, CLOUD_SQL_INSTANCE, project)
+                else:
+                    import_started = time.monotonic()
+                    operation = restore_backup(bucket_name, file_name, CLOUD_SQL_INSTANCE, project)
+
+                    if POST_RESTORE_WARMUP or VERIFY_RESTORE or use_delta or TIER_SCALE_UP or RESTORE_PROGRESS or GOLDEN_CLONE:
+                        # Verifikasi, warm-up dan fingerprint delta hanya setelah import benar-benar selesai
+                        wait_for_restore(operation, bucket_name, file_name, CLOUD_SQL_INSTANCE)
+                        import_seconds = time.monotonic() - import_started
+                        if is_sql_dump:
+                            # Import SQL tanpa tuning dicatat sebagai pembanding di laporan tuning
+                            TuningHistory(storage_client, BUCKET_NAME).record(
+                                'sql', False, import_size_bytes(bucket_name, file_name), import_seconds
+                            )
+
+                if VERIFY_RESTORE:
+                    verify_database(database_name, bucket_name, file_name)
+        finally:
+            # Tier dikembalikan sebelum warm-up, karena patch tier me-restart instance (buffer pool kosong lagi)
+            if scaling:
+                tier_scaler.scale_down(CLOUD_SQL_INSTANCE, scaling)
+
+        if tier_scaler and import_seconds is not None:
+            tier_scaler.record(CLOUD_SQL_INSTANCE, size_bytes, import_seconds, scaling)
+
+        if use_delta and not delta_applied:
+            # Simpan fingerprint hasil import penuh sebagai acuan refresh delta berikutnya.
+            # Fingerprint yang sudah dihitung saat mencoba delta dipakai ulang.
+            delta_applier = delta_applier or create_delta_applier(bucket_name, file_name, database_name)
+            delta_applier.save_fingerprints()
+
+        if GOLDEN_CLONE:
+            refresh_environments(
+                database_name, bucket_name, file_name, base_tier=scaling['original']['tier'] if scaling else None
+            )
+
+        if POST_RESTORE_WARMUP:
+            warm_up_database(database_name)
 
         # stop_cloud_sql(CLOUD_SQL_INSTANCE, project)
 
     except Exception as e:
         logging.error(f"=========== Terjadi kesalahan di main function: {str(e)}")
         # Optional: cleanup atau kirim notifikasi jika error terjadi
+    finally:
+        if warmed:
+            # Instance dinyalakan oleh prewarm, dimatikan lagi setelah restore selesai
+            try:
+                prewarm_scheduler.finish_restore()
+            except Exception as e:
+                logging.error(f"=========== Gagal mematikan instance hasil prewarm: {e}")
+
+# Fungsi yang dipanggil berkala oleh Cloud Scheduler untuk pre-warming instance
+@functions_framework.http
+def prewarm_tick(request):
+    action = prewarm_scheduler.tick()
+    report = prewarm_scheduler.report()
+    logging.warning(f"=========== Prewarm: {action}. Laporan: {report}")
+    return {'action': action, 'report': report}
+
+# Fungsi untuk membuat engine ke database di instance mana pun (dipakai manifest export)
+def connect_to_instance(instance_name, database):
+    connection_name = sqladmin_client.get_instance(project, instance_name)['connectionName']
+    return connect_with_connector(database, connection_name=connection_name)
+
+# Fungsi yang dipanggil (Cloud Scheduler/manual) untuk export database Cloud SQL kembali ke GCS.
+# Body JSON opsional: {"targets": [...]} dengan format yang sama seperti EXPORT_TARGETS.
+@functions_framework.http
+def export_databases(request):
+    payload = request.get_json(silent=True) or {}
+    targets = payload.get('targets') or EXPORT_TARGETS
+
+    pipeline = ExportPipeline(
+        sqladmin_client, project, storage_client, EXPORT_BUCKET, offload=EXPORT_OFFLOAD,
+        manifest_connect=connect_to_instance if EXPORT_MANIFEST else None
+    )
+    for target in targets:
+        pipeline.submit(ExportJob(
+            target['instance'], target['database'], target['region'], target['environment'],
+            file_type=target.get('type', 'BAK'), striped=target.get('striped', False),
+            stripe_count=target.get('stripe_count'), compress=target.get('compress', False)
+        ))
+    jobs = pipeline.join()
+
+    result = [
+        {'instance': job.instance_name, 'database': job.database, 'file': job.file_name,
+         'seconds': job.seconds, 'error': str(job.error) if job.error else None}
+        for job in jobs
+    ]
+    logging.warning(f"=========== Export selesai: {result}")
+    return {'exports': result}, 500 if any(job.error for job in jobs) else 200
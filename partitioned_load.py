@@ -0,0 +1,258 @@
+import csv
+import io
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCAN_CHUNK_SIZE = 8 * 1024 * 1024  # Ukuran blok saat mencari batas partisi
+DEFAULT_BATCH_SIZE = 5000  # Jumlah baris per executemany
+
+
+# Fungsi untuk membagi file CSV menjadi n rentang byte yang berakhir di newline.
+# Newline di dalam field ber-quote tidak dipakai sebagai batas: paritas jumlah tanda
+# kutip dihitung dari awal file (quote yang di-escape "" menambah dua, paritas tetap).
+def find_partition_boundaries(file_path, partitions):
+    size = os.path.getsize(file_path)
+    targets = [size * i // partitions for i in range(1, partitions)]
+    boundaries = [0]
+    quotes_before = 0  # Jumlah tanda kutip sebelum chunk saat ini
+    offset = 0
+
+    with open(file_path, 'rb') as f:
+        while targets:
+            chunk = f.read(SCAN_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk_end = offset + len(chunk)
+            while targets and targets[0] < chunk_end:
+                search_from = max(targets[0], boundaries[-1], offset) - offset
+                boundary = None
+                pos = chunk.find(b'\n', search_from)
+                while pos != -1:
+                    if (quotes_before + chunk.count(b'"', 0, pos)) % 2 == 0:
+                        boundary = offset + pos + 1
+                        break
+                    pos = chunk.find(b'\n', pos + 1)
+                if boundary is None:
+                    # Belum ketemu newline yang valid, lanjut cari di chunk berikutnya
+                    targets[0] = chunk_end
+                    break
+                targets.pop(0)
+                if boundary > boundaries[-1] and boundary < size:
+                    boundaries.append(boundary)
+            quotes_before += chunk.count(b'"')
+            offset = chunk_end
+
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+# Reader file yang dibatasi pada rentang byte [start, end)
+class _RangeReader(io.RawIOBase):
+    def __init__(self, file_path, start, end):
+        self._file = open(file_path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:min(len(buffer), self._remaining)]
+        read = self._file.readinto(view)
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+# Fungsi untuk membuka satu rentang byte file sebagai stream biner (buffered)
+def open_partition(file_path, start, end, buffer_size=1024 * 1024):
+    return io.BufferedReader(_RangeReader(file_path, start, end), buffer_size=buffer_size)
+
+
+# Fungsi untuk membaca baris CSV (sudah di-parse, quote-aware) dari satu rentang byte
+def read_partition_rows(file_path, start, end, skip_header=False, encoding='utf-8'):
+    with io.TextIOWrapper(open_partition(file_path, start, end), encoding=encoding, newline='') as text:
+        reader = csv.reader(text)
+        if skip_header:
+            next(reader, None)
+        for row in reader:
+            if row:
+                yield row
+
+
+def _quote(name):
+    return '`' + name.replace('`', '``') + '`'
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Load CSV besar secara paralel: file dibagi menjadi beberapa rentang byte, setiap
+# worker membaca rentangnya sendiri dan memakai koneksinya sendiri. Setiap partisi
+# di-commit dalam satu transaksi (atau ke tabel staging), jadi partisi yang gagal bisa
+# diulang tanpa mengulang partisi lain.
+#
+# Tanpa use_staging, partisi yang sudah commit tetap ada di tabel target walaupun partisi
+# lain gagal setelah semua percobaan: pemanggil harus mengosongkan tabel target sebelum
+# load diulang. Dengan use_staging, tabel target baru diisi setelah semua partisi berhasil.
+class PartitionedCsvLoader:
+    def __init__(self, connect, table, columns, workers=4, batch_size=DEFAULT_BATCH_SIZE,
+                 use_staging=False, max_attempts=3, has_header=False, rows_from_partition=None):
+        self._connect = connect  # Fungsi tanpa argumen yang mengembalikan koneksi DB-API baru
+        self._table = table
+        self._columns = list(columns)
+        self._workers = workers
+        self._batch_size = batch_size
+        self._use_staging = use_staging
+        self._max_attempts = max_attempts
+        self._has_header = has_header
+        # Bisa diganti dengan parser lain yang menghasilkan batch baris per partisi
+        self._rows_from_partition = rows_from_partition or self._csv_batches
+
+    def _csv_batches(self, file_path, start, end, skip_header):
+        width = len(self._columns)
+        rows = (row[:width] for row in read_partition_rows(file_path, start, end, skip_header=skip_header))
+        return _batches(rows, self._batch_size)
+
+    def _staging_table(self, index):
+        return f"{self._table}__part_{index}"
+
+    def _insert_sql(self, table):
+        columns = ', '.join(_quote(c) for c in self._columns)
+        placeholders = ', '.join(['%s'] * len(self._columns))
+        return f"INSERT INTO {_quote(table)} ({columns}) VALUES ({placeholders})"
+
+    def _load_partition(self, file_path, index, start, end):
+        table = self._staging_table(index) if self._use_staging else self._table
+        skip_header = self._has_header and start == 0
+
+        for attempt in range(1, self._max_attempts + 1):
+            conn = None
+            rows = 0
+            started = time.monotonic()
+            try:
+                conn = self._connect()
+                with conn.cursor() as cursor:
+                    if self._use_staging:
+                        cursor.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+                        cursor.execute(f"CREATE TABLE {_quote(table)} LIKE {_quote(self._table)}")
+                    insert_sql = self._insert_sql(table)
+                    for batch in self._rows_from_partition(file_path, start, end, skip_header):
+                        cursor.executemany(insert_sql, batch)
+                        rows += len(batch)
+                conn.commit()
+                elapsed = time.monotonic() - started
+                logging.info(f"Partisi {index} ({end - start} byte, {rows} baris) selesai dalam {elapsed:.1f} detik")
+                return {'index': index, 'rows': rows, 'bytes': end - start, 'seconds': elapsed}
+            except Exception as e:
+                if conn is not None:
+                    # Koneksi yang putus bisa gagal di rollback, jangan sampai keluar dari loop retry
+                    try:
+                        conn.rollback()
+                    except Exception as rollback_error:
+                        logging.warning(f"Rollback partisi {index} gagal: {rollback_error}")
+                logging.warning(f"Partisi {index} gagal (percobaan {attempt}/{self._max_attempts}): {e}")
+                if attempt == self._max_attempts:
+                    raise
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception as close_error:
+                        logging.warning(f"Menutup koneksi partisi {index} gagal: {close_error}")
+
+    # Fungsi untuk menghapus tabel staging setelah load gagal (best effort, error hanya dicatat)
+    def _drop_staging(self, partitions):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            logging.warning(f"Tabel staging {self._table} tidak bisa dihapus: {e}")
+            return
+        try:
+            with conn.cursor() as cursor:
+                for index in partitions:
+                    cursor.execute(f"DROP TABLE IF EXISTS {_quote(self._staging_table(index))}")
+            conn.commit()
+        except Exception as e:
+            logging.warning(f"Tabel staging {self._table} tidak bisa dihapus: {e}")
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    # Fungsi untuk memindahkan isi tabel staging ke tabel target dalam satu transaksi
+    def _switch_in(self, partitions):
+        conn = self._connect()
+        try:
+            with conn.cursor() as cursor:
+                columns = ', '.join(_quote(c) for c in self._columns)
+                for index in partitions:
+                    cursor.execute(
+                        f"INSERT INTO {_quote(self._table)} ({columns}) "
+                        f"SELECT {columns} FROM {_quote(self._staging_table(index))}"
+                    )
+            conn.commit()
+            with conn.cursor() as cursor:
+                for index in partitions:
+                    cursor.execute(f"DROP TABLE IF EXISTS {_quote(self._staging_table(index))}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def load(self, file_path):
+        ranges = find_partition_boundaries(file_path, self._workers)
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = [
+                executor.submit(self._load_partition, file_path, index, start, end)
+                for index, (start, end) in enumerate(ranges)
+            ]
+            results = []
+            errors = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    errors.append(e)
+
+        if errors:
+            if self._use_staging:
+                # Staging partisi yang gagal maupun yang berhasil tidak akan di-switch in
+                self._drop_staging(range(len(ranges)))
+            else:
+                logging.error(
+                    f"Load {file_path} gagal: {len(results)} dari {len(ranges)} partisi sudah masuk ke "
+                    f"{self._table}, kosongkan tabel sebelum load diulang"
+                )
+            raise errors[0]
+
+        if self._use_staging:
+            self._switch_in([result['index'] for result in results])
+
+        elapsed = time.monotonic() - started
+        total_rows = sum(result['rows'] for result in results)
+        total_bytes = sum(result['bytes'] for result in results)
+        logging.info(
+            f"Load {file_path} selesai: {total_rows} baris dalam {elapsed:.1f} detik "
+            f"({total_bytes / max(elapsed, 1e-6) / 1024 / 1024:.1f} MB/detik, {len(ranges)} partisi)"
+        )
+        return {'rows': total_rows, 'bytes': total_bytes, 'seconds': elapsed, 'partitions': results}
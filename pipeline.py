@@ -0,0 +1,73 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+
+# Orkestrator tahap pipeline berbasis dependency graph (asyncio).
+# Setiap tahap hanya menunggu tahap yang benar-benar menjadi inputnya, sehingga
+# misalnya download/ekstraksi bisa berjalan bersamaan dengan menyalakan instance.
+# Fungsi tahap bersifat blocking dan dijalankan di thread lewat asyncio.to_thread.
+class StageGraph:
+    # profiler (opsional): objek dengan method stage(name) berupa context manager yang
+    # mengukur pemakaian resource setiap tahap, contoh staging_planner.ResourceProfiler
+    def __init__(self, profiler=None):
+        self._stages = {}
+        self._profiler = profiler
+        self.results = {}
+        self.timings = {}
+
+    # Fungsi untuk menambah tahap. Hasil tahap dependensi dikirim sebagai keyword argument
+    # dengan nama tahapnya. Tahap dengan always=True (contoh: mematikan instance) tetap
+    # dijalankan walaupun dependensinya gagal, dan tidak menerima hasil dependensi.
+    def add(self, name, func, deps=(), always=False):
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Tahap {name} bergantung pada tahap {dep} yang belum didefinisikan")
+        self._stages[name] = (func, tuple(deps), always)
+        return self
+
+    async def _run_stage(self, name, tasks, started):
+        func, deps, always = self._stages[name]
+        dep_results = await asyncio.gather(*(tasks[dep] for dep in deps), return_exceptions=True)
+        failed = [dep for dep, result in zip(deps, dep_results) if isinstance(result, BaseException)]
+        if failed and not always:
+            raise RuntimeError(f"Tahap {name} dibatalkan karena tahap {', '.join(failed)} gagal")
+
+        stage_start = time.monotonic()
+        logging.info(f"Tahap {name} dimulai (+{stage_start - started:.1f} detik)")
+        profile = self._profiler.stage(name) if self._profiler else contextlib.nullcontext()
+        try:
+            with profile:
+                if always:
+                    result = await asyncio.to_thread(func)
+                else:
+                    result = await asyncio.to_thread(func, **dict(zip(deps, dep_results)))
+        finally:
+            self.timings[name] = (stage_start - started, time.monotonic() - started)
+        logging.info(f"Tahap {name} selesai dalam {time.monotonic() - stage_start:.1f} detik")
+        self.results[name] = result
+        return result
+
+    async def _run(self):
+        started = time.monotonic()
+        tasks = {}
+        # Tahap didaftarkan berurutan sehingga dependensi selalu sudah punya task
+        for name in self._stages:
+            tasks[name] = asyncio.ensure_future(self._run_stage(name, tasks, started))
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        total = time.monotonic() - started
+        logging.info(f"Pipeline selesai dalam {total:.1f} detik")
+        errors = {name: outcome for name, outcome in zip(tasks, outcomes) if isinstance(outcome, BaseException)}
+        return errors
+
+    # Fungsi untuk menjalankan seluruh graph. Error pertama (urutan pendefinisian tahap)
+    # dilempar ulang setelah semua tahap, termasuk tahap always, selesai.
+    def run(self):
+        errors = asyncio.run(self._run())
+        for name, error in errors.items():
+            logging.error(f"Tahap {name} gagal: {error}")
+        if errors:
+            raise next(iter(errors.values()))
+        return self.results
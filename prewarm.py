@@ -0,0 +1,306 @@
+import json
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+# Lokasi file state (riwayat kedatangan upload) di bucket
+PREWARM_STATE_BLOB = '_prewarm/state.json'
+MAX_HISTORY = 60  # Jumlah kedatangan terakhir yang disimpan per prefix
+MIN_SAMPLES = 3  # Minimal sampel sebelum jadwal dianggap bisa diprediksi
+MIN_WINDOW_MINUTES = 15  # Lebar minimum jendela kedatangan (per sisi)
+ACTIVATION_TIMEOUT_SECONDS = 15 * 60  # Batas menunggu instance menyala saat prewarm
+# Instance hasil prewarm yang melayani restore dimatikan paksa oleh tick setelah sekian jam
+# (restore yang crash tidak sempat memanggil finish_restore)
+MAX_SERVING_HOURS = 6
+
+
+# Fungsi untuk menentukan prefix sumber dari nama file, contoh:
+# 'backup/sea_uat_20240807.bak' -> 'backup/sea_uat'
+def arrival_prefix(file_name):
+    directory, base = os.path.split(file_name)
+    parts = base.split('.')[0].split('_')
+    source = '_'.join(parts[:2]).lower()
+    return f"{directory}/{source}" if directory else source
+
+
+def _minute_of_day(ts):
+    return ts.hour * 60 + ts.minute + ts.second / 60
+
+
+# Fungsi untuk mempelajari jendela kedatangan dari riwayat (statistik sirkular
+# karena jam 23:50 dan 00:10 sebenarnya berdekatan)
+def learn_window(arrivals):
+    if len(arrivals) < MIN_SAMPLES:
+        return None
+    angles = [
+        2 * math.pi * _minute_of_day(datetime.fromisoformat(ts)) / 1440
+        for ts in arrivals
+    ]
+    sin_mean = sum(math.sin(a) for a in angles) / len(angles)
+    cos_mean = sum(math.cos(a) for a in angles) / len(angles)
+    resultant = math.hypot(sin_mean, cos_mean)
+    if resultant < 1e-6:
+        # Kedatangan tersebar merata sepanjang hari, tidak bisa diprediksi
+        return None
+    mean_minute = (math.atan2(sin_mean, cos_mean) * 1440 / (2 * math.pi)) % 1440
+    spread_minutes = math.sqrt(-2 * math.log(resultant)) * 1440 / (2 * math.pi)
+    return {
+        'mean_minute': mean_minute,
+        'half_width_minutes': max(MIN_WINDOW_MINUTES, 2 * spread_minutes),
+        'samples': len(arrivals),
+    }
+
+
+# Fungsi untuk menghitung jendela kedatangan terdekat (awal, perkiraan, akhir) dari waktu sekarang
+def next_window(window, now):
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    half_width = timedelta(minutes=window['half_width_minutes'])
+    for day_offset in (-1, 0, 1):
+        expected = midnight + timedelta(days=day_offset, minutes=window['mean_minute'])
+        if expected + half_width >= now:
+            return expected - half_width, expected, expected + half_width
+    expected = midnight + timedelta(days=2, minutes=window['mean_minute'])
+    return expected - half_width, expected, expected + half_width
+
+
+# Scheduler pre-warming: menyalakan instance sedikit sebelum upload yang diperkirakan
+# dan mematikannya lagi jika tidak ada upload dalam masa tenggang. Jika upload datang,
+# instance dimatikan setelah restore selesai (finish_restore).
+class PrewarmScheduler:
+    def __init__(self, storage_client, admin_client, project, instance_name, state_bucket,
+                 lead_minutes=10, grace_minutes=30, hourly_cost=0.0):
+        self._storage_client = storage_client
+        self._admin_client = admin_client
+        self._project = project
+        self._instance_name = instance_name
+        self._state_bucket = state_bucket
+        self._lead = timedelta(minutes=lead_minutes)
+        self._grace = timedelta(minutes=grace_minutes)
+        self._hourly_cost = hourly_cost
+
+    # ---- Penyimpanan state di GCS (read-modify-write dengan precondition generation) ----
+
+    def _blob(self):
+        return self._storage_client.bucket(self._state_bucket).blob(PREWARM_STATE_BLOB)
+
+    def load_state(self):
+        blob = self._blob()
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            return self._empty_state(), 0
+        return json.loads(data), blob.generation
+
+    @staticmethod
+    def _empty_state():
+        return {
+            'prefixes': {},
+            'prewarm': None,
+            'serving': None,
+            'activation_seconds': None,
+            'report': {
+                'prewarm_hits': 0,
+                'prewarm_misses': 0,
+                'latency_saved_seconds': 0.0,
+                'extra_runtime_seconds': 0.0,
+                'extra_runtime_cost': 0.0,
+                'runtime_seconds': 0.0,
+                'runtime_cost': 0.0,
+            },
+        }
+
+    def _update_state(self, mutate, attempts=5):
+        for _ in range(attempts):
+            state, generation = self.load_state()
+            result = mutate(state)
+            try:
+                self._blob().upload_from_string(
+                    json.dumps(state), content_type='application/json', if_generation_match=generation
+                )
+                return result
+            except PreconditionFailed:
+                # State diubah proses lain di saat yang sama, ulangi dari awal
+                time.sleep(0.5)
+        raise RuntimeError("Gagal memperbarui state prewarm karena konflik penulisan berulang")
+
+    def _add_idle_runtime(self, state, prewarm, until):
+        idle = (until - datetime.fromisoformat(prewarm['started_at'])).total_seconds()
+        report = state['report']
+        report['extra_runtime_seconds'] += max(idle, 0)
+        report['extra_runtime_cost'] += max(idle, 0) / 3600 * self._hourly_cost
+
+    # Runtime total instance yang dinyalakan prewarm, dari start sampai dimatikan
+    def _add_runtime(self, state, started_at, until):
+        runtime = max((until - datetime.fromisoformat(started_at)).total_seconds(), 0)
+        report = state['report']
+        report['runtime_seconds'] = report.get('runtime_seconds', 0.0) + runtime
+        report['runtime_cost'] = report.get('runtime_cost', 0.0) + runtime / 3600 * self._hourly_cost
+
+    def _stop_instance(self):
+        self._admin_client.patch_instance(
+            self._project, self._instance_name, body={"settings": {"activationPolicy": "NEVER"}}
+        )
+
+    # ---- Hook dari pipeline ----
+
+    # Fungsi untuk mencatat kedatangan upload baru (dipanggil saat event diterima).
+    # Mengembalikan True jika instance sudah dinyalakan lebih dulu oleh scheduler; pemanggil
+    # wajib memanggil finish_restore setelah restore selesai (berhasil atau gagal).
+    def record_arrival(self, file_name, now=None):
+        now = now or datetime.now(timezone.utc)
+        prefix = arrival_prefix(file_name)
+
+        def mutate(state):
+            entry = state['prefixes'].setdefault(prefix, {'arrivals': []})
+            entry['arrivals'] = (entry['arrivals'] + [now.isoformat()])[-MAX_HISTORY:]
+
+            serving = state.get('serving')
+            if serving:
+                # Instance hasil prewarm masih melayani restore lain, dimatikan setelah keduanya selesai
+                serving['restores'] += 1
+                return True
+            prewarm = state.get('prewarm')
+            if not prewarm:
+                return False
+            # Upload datang saat instance sudah hangat: aktivasi tidak perlu ditunggu
+            report = state['report']
+            report['prewarm_hits'] += 1
+            report['latency_saved_seconds'] += state.get('activation_seconds') or 0
+            self._add_idle_runtime(state, prewarm, now)
+            state['prewarm'] = None
+            state['serving'] = {'started_at': prewarm['started_at'], 'arrived_at': now.isoformat(), 'restores': 1}
+            return True
+
+        warmed = self._update_state(mutate)
+        logging.info(f"Kedatangan {prefix} dicatat (instance sudah hangat: {warmed})")
+        return warmed
+
+    # Fungsi untuk mencatat lama aktivasi instance saat start dingin (rata-rata bergerak)
+    def record_activation(self, seconds):
+        def mutate(state):
+            previous = state.get('activation_seconds')
+            state['activation_seconds'] = seconds if previous is None else 0.7 * previous + 0.3 * seconds
+
+        self._update_state(mutate)
+
+    # Fungsi untuk mematikan instance hasil prewarm setelah restore selesai. force=True
+    # mematikan walaupun masih ada restore lain yang tercatat (dipakai tick untuk state macet).
+    def finish_restore(self, now=None, force=False):
+        now = now or datetime.now(timezone.utc)
+
+        def mutate(state):
+            serving = state.get('serving')
+            if not serving:
+                return None
+            serving['restores'] -= 1
+            if serving['restores'] > 0 and not force:
+                return None
+            self._add_runtime(state, serving['started_at'], now)
+            state['serving'] = None
+            return serving
+
+        serving = self._update_state(mutate)
+        if not serving:
+            return False
+        logging.warning(f"Restore selesai, instance {self._instance_name} hasil prewarm dimatikan lagi")
+        self._stop_instance()
+        return True
+
+    # ---- Dijalankan berkala (misalnya Cloud Scheduler setiap 5 menit) ----
+
+    def tick(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        state, _ = self.load_state()
+        serving = state.get('serving')
+        if serving:
+            if now - datetime.fromisoformat(serving['arrived_at']) >= timedelta(hours=MAX_SERVING_HOURS):
+                logging.warning(f"Restore di {self._instance_name} tidak melapor selesai, instance dimatikan")
+                self.finish_restore(now, force=True)
+                return 'stopped'
+            return 'serving'
+
+        prewarm = state.get('prewarm')
+
+        if prewarm:
+            deadline = datetime.fromisoformat(prewarm['window_end']) + self._grace
+            if now >= deadline:
+                self._stop_unused(now)
+                return 'stopped'
+            return 'waiting'
+
+        for prefix, entry in state['prefixes'].items():
+            window = learn_window(entry['arrivals'])
+            if window is None:
+                continue
+            window_start, expected, window_end = next_window(window, now)
+            last_arrival = datetime.fromisoformat(entry['arrivals'][-1])
+            if last_arrival >= window_start:
+                # Upload untuk jendela ini sudah datang
+                continue
+            if window_start - self._lead <= now <= window_end:
+                if self._start_prewarm(prefix, expected, window_end, now):
+                    return 'started'
+                return 'already_running'
+        return 'idle'
+
+    def _start_prewarm(self, prefix, expected, window_end, now):
+        # Instance yang dimatikan (activationPolicy NEVER) tetap berstatus RUNNABLE di Admin API,
+        # jadi yang diperiksa adalah activation policy, bukan state
+        instance = self._admin_client.get_instance(self._project, self._instance_name, use_cache=False)
+        if instance.get('settings', {}).get('activationPolicy') == 'ALWAYS':
+            # Instance sudah menyala (dipakai pipeline lain), tidak perlu prewarm
+            return False
+        logging.info(f"Prewarm {self._instance_name}: upload {prefix} diperkirakan sekitar {expected.isoformat()}")
+        started = time.monotonic()
+        operation = self._admin_client.patch_instance(
+            self._project, self._instance_name, body={"settings": {"activationPolicy": "ALWAYS"}}
+        )
+
+        def mutate(state):
+            state['prewarm'] = {
+                'prefix': prefix,
+                'started_at': now.isoformat(),
+                'expected': expected.isoformat(),
+                'window_end': window_end.isoformat(),
+            }
+
+        self._update_state(mutate)
+
+        # Alur restore tidak menyalakan instance sendiri, jadi lama aktivasi diukur di sini:
+        # operasi patch selesai setelah instance benar-benar menyala
+        try:
+            self._admin_client.wait_for_operation(self._project, operation, timeout=ACTIVATION_TIMEOUT_SECONDS)
+        except Exception as e:
+            logging.warning(f"Lama aktivasi {self._instance_name} tidak tercatat: {e}")
+            return True
+        self.record_activation(time.monotonic() - started)
+        return True
+
+    def _stop_unused(self, now):
+        def mutate(state):
+            prewarm = state.get('prewarm')
+            if not prewarm:
+                return None
+            state['report']['prewarm_misses'] += 1
+            self._add_idle_runtime(state, prewarm, now)
+            self._add_runtime(state, prewarm['started_at'], now)
+            state['prewarm'] = None
+            return prewarm
+
+        prewarm = self._update_state(mutate)
+        if prewarm:
+            logging.warning(f"Upload {prewarm['prefix']} tidak datang dalam masa tenggang, instance dimatikan lagi")
+            self._stop_instance()
+
+    # Fungsi untuk membuat laporan latensi yang dihemat vs biaya runtime tambahan
+    def report(self):
+        state, _ = self.load_state()
+        report = dict(state['report'])
+        report['activation_seconds'] = state.get('activation_seconds')
+        report['windows'] = {
+            prefix: learn_window(entry['arrivals']) for prefix, entry in state['prefixes'].items()
+        }
+        return report
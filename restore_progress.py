@@ -0,0 +1,287 @@
+import json
+import logging
+import threading
+import time
+import sqlalchemy
+from tsql import autocommit_connection, fetch_all
+
+# Lokasi progress restore terakhir per database di bucket
+PROGRESS_PREFIX = '_progress'
+POLL_INTERVAL = 10  # Interval polling progress (detik)
+PUBLISH_INTERVAL = 30  # Progress ke GCS ditulis paling sering setiap sekian detik
+
+# Batas waktu adaptif: estimasi total durasi (dari persentase yang sudah tercapai, atau dari
+# kecepatan import historis sebelum ada progress) dikali TIMEOUT_SLACK
+TIMEOUT_SLACK = 2.0
+MIN_TIMEOUT_SECONDS = 30 * 60
+# Restore dianggap macet jika persentase tidak naik selama STALL_FACTOR x rata-rata waktu per persen
+STALL_FACTOR = 10
+MIN_STALL_SECONDS = 10 * 60
+
+# Request restore/backup yang melaporkan percent_complete di sys.dm_exec_requests
+PROGRESS_QUERY = """
+SELECT session_id, command, percent_complete, estimated_completion_time
+FROM sys.dm_exec_requests
+WHERE command IN ('RESTORE DATABASE', 'RESTORE LOG')
+"""
+
+
+class RestoreStalled(TimeoutError):
+    pass
+
+
+# Batas waktu restore yang diturunkan dari throughput yang teramati, bukan angka tetap.
+# Restore yang lambat tapi terus bergerak mendapat waktu lebih, restore yang berhenti
+# bergerak ditangkap lebih awal. Batas waktu total hanya ditegakkan jika persentase
+# progress pernah terbaca.
+class AdaptiveDeadline:
+    def __init__(self, expected_seconds=None, slack=TIMEOUT_SLACK, min_timeout=MIN_TIMEOUT_SECONDS,
+                 stall_factor=STALL_FACTOR, min_stall=MIN_STALL_SECONDS):
+        self._expected_seconds = expected_seconds
+        self._slack = slack
+        self._min_timeout = min_timeout
+        self._stall_factor = stall_factor
+        self._min_stall = min_stall
+        self._started = time.monotonic()
+        self._percent = 0.0
+        self._last_change = self._started
+        self._has_progress = False  # Persentase pernah terbaca (DMV) atau operasi selesai
+        self._timeout_warned = False
+
+    def update(self, percent, now=None):
+        now = now or time.monotonic()
+        if percent is not None:
+            self._has_progress = True
+        if percent is not None and percent > self._percent:
+            self._percent = percent
+            self._last_change = now
+
+    def elapsed(self, now=None):
+        return (now or time.monotonic()) - self._started
+
+    # Estimasi total durasi dari progress yang sudah tercapai
+    def estimated_total(self):
+        if self._percent > 0:
+            return (self._last_change - self._started) * 100 / self._percent
+        return self._expected_seconds
+
+    def timeout_seconds(self):
+        estimate = self.estimated_total()
+        if estimate is None:
+            return None
+        return max(self._min_timeout, estimate * self._slack)
+
+    # Sebelum progress pertama (alokasi file) dan setelah 100% (recovery) persentase tidak
+    # bergerak, sehingga hanya batas waktu total yang berlaku
+    def stall_seconds(self):
+        if not 0 < self._percent < 100:
+            return None
+        per_percent = (self._last_change - self._started) / self._percent
+        return max(self._min_stall, per_percent * self._stall_factor)
+
+    def check(self, label, now=None):
+        now = now or time.monotonic()
+        stall = self.stall_seconds()
+        if stall is not None and now - self._last_change > stall:
+            raise RestoreStalled(
+                f"Restore {label} macet di {self._percent:.1f}% selama {now - self._last_change:.0f} detik"
+            )
+        timeout = self.timeout_seconds()
+        if timeout is not None and self.elapsed(now) > timeout:
+            if not self._has_progress:
+                # Tanpa sinyal progress, restore yang lambat tidak bisa dibedakan dari yang macet:
+                # hanya diberi peringatan, tidak dibatalkan
+                if not self._timeout_warned:
+                    self._timeout_warned = True
+                    logging.warning(
+                        f"Restore {label} melewati perkiraan {timeout:.0f} detik tanpa info progress, tetap ditunggu"
+                    )
+                return
+            raise RestoreStalled(
+                f"Restore {label} melewati batas waktu adaptif {timeout:.0f} detik ({self._percent:.1f}%)"
+            )
+
+    def event(self, label, source, status, eta_seconds=None):
+        if eta_seconds is None and self._percent > 0:
+            eta_seconds = max(0.0, self.estimated_total() - self.elapsed())
+        timeout = self.timeout_seconds()
+        return {
+            'label': label,
+            'source': source,
+            'status': status,
+            'percent': round(self._percent, 1),
+            'elapsed_seconds': round(self.elapsed(), 1),
+            'eta_seconds': round(eta_seconds, 1) if eta_seconds is not None else None,
+            'timeout_seconds': round(timeout, 1) if timeout is not None else None,
+        }
+
+
+# Fungsi untuk membaca progress RESTORE dari server. Tanpa session_id, request restore
+# mana pun diambil (satu import per instance, jadi restore Admin API juga terbaca).
+def read_server_progress(connection, session_id=None):
+    for row_session, command, percent, estimated_ms in fetch_all(connection, PROGRESS_QUERY):
+        if session_id is None or row_session == session_id:
+            return float(percent), (estimated_ms or 0) / 1000
+    return None, None
+
+
+def log_progress(event):
+    eta = f", sisa ~{event['eta_seconds'] / 60:.1f} menit" if event['eta_seconds'] is not None else ''
+    logging.warning(
+        f"=========== Progress {event['label']} ({event['source']}): {event['status']} "
+        f"{event['percent']}%{eta}"
+    )
+
+
+# Penerima progress yang menulis event terakhir ke _progress/<label>.json di bucket,
+# agar progress bisa dipantau dari luar proses restore
+class GcsProgressSink:
+    def __init__(self, storage_client, bucket_name, publish_interval=PUBLISH_INTERVAL):
+        self._storage_client = storage_client
+        self._bucket_name = bucket_name
+        self._publish_interval = publish_interval
+        self._last_published = {}
+
+    def __call__(self, event):
+        log_progress(event)
+        now = time.monotonic()
+        last = self._last_published.get(event['label'])
+        if last and event['status'] == last[1] and now - last[0] < self._publish_interval:
+            return
+        self._last_published[event['label']] = (now, event['status'])
+        try:
+            blob = self._storage_client.bucket(self._bucket_name).blob(f"{PROGRESS_PREFIX}/{event['label']}.json")
+            blob.upload_from_string(json.dumps(event), content_type='application/json')
+        except Exception as e:
+            # Progress hanya untuk pemantauan, jangan gagalkan restore
+            logging.error(f"Gagal menulis progress {event['label']}: {e}")
+
+
+# Side channel untuk RESTORE yang dijalankan lewat connection.execute: thread terpisah
+# mem-polling sys.dm_exec_requests dengan koneksi lain selama query restore berjalan.
+# Jika restore macet atau melewati batas waktu adaptif, session restore di-KILL.
+class RestoreProgressMonitor:
+    def __init__(self, engine, label, deadline=None, on_progress=log_progress, session_id=None,
+                 poll_interval=POLL_INTERVAL):
+        self._engine = engine
+        self._label = label
+        self._deadline = deadline or AdaptiveDeadline()
+        self._on_progress = on_progress
+        self._session_id = session_id
+        self._poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.error = None
+
+    def _emit(self, status, eta_seconds=None):
+        try:
+            self._on_progress(self._deadline.event(self._label, 'dmv', status, eta_seconds))
+        except Exception as e:
+            logging.error(f"Gagal mengirim progress {self._label}: {e}")
+
+    def _kill(self, connection):
+        if self._session_id is None:
+            return
+        try:
+            connection.execute(sqlalchemy.text(f"KILL {int(self._session_id)}"))
+            logging.error(f"Session restore {self._session_id} ({self._label}) dihentikan")
+        except Exception as e:
+            logging.error(f"Gagal menghentikan session restore {self._session_id}: {e}")
+
+    def _watch(self):
+        try:
+            # KILL tidak boleh dijalankan di dalam transaksi
+            with autocommit_connection(self._engine) as connection:
+                while not self._stop.wait(self._poll_interval):
+                    try:
+                        percent, eta_seconds = read_server_progress(connection, self._session_id)
+                    except Exception as e:
+                        # Tanpa izin VIEW SERVER STATE progress tidak terbaca, batas waktu total hanya memberi peringatan
+                        logging.error(f"Gagal membaca progress restore {self._label}: {e}")
+                        percent, eta_seconds = None, None
+                    self._deadline.update(percent)
+                    self._emit('running', eta_seconds)
+                    try:
+                        self._deadline.check(self._label)
+                    except RestoreStalled as e:
+                        self.error = e
+                        self._emit('stalled')
+                        self._kill(connection)
+                        return
+        except Exception as e:
+            logging.error(f"Monitor progress {self._label} berhenti: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    # Fungsi untuk menjalankan restore (blocking) sambil dipantau. Jika restore gagal karena
+    # di-KILL oleh monitor, yang dilempar adalah RestoreStalled.
+    def run(self, func, *args, **kwargs):
+        self.start()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.stop()
+            if self.error:
+                raise self.error from e
+            self._emit('failed')
+            raise
+        self.stop()
+        self._deadline.update(100)
+        self._emit('done', 0)
+        return result
+
+
+# Fungsi untuk menunggu operasi import Admin API sambil melaporkan progress. Operasi Admin API
+# tidak punya persentase, jadi jika engine diberikan persentase dibaca dari RESTORE yang
+# dijalankan Cloud SQL di server. Operasi yang macet atau melewati batas waktu dibatalkan.
+def wait_for_import(admin_client, project, operation, label, deadline=None, on_progress=log_progress,
+                    engine=None, poll_interval=POLL_INTERVAL):
+    operation_name = operation['name'] if isinstance(operation, dict) else operation
+    deadline = deadline or AdaptiveDeadline()
+    connection = None
+    try:
+        while True:
+            result = admin_client.get_operation(project, operation_name)
+            if result.get('status') == 'DONE':
+                if 'error' in result:
+                    on_progress(deadline.event(label, 'operation', 'failed'))
+                    raise RuntimeError(f"Operasi {operation_name} gagal: {result['error']}")
+                deadline.update(100)
+                on_progress(deadline.event(label, 'operation', 'done', 0))
+                return result
+
+            percent, eta_seconds = None, None
+            if engine is not None:
+                try:
+                    connection = connection or autocommit_connection(engine)
+                    percent, eta_seconds = read_server_progress(connection)
+                except Exception as e:
+                    logging.error(f"Gagal membaca progress restore {label}: {e}")
+                    if connection is not None:
+                        connection.close()
+                    connection = None
+            deadline.update(percent)
+            on_progress(deadline.event(label, 'dmv' if percent is not None else 'operation',
+                                       result.get('status', '').lower(), eta_seconds))
+
+            try:
+                deadline.check(label)
+            except RestoreStalled:
+                on_progress(deadline.event(label, 'operation', 'stalled'))
+                try:
+                    admin_client.cancel_operation(project, operation_name)
+                except Exception as e:
+                    logging.error(f"Gagal membatalkan operasi {operation_name}: {e}")
+                raise
+            time.sleep(poll_interval)
+    finally:
+        if connection is not None:
+            connection.close()
@@ -0,0 +1,223 @@
+import itertools
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+# Lokasi riwayat kecepatan import per instance di bucket
+IMPORT_RATES_BLOB = '_scheduler/import_rates.json'
+DEFAULT_IMPORT_RATE = 20 * 1024 * 1024  # Perkiraan awal kecepatan import (byte/detik)
+IMPORT_OVERHEAD_SECONDS = 60  # Overhead tetap setiap import (persiapan, recovery, dll.)
+
+
+# Riwayat kecepatan import (rata-rata bergerak) per instance, disimpan sebagai JSON di GCS
+class ImportRateHistory:
+    def __init__(self, storage_client=None, bucket_name=None, smoothing=0.3):
+        self._storage_client = storage_client
+        self._bucket_name = bucket_name
+        self._smoothing = smoothing
+        self._lock = threading.Lock()
+        self._rates = self._load()
+
+    def _blob(self):
+        return self._storage_client.bucket(self._bucket_name).blob(IMPORT_RATES_BLOB)
+
+    def _load(self):
+        return self._load_with_generation()[0]
+
+    def _load_with_generation(self):
+        if not self._storage_client:
+            return {}, 0
+        blob = self._blob()
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            return {}, 0
+        return json.loads(data), blob.generation
+
+    def rate(self, instance_name):
+        with self._lock:
+            return self._rates.get(instance_name, DEFAULT_IMPORT_RATE)
+
+    # Fungsi untuk mengecek apakah instance sudah punya kecepatan terukur (bukan DEFAULT_IMPORT_RATE)
+    def measured(self, instance_name):
+        with self._lock:
+            return instance_name in self._rates
+
+    def estimate_seconds(self, instance_name, size_bytes):
+        return IMPORT_OVERHEAD_SECONDS + size_bytes / self.rate(instance_name)
+
+    def _smoothed(self, rates, instance_name, observed):
+        previous = rates.get(instance_name)
+        return observed if previous is None else (1 - self._smoothing) * previous + self._smoothing * observed
+
+    # Fungsi untuk mencatat hasil import agar estimasi berikutnya lebih akurat. Ditulis dengan
+    # precondition generation agar catatan proses lain yang menulis bersamaan tidak hilang.
+    def record(self, instance_name, size_bytes, seconds, attempts=5):
+        if seconds <= IMPORT_OVERHEAD_SECONDS or size_bytes <= 0:
+            return
+        observed = size_bytes / (seconds - IMPORT_OVERHEAD_SECONDS)
+        if not self._storage_client:
+            with self._lock:
+                self._rates[instance_name] = self._smoothed(self._rates, instance_name, observed)
+            return
+        for _ in range(attempts):
+            rates, generation = self._load_with_generation()
+            rates[instance_name] = self._smoothed(rates, instance_name, observed)
+            try:
+                self._blob().upload_from_string(
+                    json.dumps(rates), content_type='application/json', if_generation_match=generation
+                )
+            except PreconditionFailed:
+                # Proses lain mencatat di saat yang sama, ulangi dari awal
+                time.sleep(0.5)
+                continue
+            with self._lock:
+                self._rates = rates
+            return
+        logging.error(f"Gagal mencatat kecepatan import {instance_name} karena konflik penulisan berulang")
+
+
+class RestoreJob:
+    _ids = itertools.count(1)
+
+    def __init__(self, bucket_name, file_name, size_bytes):
+        self.job_id = next(self._ids)
+        self.bucket_name = bucket_name
+        self.file_name = file_name
+        self.size_bytes = size_bytes
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.instance_name = None
+        self.error = None
+
+    def __repr__(self):
+        return f"RestoreJob({self.job_id}, {self.file_name}, {self.size_bytes} byte)"
+
+
+# Scheduler restore untuk sekumpulan instance Cloud SQL.
+# - estimasi biaya job = ukuran object / kecepatan import historis instance
+# - job dipilih shortest-job-first, dengan aging: semakin lama menunggu prioritasnya
+#   naik, sehingga backup besar tidak kelaparan di belakang backup kecil
+# - setiap instance hanya menjalankan satu import sekaligus (batasan Cloud SQL)
+class RestoreScheduler:
+    def __init__(self, instance_names, run_job, rate_history=None, aging_factor=0.5, record_rates=True):
+        self._instance_names = list(instance_names)
+        self._run_job = run_job  # run_job(job, instance_name), blocking sampai import selesai
+        self._rates = rate_history or ImportRateHistory()
+        self._aging_factor = aging_factor
+        # False jika run_job sudah mencatat kecepatan import sendiri
+        self._record_rates = record_rates
+        self._pending = []
+        self._running = {}
+        self._done = []
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._workers = []
+
+    def start(self):
+        for instance_name in self._instance_names:
+            worker = threading.Thread(target=self._worker, args=(instance_name,), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def submit(self, bucket_name, file_name, size_bytes):
+        job = RestoreJob(bucket_name, file_name, size_bytes)
+        with self._condition:
+            self._pending.append(job)
+            self._condition.notify_all()
+        logging.info(f"Job {job} masuk antrean (antrean: {len(self._pending)})")
+        return job
+
+    # Prioritas efektif (lebih kecil = lebih dulu): estimasi durasi dikurangi bonus menunggu
+    def _priority(self, job, instance_name, now):
+        waited = now - job.submitted_at
+        return self._rates.estimate_seconds(instance_name, job.size_bytes) - self._aging_factor * waited
+
+    def _next_job(self, instance_name):
+        now = time.monotonic()
+        job = min(self._pending, key=lambda j: (self._priority(j, instance_name, now), j.job_id))
+        self._pending.remove(job)
+        return job
+
+    def _worker(self, instance_name):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if self._stopping and not self._pending:
+                    return
+                job = self._next_job(instance_name)
+                job.instance_name = instance_name
+                job.started_at = time.monotonic()
+                self._running[instance_name] = job
+
+            logging.info(f"Menjalankan {job} di instance {instance_name}")
+            try:
+                self._run_job(job, instance_name)
+                if self._record_rates:
+                    self._rates.record(instance_name, job.size_bytes, time.monotonic() - job.started_at)
+            except Exception as e:
+                job.error = e
+                logging.error(f"Restore {job} di {instance_name} gagal: {e}")
+            finally:
+                job.finished_at = time.monotonic()
+                with self._condition:
+                    self._running.pop(instance_name, None)
+                    self._done.append(job)
+                    self._condition.notify_all()
+
+    # Fungsi untuk menunggu semua job selesai lalu menghentikan worker
+    def join(self):
+        with self._condition:
+            while self._pending or self._running:
+                self._condition.wait()
+            self._stopping = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join()
+        return list(self._done)
+
+    def queue_depth(self):
+        with self._condition:
+            return {'pending': len(self._pending), 'running': len(self._running), 'done': len(self._done)}
+
+    # Fungsi untuk memperkirakan waktu selesai setiap job dengan mensimulasikan
+    # aturan penjadwalan yang sama terhadap estimasi durasi
+    def predicted_completions(self):
+        with self._condition:
+            pending = list(self._pending)
+            running = dict(self._running)
+
+        now = time.monotonic()
+        wall_now = datetime.now(timezone.utc)
+        free_at = {}
+        predictions = {}
+        for instance_name in self._instance_names:
+            job = running.get(instance_name)
+            if job:
+                estimate = self._rates.estimate_seconds(instance_name, job.size_bytes)
+                finish = max(now, job.started_at + estimate)
+                predictions[job.job_id] = finish
+            else:
+                finish = now
+            free_at[instance_name] = finish
+
+        while pending:
+            instance_name = min(free_at, key=free_at.get)
+            at = free_at[instance_name]
+            job = min(pending, key=lambda j: (
+                self._rates.estimate_seconds(instance_name, j.size_bytes) - self._aging_factor * (at - j.submitted_at),
+                j.job_id,
+            ))
+            pending.remove(job)
+            free_at[instance_name] = at + self._rates.estimate_seconds(instance_name, job.size_bytes)
+            predictions[job.job_id] = free_at[instance_name]
+
+        return {
+            job_id: wall_now + timedelta(seconds=finish - now) for job_id, finish in predictions.items()
+        }
@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+import time
+import sqlalchemy
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from tsql import quote_name, quote_string, autocommit_connection, fetch_all
+
+MB = 1024 * 1024
+
+# Lokasi riwayat durasi import (dengan dan tanpa tuning) di bucket
+TUNING_HISTORY_BLOB = '_tuning/history.json'
+MAX_HISTORY_ENTRIES = 500
+
+# Perkiraan ukuran file database dari ukuran dump SQL (teks INSERT lebih besar dari datanya)
+DUMP_DATA_FACTOR = 0.8
+DUMP_LOG_FACTOR = 0.25
+FILE_GROWTH_MB = 1024  # Autogrowth sementara selama import (mengurangi jumlah event autogrow)
+
+# Opsi RESTORE untuk transfer data yang lebih besar per I/O
+MAX_TRANSFER_SIZE = 4 * MB
+
+
+# Fungsi untuk membaca daftar file di dalam backup (RESTORE FILELISTONLY)
+def read_file_list(connection, backup_path):
+    result = connection.execute(sqlalchemy.text(f"RESTORE FILELISTONLY FROM DISK = {quote_string(backup_path)}"))
+    return [
+        {'logical_name': row['LogicalName'], 'type': row['Type'], 'size': int(row['Size'])}
+        for row in result.mappings()
+    ]
+
+
+# Fungsi untuk menentukan opsi RESTORE dari daftar file backup. Saat RESTORE, file data
+# dan log langsung dibuat sesuai ukuran di backup (tidak autogrow), jadi yang bisa
+# dipercepat adalah jumlah dan ukuran buffer transfer.
+def bak_restore_options(file_list):
+    total_bytes = sum(f['size'] for f in file_list)
+    data_files = sum(1 for f in file_list if f['type'] == 'D') or 1
+    buffer_count = min(64, max(8, data_files * 4))
+    logging.info(
+        f"Backup berisi {len(file_list)} file ({total_bytes / 1024 ** 3:.1f} GB), "
+        f"BUFFERCOUNT={buffer_count}, MAXTRANSFERSIZE={MAX_TRANSFER_SIZE}"
+    )
+    return f"BUFFERCOUNT = {buffer_count}, MAXTRANSFERSIZE = {MAX_TRANSFER_SIZE}"
+
+
+# Tuning database selama import SQL dump: file data/log di-pre-size dari ukuran dump,
+# recovery model diubah ke SIMPLE (minimal logging), lalu dikembalikan setelah import.
+# Catatan: berpindah dari FULL ke SIMPLE memutus log chain; backup otomatis berikutnya
+# memulai chain baru.
+class SqlImportTuning:
+    def __init__(self, engine, database_name, dump_size_bytes):
+        self._engine = engine  # Engine yang terhubung ke database master
+        self._database_name = database_name
+        self._dump_size_bytes = dump_size_bytes
+        self._original = None
+
+    def _files(self, connection):
+        return fetch_all(
+            connection,
+            "SELECT name, type_desc, size, growth, is_percent_growth FROM sys.master_files "
+            "WHERE database_id = DB_ID(:name)",
+            name=self._database_name,
+        )
+
+    def apply(self):
+        database = quote_name(self._database_name)
+        with autocommit_connection(self._engine) as connection:
+            recovery_model = fetch_all(
+                connection, "SELECT recovery_model_desc FROM sys.databases WHERE name = :name",
+                name=self._database_name,
+            )[0][0]
+            files = self._files(connection)
+            self._original = {'recovery_model': recovery_model, 'files': [tuple(f) for f in files]}
+
+            if recovery_model != 'SIMPLE':
+                connection.execute(sqlalchemy.text(f"ALTER DATABASE {database} SET RECOVERY SIMPLE"))
+
+            targets = {
+                'ROWS': int(self._dump_size_bytes * DUMP_DATA_FACTOR),
+                'LOG': int(self._dump_size_bytes * DUMP_LOG_FACTOR),
+            }
+            for name, type_desc, size_pages, _, _ in files:
+                target_mb = targets.get(type_desc, 0) // MB
+                current_mb = size_pages * 8 // 1024
+                size_clause = f", SIZE = {target_mb}MB" if target_mb > current_mb else ''
+                connection.execute(sqlalchemy.text(
+                    f"ALTER DATABASE {database} MODIFY FILE "
+                    f"(NAME = {quote_name(name)}{size_clause}, FILEGROWTH = {FILE_GROWTH_MB}MB)"
+                ))
+        logging.info(f"Tuning import {self._database_name}: recovery {recovery_model} -> SIMPLE, file di-pre-size")
+
+    # Fungsi untuk mengembalikan recovery model dan autogrowth asli (ukuran file tidak dikecilkan)
+    def restore(self):
+        if not self._original:
+            return
+        database = quote_name(self._database_name)
+        with autocommit_connection(self._engine) as connection:
+            for name, _, _, growth, is_percent_growth in self._original['files']:
+                growth_clause = f"{growth}%" if is_percent_growth else f"{growth * 8}KB"
+                connection.execute(sqlalchemy.text(
+                    f"ALTER DATABASE {database} MODIFY FILE (NAME = {quote_name(name)}, FILEGROWTH = {growth_clause})"
+                ))
+            if self._original['recovery_model'] != 'SIMPLE':
+                connection.execute(sqlalchemy.text(
+                    f"ALTER DATABASE {database} SET RECOVERY {self._original['recovery_model']}"
+                ))
+        logging.info(f"Settings {self._database_name} dikembalikan (recovery {self._original['recovery_model']})")
+
+    def __enter__(self):
+        self.apply()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.restore()
+        return False
+
+
+# Riwayat durasi import untuk membandingkan hasil dengan dan tanpa tuning
+class TuningHistory:
+    def __init__(self, storage_client, bucket_name):
+        self._storage_client = storage_client
+        self._bucket_name = bucket_name
+        self._lock = threading.Lock()
+
+    def _blob(self):
+        return self._storage_client.bucket(self._bucket_name).blob(TUNING_HISTORY_BLOB)
+
+    def _load(self):
+        return self._load_with_generation()[0]
+
+    def _load_with_generation(self):
+        blob = self._blob()
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            return [], 0
+        return json.loads(data), blob.generation
+
+    # Fungsi untuk menambah satu entri riwayat (read-modify-write dengan precondition generation)
+    def _append(self, entry, attempts=5):
+        for _ in range(attempts):
+            history, generation = self._load_with_generation()
+            history = (history + [entry])[-MAX_HISTORY_ENTRIES:]
+            try:
+                self._blob().upload_from_string(
+                    json.dumps(history), content_type='application/json', if_generation_match=generation
+                )
+                return history
+            except PreconditionFailed:
+                # Import lain mencatat di saat yang sama, ulangi dari awal
+                time.sleep(0.5)
+        raise RuntimeError("Konflik penulisan riwayat tuning berulang")
+
+    def record(self, kind, tuned, size_bytes, seconds):
+        try:
+            with self._lock:
+                history = self._append(
+                    {'kind': kind, 'tuned': tuned, 'size_bytes': size_bytes, 'seconds': round(seconds, 1)}
+                )
+        except Exception as e:
+            # Riwayat hanya untuk laporan, jangan gagalkan restore
+            logging.error(f"Gagal menyimpan riwayat tuning: {e}")
+            return None
+        report = self.report(kind, history)
+        logging.info(f"Import {kind} {'dengan' if tuned else 'tanpa'} tuning: {seconds:.1f} detik. Laporan: {report}")
+        return report
+
+    # Fungsi untuk membandingkan rata-rata throughput import tanpa tuning (sebelum) dan dengan tuning (sesudah)
+    def report(self, kind, history=None):
+        history = history if history is not None else self._load()
+        result = {}
+        for tuned, label in ((False, 'before'), (True, 'after')):
+            entries = [h for h in history if h['kind'] == kind and h['tuned'] == tuned and h['seconds'] > 0]
+            if entries:
+                total_bytes = sum(h['size_bytes'] for h in entries)
+                total_seconds = sum(h['seconds'] for h in entries)
+                result[label] = {'imports': len(entries), 'mb_per_second': round(total_bytes / MB / total_seconds, 2)}
+        if 'before' in result and 'after' in result and result['before']['mb_per_second']:
+            result['speedup'] = round(result['after']['mb_per_second'] / result['before']['mb_per_second'], 2)
+        return result
@@ -2,12 +2,11 @@ import os
 import gzip
 import shutil
 import logging
-import subprocess
 import time
 import functions_framework
 from google.cloud import storage
 from google.auth import default
-from googleapiclient.discovery import build
+from sqladmin_client import SqlAdminClient
 
 # Inisialisasi logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
@@ -15,7 +14,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(mes
 # Inisialisasi client Google Cloud Storage dan SQL Admin API
 storage_client = storage.Client()
 credentials, project = default()
-sqladmin_service = build('sqladmin', 'v1', credentials=credentials)
+sqladmin_client = SqlAdminClient(credentials)
 
 # Nama bucket dan file
 BUCKET_NAME = 'aggibak'
@@ -24,26 +23,11 @@ CLOUD_SQL_INSTANCE = 'seacloud'
 DATABASE_NAME = 'BISA'
 BAK_FILE = 'AdventureWorksLT2022.bak'
 
-# Fungsi untuk mengeksekusi perintah gcloud
-def execute_gcloud_command(command):
-    try:
-        logging.info(f"Menjalankan perintah: {' '.join(command)}")
-        result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        logging.info(f"Output: {result.stdout.decode('utf-8')}")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error saat menjalankan perintah gcloud: {e.stderr.decode('utf-8')}")
-        raise
-
 # Fungsi untuk menghidupkan instance Cloud SQL menggunakan API
 def start_cloud_sql(project, instance_name):
     logging.info(f"TAHAP 2 : Start Cloud SQL")
     try:
-        request = sqladmin_service.instances().patch(
-            project=project,
-            instance=instance_name,
-            body={"settings": {"activationPolicy": "ALWAYS"}}
-        )
-        response = request.execute()
+        response = sqladmin_client.set_activation_policy(project, instance_name, 'ALWAYS')
         logging.info(f"Cloud SQL instance '{instance_name}' sedang dinyalakan.")
         return response
     except Exception as e:
@@ -54,12 +38,7 @@ def start_cloud_sql(project, instance_name):
 def stop_cloud_sql(project, instance_name):
     logging.info(f"TAHAP 4 : Matikan Cloud SQL")
     try:
-        request = sqladmin_service.instances().patch(
-            project=project,
-            instance=instance_name,
-            body={"settings": {"activationPolicy": "NEVER"}}
-        )
-        response = request.execute()
+        response = sqladmin_client.set_activation_policy(project, instance_name, 'NEVER')
         logging.info(f"Cloud SQL instance '{instance_name}' sedang dimatikan.")
         return response
     except Exception as e:
@@ -70,12 +49,7 @@ def stop_cloud_sql(project, instance_name):
 def wait_until_sql_ready(project, instance_name):
     logging.info(f"TAHAP 3 : Tunggu Cloud SQL Siap")
     while True:
-        instance_status = sqladmin_service.instances().get(
-            project=project,
-            instance=instance_name
-        ).execute()
-
-        status = instance_status['state']
+        status = sqladmin_client.get_instance_state(project, instance_name, use_cache=False)
         logging.info(f"Status Cloud SQL instance '{instance_name}': {status}")
 
         if status == 'RUNNABLE':
@@ -85,21 +59,19 @@ def wait_until_sql_ready(project, instance_name):
         # Jika belum siap, tunggu 10 detik dan cek ulang
         time.sleep(10)
 
-# Fungsi untuk melakukan restore database menggunakan gcloud
-def restore_database_with_gcloud(bak_file_path):
-    # Step 1: Jalankan perintah gcloud sql import bak
-    import_bak_command = [
-        'gcloud', 'sql', 'import', 'bak', CLOUD_SQL_INSTANCE, bak_file_path,
-        '--database=' + DATABASE_NAME, '--bak-type=FULL', '--no-recovery'
-    ]
-    execute_gcloud_command(import_bak_command)
-
-    # Step 2: Jalankan perintah recovery-only
-    recovery_command = [
-        'gcloud', 'sql', 'import', 'bak', CLOUD_SQL_INSTANCE,
-        '--database=' + DATABASE_NAME, '--recovery-only'
-    ]
-    execute_gcloud_command(recovery_command)
+# Fungsi untuk melakukan restore database menggunakan Admin API (padanan gcloud sql import bak)
+def restore_database_with_api(bak_file_path):
+    # Step 1: Import BAK tanpa recovery (database tetap RESTORING)
+    logging.info(f"Import {bak_file_path} ke database {DATABASE_NAME} (noRecovery)")
+    operation = sqladmin_client.import_bak(
+        project, CLOUD_SQL_INSTANCE, DATABASE_NAME, uri=bak_file_path, bak_type='FULL', no_recovery=True
+    )
+    sqladmin_client.wait_for_operation(project, operation)
+
+    # Step 2: Jalankan recovery-only agar database ONLINE
+    logging.info(f"Recovery database {DATABASE_NAME} (recoveryOnly)")
+    operation = sqladmin_client.import_bak(project, CLOUD_SQL_INSTANCE, DATABASE_NAME, recovery_only=True)
+    return sqladmin_client.wait_for_operation(project, operation)
 
 # Fungsi utama untuk menangani event dari Cloud Storage menggunakan CloudEvent
 @functions_framework.cloud_event
@@ -121,8 +93,8 @@ def hello_gcs(cloud_event):
         # Tunggu hingga Cloud SQL siap
         wait_until_sql_ready(project, CLOUD_SQL_INSTANCE)
 
-        # Step 3: Lakukan restore menggunakan perintah gcloud sql import bak
-        restore_database_with_gcloud(bak_file_path)
+        # Step 3: Lakukan restore menggunakan Admin API (import BAK)
+        restore_database_with_api(bak_file_path)
     else:
         logging.error(f"File {file_name} bukan file .bak, tidak dapat diproses.")
 
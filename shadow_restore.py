@@ -0,0 +1,118 @@
+import logging
+import time
+from datetime import datetime, timezone
+import sqlalchemy
+from tsql import quote_name, quote_string, autocommit_connection, fetch_all
+
+
+# Fungsi untuk membuat nama database shadow yang unik
+def shadow_database_name(target):
+    return f"{target}__shadow_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+
+
+# Restore ke database shadow lalu swap dengan rename, sehingga database lama tetap
+# bisa dibaca selama proses import dan tetap utuh jika import gagal.
+class ShadowRestore:
+    def __init__(self, admin_client, project, instance_name, engine, min_tables=1, verifier=None):
+        self._admin_client = admin_client
+        self._project = project
+        self._instance_name = instance_name
+        self._engine = engine  # Engine yang terhubung ke database master
+        self._min_tables = min_tables
+        self._verifier = verifier  # Opsional: verifier(shadow) untuk verifikasi isi sebelum swap
+        self.import_seconds = None  # Durasi import saja (tanpa validasi dan swap) dari run terakhir
+
+    # Fungsi untuk import ke database shadow dan menunggu sampai selesai.
+    # build_body(database_name) mengembalikan body importContext untuk database tersebut.
+    def restore(self, shadow, build_body, file_type):
+        if file_type == 'SQL':
+            # Import SQL dump membutuhkan database tujuan yang sudah ada
+            operation = self._admin_client.insert_database(self._project, self._instance_name, shadow)
+            self._admin_client.wait_for_operation(self._project, operation)
+
+        logging.warning(f"=========== Restore ke database shadow {shadow}")
+        started = time.monotonic()
+        operation = self._admin_client.import_(self._project, self._instance_name, build_body(shadow))
+        result = self._admin_client.wait_for_operation(self._project, operation)
+        self.import_seconds = time.monotonic() - started
+        return result
+
+    # Fungsi untuk memvalidasi database shadow sebelum di-swap
+    def validate(self, shadow):
+        with autocommit_connection(self._engine) as connection:
+            rows = fetch_all(
+                connection,
+                "SELECT state_desc FROM sys.databases WHERE name = :name",
+                name=shadow,
+            )
+            if not rows:
+                raise RuntimeError(f"Database shadow {shadow} tidak ditemukan setelah restore")
+            state = rows[0][0]
+            if state != 'ONLINE':
+                raise RuntimeError(f"Database shadow {shadow} berstatus {state}, bukan ONLINE")
+
+            table_count = connection.execute(sqlalchemy.text(
+                f"SELECT COUNT(*) FROM {quote_name(shadow)}.sys.tables WHERE is_ms_shipped = 0"
+            )).scalar()
+            if table_count < self._min_tables:
+                raise RuntimeError(f"Database shadow {shadow} hanya berisi {table_count} tabel")
+
+        if self._verifier:
+            self._verifier(shadow)
+
+        logging.warning(f"=========== Database shadow {shadow} valid ({table_count} tabel)")
+        return table_count
+
+    # Fungsi untuk menukar database shadow menjadi database target.
+    # Database lama di-rename menjadi nama retired dan baru dihapus setelah swap berhasil.
+    def swap(self, target, shadow):
+        retired = f"{target}__retired_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+        swap_query = f"""
+        BEGIN TRY
+            IF DB_ID({quote_string(target)}) IS NOT NULL
+            BEGIN
+                ALTER DATABASE {quote_name(target)} SET SINGLE_USER WITH ROLLBACK IMMEDIATE;
+                ALTER DATABASE {quote_name(target)} MODIFY NAME = {quote_name(retired)};
+                ALTER DATABASE {quote_name(retired)} SET MULTI_USER;
+            END
+            ALTER DATABASE {quote_name(shadow)} MODIFY NAME = {quote_name(target)};
+        END TRY
+        BEGIN CATCH
+            -- Kembalikan nama database lama jika swap gagal di tengah jalan
+            IF DB_ID({quote_string(retired)}) IS NOT NULL AND DB_ID({quote_string(target)}) IS NULL
+            BEGIN
+                ALTER DATABASE {quote_name(retired)} SET MULTI_USER;
+                ALTER DATABASE {quote_name(retired)} MODIFY NAME = {quote_name(target)};
+            END;
+            THROW;
+        END CATCH
+        """
+        with autocommit_connection(self._engine) as connection:
+            connection.execute(sqlalchemy.text(swap_query))
+
+        existed = retired in self._admin_client.list_databases(self._project, self._instance_name, use_cache=False)
+        logging.warning(f"=========== Swap selesai: {shadow} -> {target}")
+        return retired if existed else None
+
+    # Fungsi untuk menghapus database (shadow yang gagal atau database lama)
+    def drop(self, database):
+        logging.warning(f"=========== Menghapus database {database}")
+        operation = self._admin_client.delete_database(self._project, self._instance_name, database)
+        self._admin_client.wait_for_operation(self._project, operation)
+
+    # Alur lengkap: restore ke shadow -> validasi -> swap -> hapus database lama
+    def run(self, target, build_body, file_type):
+        shadow = shadow_database_name(target)
+        try:
+            self.restore(shadow, build_body, file_type)
+            self.validate(shadow)
+        except Exception:
+            logging.error(f"=========== Restore shadow gagal, database {target} tidak diubah")
+            if shadow in self._admin_client.list_databases(self._project, self._instance_name, use_cache=False):
+                self.drop(shadow)
+            raise
+
+        retired = self.swap(target, shadow)
+        if retired:
+            self.drop(retired)
+        return target
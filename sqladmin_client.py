@@ -0,0 +1,392 @@
+import logging
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import httplib2
+import google_auth_httplib2
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+# Status HTTP yang aman untuk dicoba ulang (rate limit dan error sisi server)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Status yang pasti berarti request ditolak sebelum diproses (mutasi boleh langsung dikirim ulang)
+REJECTED_STATUS = {429}
+# Toleransi selisih jam lokal dan server saat mencari operasi yang sudah dibuat
+OPERATION_CLOCK_SKEW = timedelta(seconds=10)
+
+# Error transport yang membuat koneksi httplib2 tidak bisa dipakai lagi
+TRANSPORT_ERRORS = (httplib2.HttpLib2Error, OSError)
+
+
+# Pool transport HTTP. httplib2.Http tidak thread-safe, jadi setiap request
+# meminjam satu transport secara eksklusif lalu mengembalikannya ke pool.
+class _TransportPool:
+    def __init__(self, credentials, max_size=10, timeout=60):
+        self._credentials = credentials
+        self._timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=max_size)
+
+    def _create(self):
+        http = httplib2.Http(timeout=self._timeout)
+        return google_auth_httplib2.AuthorizedHttp(self._credentials, http=http)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._create()
+
+    def release(self, transport):
+        try:
+            self._idle.put_nowait(transport)
+        except queue.Full:
+            # Pool penuh, transport dibuang saja
+            pass
+
+
+# Wrapper Cloud SQL Admin API yang aman dipakai dari banyak thread.
+# - setiap request memakai transport dari pool (tidak berbagi httplib2.Http)
+# - metadata instance dan daftar database di-cache sebentar (TTL)
+# - cache di-invalidate setelah operasi yang mengubah instance/database
+# - response 429/5xx dicoba ulang dengan exponential backoff dalam batas waktu (budget)
+# - mutasi yang gagal dengan 5xx/timeout mungkin sudah diterima server, jadi sebelum dikirim
+#   ulang dicari dulu operasinya di operations().list agar tidak terkirim dua kali
+class SqlAdminClient:
+    def __init__(self, credentials, cache_ttl=30, retry_budget=60, max_retries=6, pool_size=10):
+        self._service = build('sqladmin', 'v1', credentials=credentials, cache_discovery=False)
+        self._pool = _TransportPool(credentials, max_size=pool_size)
+        self._cache_ttl = cache_ttl
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._retry_budget = retry_budget
+        self._max_retries = max_retries
+
+    # Akses ke resource discovery untuk kebutuhan yang belum dibungkus
+    @property
+    def service(self):
+        return self._service
+
+    # Fungsi untuk mengeksekusi request dengan transport dari pool + retry.
+    # idempotent=False untuk mutasi: hanya 429 yang langsung dicoba ulang; untuk 5xx/error
+    # transport, find_operation() dipanggil dulu dan operasi yang ditemukan dikembalikan.
+    # Tanpa find_operation mutasi tersebut tidak dicoba ulang.
+    def execute(self, request, idempotent=True, find_operation=None):
+        deadline = time.monotonic() + self._retry_budget
+        attempt = 0
+        while True:
+            transport = self._pool.acquire()
+            try:
+                response = request.execute(http=transport)
+                self._pool.release(transport)
+                return response
+            except HttpError as e:
+                # Transport masih sehat, kembalikan ke pool
+                self._pool.release(transport)
+                status = e.resp.status if e.resp is not None else None
+                if status not in RETRYABLE_STATUS:
+                    raise
+                error = e
+                rejected = status in REJECTED_STATUS
+            except TRANSPORT_ERRORS as e:
+                # Transport kemungkinan rusak, jangan dikembalikan ke pool
+                error = e
+                rejected = False
+
+            ambiguous = not idempotent and not rejected
+            if ambiguous and find_operation is None:
+                raise error
+
+            attempt += 1
+            delay = min(2 ** attempt, 32) * (0.5 + random.random() / 2)
+            if attempt > self._max_retries or time.monotonic() + delay > deadline:
+                logging.error(f"Retry budget Admin API habis setelah {attempt} percobaan: {error}")
+                raise error
+            logging.warning(f"Admin API error sementara ({error}), coba ulang dalam {delay:.1f} detik")
+            time.sleep(delay)
+
+            if ambiguous:
+                # Dicari setelah backoff agar operasi yang diterima server sempat tercatat
+                try:
+                    operation = find_operation()
+                except Exception as e:
+                    logging.error(f"Tidak bisa memastikan operasi sudah dibuat ({e}), request tidak dikirim ulang")
+                    raise error
+                if operation:
+                    logging.warning(f"Request gagal ({error}) tapi operasi {operation.get('name')} sudah dibuat, dipakai")
+                    return operation
+
+    # Fungsi untuk mencari operasi (operationType) di instance yang dibuat sejak `since`.
+    # matches(operation) opsional untuk mencocokkan isi operasi (contoh: uri import).
+    def find_operation(self, project, instance_name, operation_type, since, matches=None):
+        response = self.execute(self._service.operations().list(project=project, instance=instance_name))
+        for operation in response.get('items', []):
+            if operation.get('operationType') != operation_type:
+                continue
+            inserted = operation.get('insertTime')
+            if not inserted or datetime.fromisoformat(inserted.replace('Z', '+00:00')) < since:
+                continue
+            if matches and not matches(operation):
+                continue
+            return operation
+        return None
+
+    # Fungsi untuk mengeksekusi mutasi yang menghasilkan operasi pada instance_name
+    def _mutate(self, request, project, instance_name, operation_type, matches=None):
+        since = datetime.now(timezone.utc) - OPERATION_CLOCK_SKEW
+        return self.execute(request, idempotent=False, find_operation=lambda: self.find_operation(
+            project, instance_name, operation_type, since, matches
+        ))
+
+    def _cached(self, key, loader):
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+        value = loader()
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + self._cache_ttl, value)
+        return value
+
+    # Fungsi untuk menghapus cache instance dan/atau daftar database
+    def invalidate(self, project, instance_name, instance=True, databases=True):
+        with self._cache_lock:
+            if instance:
+                self._cache.pop(('instance', project, instance_name), None)
+            if databases:
+                self._cache.pop(('databases', project, instance_name), None)
+
+    # ---- Operasi baca (di-cache) ----
+
+    def get_instance(self, project, instance_name, use_cache=True):
+        key = ('instance', project, instance_name)
+        if not use_cache:
+            self.invalidate(project, instance_name, databases=False)
+        return self._cached(key, lambda: self.execute(
+            self._service.instances().get(project=project, instance=instance_name)
+        ))
+
+    def get_instance_state(self, project, instance_name, use_cache=True):
+        return self.get_instance(project, instance_name, use_cache=use_cache).get('state', 'UNKNOWN')
+
+    # Fungsi untuk mengambil metadata beberapa instance sekaligus dalam satu batch request
+    def get_instances(self, project, instance_names):
+        results = {}
+        missing = []
+        now = time.monotonic()
+        with self._cache_lock:
+            for name in instance_names:
+                entry = self._cache.get(('instance', project, name))
+                if entry and entry[0] > now:
+                    results[name] = entry[1]
+                else:
+                    missing.append(name)
+        if not missing:
+            return results
+
+        failed = []
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                failed.append(request_id)
+                return
+            results[request_id] = response
+            with self._cache_lock:
+                self._cache[('instance', project, request_id)] = (time.monotonic() + self._cache_ttl, response)
+
+        batch = self._service.new_batch_http_request(callback=callback)
+        for name in missing:
+            batch.add(self._service.instances().get(project=project, instance=name), request_id=name)
+        self.execute(batch)
+
+        # Request yang gagal di dalam batch dicoba ulang satu per satu (dengan retry)
+        for name in failed:
+            results[name] = self.get_instance(project, name, use_cache=False)
+        return results
+
+    def list_databases(self, project, instance_name, use_cache=True):
+        key = ('databases', project, instance_name)
+        if not use_cache:
+            self.invalidate(project, instance_name, instance=False)
+        response = self._cached(key, lambda: self.execute(
+            self._service.databases().list(project=project, instance=instance_name)
+        ))
+        return [db['name'] for db in response.get('items', [])]
+
+    def get_operation(self, project, operation_name):
+        return self.execute(self._service.operations().get(project=project, operation=operation_name))
+
+    # Fungsi untuk membatalkan operasi yang masih berjalan (contoh: import yang macet)
+    def cancel_operation(self, project, operation_name):
+        return self.execute(self._service.operations().cancel(project=project, operation=operation_name))
+
+    # Fungsi untuk menunggu operasi Admin API sampai selesai
+    def wait_for_operation(self, project, operation, poll_interval=10, timeout=None):
+        operation_name = operation['name'] if isinstance(operation, dict) else operation
+        started = time.monotonic()
+        while True:
+            result = self.get_operation(project, operation_name)
+            if result.get('status') == 'DONE':
+                if 'error' in result:
+                    raise RuntimeError(f"Operasi {operation_name} gagal: {result['error']}")
+                return result
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"Operasi {operation_name} belum selesai setelah {timeout} detik")
+            time.sleep(poll_interval)
+
+    # ---- Operasi yang mengubah state (invalidate cache) ----
+
+    def patch_instance(self, project, instance_name, body):
+        try:
+            return self._mutate(
+                self._service.instances().patch(project=project, instance=instance_name, body=body),
+                project, instance_name, 'UPDATE'
+            )
+        finally:
+            self.invalidate(project, instance_name, databases=False)
+
+    def delete_database(self, project, instance_name, database):
+        try:
+            return self._mutate(self._service.databases().delete(
+                project=project, instance=instance_name, database=database
+            ), project, instance_name, 'DELETE_DATABASE')
+        finally:
+            self.invalidate(project, instance_name, instance=False)
+
+    def import_(self, project, instance_name, body):
+        try:
+            context = body.get('importContext', {})
+            return self._mutate(
+                self._service.instances().import_(project=project, instance=instance_name, body=body),
+                project, instance_name, 'IMPORT',
+                lambda operation: operation.get('importContext', {}).get('database') == context.get('database')
+            )
+        finally:
+            self.invalidate(project, instance_name)
+
+    def insert_database(self, project, instance_name, database):
+        try:
+            return self._mutate(self._service.databases().insert(
+                project=project, instance=instance_name, body={'name': database}
+            ), project, instance_name, 'CREATE_DATABASE')
+        finally:
+            self.invalidate(project, instance_name, instance=False)
+
+    def export(self, project, instance_name, body):
+        uri = body.get('exportContext', {}).get('uri')
+        return self._mutate(
+            self._service.instances().export(project=project, instance=instance_name, body=body),
+            project, instance_name, 'EXPORT',
+            lambda operation: operation.get('exportContext', {}).get('uri') == uri
+        )
+
+    # Fungsi untuk export database ke file BAK. copy_only=True agar export tidak mengubah
+    # rantai backup differential; offload=True memakai serverless export (instance tidak terbebani).
+    # Untuk striped=True uri adalah folder tujuan stripe.
+    def export_bak(self, project, instance_name, database, uri, bak_type='FULL', copy_only=True,
+                   striped=False, stripe_count=None, offload=False):
+        bak_export_options = {'bakType': bak_type, 'copyOnly': copy_only}
+        if striped:
+            bak_export_options['striped'] = True
+            if stripe_count:
+                bak_export_options['stripeCount'] = stripe_count
+        return self.export(project, instance_name, {'exportContext': {
+            'kind': 'sql#exportContext',
+            'fileType': 'BAK',
+            'uri': uri,
+            'databases': [database],
+            'offload': offload,
+            'bakExportOptions': bak_export_options,
+        }})
+
+    # Fungsi untuk export database ke SQL dump; uri berakhiran .gz dikompresi oleh Cloud SQL
+    def export_sql(self, project, instance_name, database, uri, offload=False):
+        return self.export(project, instance_name, {'exportContext': {
+            'kind': 'sql#exportContext',
+            'fileType': 'SQL',
+            'uri': uri,
+            'databases': [database],
+            'offload': offload,
+        }})
+
+    # Fungsi untuk clone instance (seluruh database dan settings) ke instance baru
+    def clone_instance(self, project, source_instance, destination_instance):
+        try:
+            request = self._service.instances().clone(
+                project=project, instance=source_instance,
+                body={'cloneContext': {'kind': 'sql#cloneContext', 'destinationInstanceName': destination_instance}}
+            )
+            since = datetime.now(timezone.utc) - OPERATION_CLOCK_SKEW
+            return self.execute(request, idempotent=False, find_operation=lambda: self._find_clone(
+                project, source_instance, destination_instance, since
+            ))
+        finally:
+            self.invalidate(project, destination_instance)
+
+    # Operasi clone bisa tercatat di instance sumber atau tujuan; instance tujuan belum
+    # tentu sudah ada (404)
+    def _find_clone(self, project, source_instance, destination_instance, since):
+        for instance_name in (destination_instance, source_instance):
+            try:
+                operation = self.find_operation(project, instance_name, 'CLONE', since)
+            except HttpError as e:
+                if e.resp is None or e.resp.status != 404:
+                    raise
+                continue
+            if operation and operation.get('targetId') in (source_instance, destination_instance):
+                return operation
+        return None
+
+    def delete_instance(self, project, instance_name):
+        try:
+            return self._mutate(
+                self._service.instances().delete(project=project, instance=instance_name),
+                project, instance_name, 'DELETE'
+            )
+        finally:
+            self.invalidate(project, instance_name)
+
+    def list_users(self, project, instance_name):
+        response = self.execute(self._service.users().list(project=project, instance=instance_name))
+        return response.get('items', [])
+
+    def insert_user(self, project, instance_name, name, password):
+        return self._mutate(self._service.users().insert(
+            project=project, instance=instance_name, body={'name': name, 'password': password}
+        ), project, instance_name, 'CREATE_USER')
+
+    def update_user(self, project, instance_name, name, password):
+        return self._mutate(self._service.users().update(
+            project=project, instance=instance_name, name=name, body={'name': name, 'password': password}
+        ), project, instance_name, 'UPDATE_USER')
+
+    # Fungsi untuk mengubah activation policy instance (ALWAYS = nyala, NEVER = mati)
+    def set_activation_policy(self, project, instance_name, policy):
+        return self.patch_instance(project, instance_name, body={"settings": {"activationPolicy": policy}})
+
+    # Fungsi untuk import file BAK dengan bakImportOptions (padanan `gcloud sql import bak`).
+    # Untuk recovery_only=True uri boleh kosong karena hanya menjalankan RESTORE WITH RECOVERY.
+    def import_bak(self, project, instance_name, database, uri=None, bak_type='FULL',
+                   no_recovery=False, recovery_only=False, striped=False, stop_at=None, stop_at_mark=None):
+        bak_import_options = {'bakType': bak_type}
+        if no_recovery:
+            bak_import_options['noRecovery'] = True
+        if recovery_only:
+            bak_import_options['recoveryOnly'] = True
+        if striped:
+            bak_import_options['striped'] = True
+        if stop_at:
+            bak_import_options['stopAt'] = stop_at
+        if stop_at_mark:
+            bak_import_options['stopAtMark'] = stop_at_mark
+
+        import_context = {
+            'fileType': 'BAK',
+            'database': database,
+            'bakImportOptions': bak_import_options,
+        }
+        if uri:
+            import_context['uri'] = uri
+        return self.import_(project, instance_name, {'importContext': import_context})
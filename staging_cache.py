@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from google.api_core.exceptions import NotFound
+
+CACHE_PREFIX = '_staging_cache'
+LOCAL_CACHE_DIR = '/tmp/staging_cache'
+LEASE_TTL_SECONDS = 6 * 3600  # Lease dari proses yang mati dianggap kedaluwarsa setelah ini
+
+
+# Fungsi untuk membuat key cache dari object sumber (bucket, nama, generation).
+# Generation berubah setiap object ditimpa, sehingga artifact lama tidak pernah terpakai.
+def cache_key(bucket_name, object_name, generation):
+    return hashlib.sha256(f"{bucket_name}/{object_name}#{generation}".encode('utf-8')).hexdigest()[:32]
+
+
+# Cache artifact hasil staging (misalnya file .gz yang sudah diekstrak) dengan dua lapis:
+# disk lokal (opsional) dan GCS. Artifact yang sedang dipakai restore dilindungi dengan
+# reference count (lokal) dan lease object (GCS) sehingga tidak ikut di-evict.
+class StagingCache:
+    def __init__(self, storage_client, cache_bucket, local_dir=LOCAL_CACHE_DIR, use_local=True,
+                 max_local_bytes=8 * 1024 ** 3, max_gcs_bytes=500 * 1024 ** 3, max_age_days=14):
+        self._storage_client = storage_client
+        self._cache_bucket = cache_bucket
+        self._local_dir = local_dir
+        self._use_local = use_local
+        self._max_local_bytes = max_local_bytes
+        self._max_gcs_bytes = max_gcs_bytes
+        self._max_age_seconds = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._refcounts = {}
+        self._leases = {}  # path -> (key, nama lease object)
+        self.metrics = {'local_hits': 0, 'gcs_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _bucket(self):
+        return self._storage_client.bucket(self._cache_bucket)
+
+    def _count(self, metric):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    # ---- Reference count dan lease ----
+
+    def _acquire(self, key):
+        lease_name = f"{CACHE_PREFIX}/{key}/_leases/{uuid.uuid4().hex}"
+        self._bucket().blob(lease_name).upload_from_string(datetime.now(timezone.utc).isoformat())
+        with self._lock:
+            self._refcounts[key] = self._refcounts.get(key, 0) + 1
+        return lease_name
+
+    def _release_lease(self, key, lease_name):
+        with self._lock:
+            self._refcounts[key] -= 1
+            if not self._refcounts[key]:
+                del self._refcounts[key]
+        try:
+            self._bucket().blob(lease_name).delete()
+        except NotFound:
+            pass
+
+    # Fungsi untuk melepas artifact setelah restore selesai memakainya
+    def release(self, path):
+        with self._lock:
+            key, lease_name = self._leases.pop(path, (None, None))
+        if key is None:
+            return
+        self._release_lease(key, lease_name)
+        if not self._use_local:
+            # Tanpa lapisan lokal, salinan lokal hanya sementara
+            with self._lock:
+                in_use = key in self._refcounts
+            if not in_use and os.path.exists(path):
+                os.remove(path)
+
+    def _leased_keys_gcs(self, blobs):
+        now = time.time()
+        leased = set()
+        for blob in blobs:
+            parts = blob.name.split('/')
+            if len(parts) == 4 and parts[2] == '_leases' and now - blob.time_created.timestamp() < LEASE_TTL_SECONDS:
+                leased.add(parts[1])
+        return leased
+
+    # ---- Ambil atau buat artifact ----
+
+    # Fungsi untuk menulis artifact lewat file sementara lalu os.replace, agar proses lain
+    # tidak pernah melihat artifact yang setengah jadi di local_path
+    def _write_atomic(self, local_path, write):
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = f"{local_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, local_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # Fungsi untuk mengambil artifact dari cache atau membuatnya dengan build(path_tujuan).
+    # Mengembalikan path lokal artifact; panggil release(path) setelah selesai dipakai.
+    def fetch(self, bucket_name, object_name, artifact_name, build):
+        source = self._storage_client.bucket(bucket_name).get_blob(object_name)
+        if source is None:
+            raise FileNotFoundError(f"gs://{bucket_name}/{object_name} tidak ditemukan")
+        key = cache_key(bucket_name, object_name, source.generation)
+        lease_name = self._acquire(key)
+
+        try:
+            local_path = os.path.join(self._local_dir, key, artifact_name)
+            gcs_blob = self._bucket().blob(f"{CACHE_PREFIX}/{key}/{artifact_name}")
+
+            if self._use_local and os.path.exists(local_path):
+                os.utime(local_path)  # Tandai baru dipakai (LRU)
+                self._count('local_hits')
+                logging.info(f"Staging cache hit (lokal): {object_name}")
+            elif gcs_blob.exists():
+                self._write_atomic(local_path, gcs_blob.download_to_filename)
+                gcs_blob.metadata = {**(gcs_blob.metadata or {}), 'last-used': datetime.now(timezone.utc).isoformat()}
+                gcs_blob.patch()
+                self._count('gcs_hits')
+                logging.info(f"Staging cache hit (GCS): {object_name}")
+            else:
+                self._write_atomic(local_path, build)
+                gcs_blob.metadata = {
+                    'source': f"gs://{bucket_name}/{object_name}",
+                    'generation': str(source.generation),
+                    'last-used': datetime.now(timezone.utc).isoformat(),
+                }
+                gcs_blob.upload_from_filename(local_path)
+                self._count('misses')
+                logging.info(f"Staging cache miss: {object_name}, artifact disimpan ke cache")
+        except Exception:
+            self._release_lease(key, lease_name)
+            raise
+
+        with self._lock:
+            self._leases[local_path] = (key, lease_name)
+        logging.info(f"Staging cache metrics: {self.metrics}")
+        return local_path
+
+    # ---- Eviction ----
+
+    # Fungsi untuk menghapus artifact lokal yang terlalu tua atau melebihi batas ukuran (LRU)
+    def evict_local(self):
+        if not os.path.isdir(self._local_dir):
+            return
+        now = time.time()
+        entries = []
+        for key in os.listdir(self._local_dir):
+            directory = os.path.join(self._local_dir, key)
+            files = [os.path.join(directory, f) for f in os.listdir(directory)]
+            size = sum(os.path.getsize(f) for f in files)
+            last_used = max((os.path.getmtime(f) for f in files), default=0)
+            entries.append((last_used, key, directory, size))
+
+        total = sum(size for _, _, _, size in entries)
+        for last_used, key, directory, size in sorted(entries):
+            with self._lock:
+                in_use = key in self._refcounts
+            if in_use:
+                continue
+            if now - last_used > self._max_age_seconds or total > self._max_local_bytes:
+                shutil.rmtree(directory, ignore_errors=True)
+                total -= size
+                self._count('evictions')
+
+    # Fungsi untuk menghapus artifact di GCS yang terlalu tua atau melebihi batas ukuran (LRU),
+    # kecuali yang masih punya lease aktif
+    def evict_gcs(self):
+        blobs = list(self._storage_client.list_blobs(self._cache_bucket, prefix=f"{CACHE_PREFIX}/"))
+        leased = self._leased_keys_gcs(blobs)
+        now = time.time()
+
+        artifacts = []
+        for blob in blobs:
+            parts = blob.name.split('/')
+            if len(parts) != 3:
+                continue
+            last_used = (blob.metadata or {}).get('last-used')
+            last_used = datetime.fromisoformat(last_used).timestamp() if last_used else blob.time_created.timestamp()
+            artifacts.append((last_used, parts[1], blob))
+
+        total = sum(blob.size or 0 for _, _, blob in artifacts)
+        for last_used, key, blob in sorted(artifacts, key=lambda a: a[0]):
+            if key in leased:
+                continue
+            if now - last_used > self._max_age_seconds or total > self._max_gcs_bytes:
+                blob.delete()
+                total -= blob.size or 0
+                self._count('evictions')
+
+        # Lease yang kedaluwarsa (proses mati sebelum release) ikut dibersihkan
+        for blob in blobs:
+            parts = blob.name.split('/')
+            if len(parts) == 4 and parts[2] == '_leases' and now - blob.time_created.timestamp() >= LEASE_TTL_SECONDS:
+                blob.delete()
+
+    def evict(self):
+        if self._use_local:
+            self.evict_local()
+        self.evict_gcs()
+        logging.info(f"Staging cache metrics: {self.metrics}")
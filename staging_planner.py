@@ -0,0 +1,320 @@
+import contextlib
+import gzip
+import io
+import json
+import logging
+import math
+import os
+import resource
+import shutil
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from google.api_core.exceptions import NotFound
+
+# Riwayat rencana staging dan pemakaian puncak per tahap, untuk menyetel ambang planner
+STAGING_HISTORY_BLOB = '_staging/history.json'
+STAGING_PREFIX = '_staging/objects'  # Hasil ekstraksi strategi gcs_stream
+MAX_HISTORY_ENTRIES = 200
+
+HEADROOM = 0.8  # Bagian memori/disk yang boleh dipakai staging
+MEMORY_OVERHEAD = 1.2  # Memori strategi memory relatif terhadap ukuran object terkompresi
+DEFAULT_GZIP_RATIO = 5.0  # Perkiraan rasio kompresi jika ukuran asli tidak bisa dipastikan
+COPY_CHUNK = 16 * 1024 * 1024
+
+# Strategi staging:
+# - memory: object terkompresi di-download ke memori, diekstrak langsung ke file (tanpa salinan .gz di disk)
+# - local_disk: object di-download ke disk lalu diekstrak (butuh disk untuk .gz + hasil ekstraksi)
+# - gcs_stream: ekstraksi streaming dari GCS ke object GCS, lalu diimport lewat Admin API (tanpa disk lokal)
+# - direct: object tidak perlu diekstrak dan diimport langsung dari GCS lewat Admin API
+MEMORY = 'memory'
+LOCAL_DISK = 'local_disk'
+GCS_STREAM = 'gcs_stream'
+DIRECT = 'direct'
+
+
+# Fungsi untuk memperkirakan ukuran asli object .gz. Urutan sumber: metadata 'uncompressed-size',
+# lalu trailer ISIZE gzip (4 byte terakhir, ukuran asli modulo 2^32). Untuk file > 4 GB ISIZE
+# ambigu, dipilih kelipatan 2^32 yang rasionya paling dekat dengan DEFAULT_GZIP_RATIO.
+def uncompressed_size(blob):
+    metadata = blob.metadata or {}
+    if 'uncompressed-size' in metadata:
+        return int(metadata['uncompressed-size'])
+    if not blob.name.endswith('.gz') or blob.size < 18:
+        return blob.size
+
+    trailer = blob.download_as_bytes(start=blob.size - 4, end=blob.size - 1)
+    isize = int.from_bytes(trailer, 'little')
+    expected = blob.size * DEFAULT_GZIP_RATIO
+    candidates = [isize + k * 2 ** 32 for k in range(0, 64)]
+    candidates = [c for c in candidates if c >= blob.size] or [expected]
+    return int(min(candidates, key=lambda c: abs(math.log(c / expected))))
+
+
+def _read_number(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return None if value == 'max' else int(value)
+
+
+# Fungsi untuk membaca memori yang masih tersedia: MemAvailable dari /proc/meminfo,
+# dibatasi sisa limit cgroup (v2 atau v1) jika ada
+def available_memory():
+    candidates = []
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    candidates.append(int(line.split()[1]) * 1024)
+    except OSError:
+        pass
+
+    for limit_path, usage_path in (
+        ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current'),
+        ('/sys/fs/cgroup/memory/memory.limit_in_bytes', '/sys/fs/cgroup/memory/memory.usage_in_bytes'),
+    ):
+        limit = _read_number(limit_path)
+        usage = _read_number(usage_path)
+        # cgroup v1 tanpa limit melaporkan angka sangat besar, tidak ikut dipertimbangkan
+        if limit is not None and usage is not None and limit < 2 ** 60:
+            candidates.append(max(limit - usage, 0))
+            break
+    return min(candidates) if candidates else 0
+
+
+# Fungsi untuk memeriksa apakah path berada di filesystem berbasis memori (tmpfs). Di Cloud
+# Functions /tmp adalah tmpfs, jadi file yang ditulis ke sana ikut memakai memori instance.
+def is_memory_backed(path):
+    path = os.path.realpath(path)
+    best, fstype = '', None
+    try:
+        with open('/proc/mounts') as f:
+            for line in f:
+                parts = line.split()
+                mount_point = parts[1]
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) > len(best):
+                    best, fstype = mount_point, parts[2]
+    except OSError:
+        return False
+    return fstype in ('tmpfs', 'ramfs')
+
+
+def available_disk(path):
+    return shutil.disk_usage(path).free
+
+
+# Planner strategi staging berdasarkan ukuran object, rasio kompresi, memori dan disk tersedia.
+# Faktor memori strategi memory dikalibrasi dari riwayat pemakaian puncak (lihat StagingHistory).
+class StagingPlanner:
+    def __init__(self, temp_dir, headroom=HEADROOM, memory_overhead=MEMORY_OVERHEAD, history=None):
+        self._temp_dir = temp_dir
+        self._headroom = headroom
+        self._memory_overhead = memory_overhead
+        if history:
+            self._memory_overhead = max(memory_overhead, history.observed_memory_overhead() or 0)
+
+    def plan(self, blob, needs_extraction=True):
+        compressed = blob.size or 0
+        uncompressed = uncompressed_size(blob) if needs_extraction else compressed
+        memory = available_memory() * self._headroom
+        disk = available_disk(self._temp_dir) * self._headroom
+        memory_backed = is_memory_backed(self._temp_dir)
+
+        def fits(memory_needed, disk_needed):
+            if memory_backed:
+                return memory_needed + disk_needed <= memory
+            return memory_needed <= memory and disk_needed <= disk
+
+        if not needs_extraction:
+            strategy, predicted_memory, predicted_disk = DIRECT, 0, 0
+        elif fits(compressed * self._memory_overhead + COPY_CHUNK * 2, uncompressed):
+            strategy, predicted_memory, predicted_disk = MEMORY, compressed * self._memory_overhead + COPY_CHUNK * 2, uncompressed
+        elif fits(0, compressed + uncompressed):
+            strategy, predicted_memory, predicted_disk = LOCAL_DISK, 0, compressed + uncompressed
+        else:
+            strategy, predicted_memory, predicted_disk = GCS_STREAM, COPY_CHUNK * 2, 0
+
+        plan = {
+            'object': blob.name,
+            'strategy': strategy,
+            'compressed_bytes': compressed,
+            'uncompressed_bytes': uncompressed,
+            'memory_available': int(memory),
+            'disk_available': int(disk),
+            'memory_backed_disk': memory_backed,
+            'predicted_memory_bytes': int(predicted_memory),
+            'predicted_disk_bytes': int(predicted_disk),
+        }
+        logging.info(
+            f"Rencana staging {blob.name}: {strategy} ({compressed / 1024 ** 2:.0f} MB -> "
+            f"{uncompressed / 1024 ** 2:.0f} MB, memori {memory / 1024 ** 2:.0f} MB, disk {disk / 1024 ** 2:.0f} MB"
+            f"{', disk berbasis memori' if memory_backed else ''})"
+        )
+        return plan
+
+
+# ---- Eksekusi strategi ----
+
+def extract_in_memory(blob, extracted_file_path):
+    data = io.BytesIO(blob.download_as_bytes())
+    with gzip.GzipFile(fileobj=data) as f_in:
+        with open(extracted_file_path, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out, COPY_CHUNK)
+
+
+def extract_via_disk(blob, gzip_file_path, extracted_file_path):
+    blob.download_to_filename(gzip_file_path)
+    try:
+        with gzip.open(gzip_file_path, 'rb') as f_in:
+            with open(extracted_file_path, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out, COPY_CHUNK)
+    finally:
+        os.remove(gzip_file_path)
+
+
+# Fungsi untuk ekstraksi streaming GCS -> GCS; mengembalikan URI object hasil ekstraksi
+def extract_to_gcs(blob, staging_bucket):
+    target = blob.bucket.client.bucket(staging_bucket).blob(
+        f"{STAGING_PREFIX}/{os.path.basename(blob.name).replace('.gz', '')}"
+    )
+    with blob.open('rb', chunk_size=COPY_CHUNK) as raw:
+        with gzip.GzipFile(fileobj=raw) as f_in:
+            with target.open('wb', chunk_size=COPY_CHUNK) as f_out:
+                shutil.copyfileobj(f_in, f_out, COPY_CHUNK)
+    return f"gs://{staging_bucket}/{target.name}"
+
+
+# ---- Pengukuran pemakaian puncak per tahap ----
+
+def _current_rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Tanpa /proc hanya puncak seumur proses yang tersedia
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Sampler pemakaian puncak setiap tahap: RSS proses (sampling /proc/self/status), heap Python
+# (tracemalloc, opsional karena memperlambat dekompresi) dan pemakaian disk di temp_dir. Angka
+# berlaku untuk seluruh proses, jadi tahap yang berjalan bersamaan ikut terukur di puncak satu sama lain.
+class ResourceProfiler:
+    def __init__(self, disk_path, interval=0.2, trace_python=False):
+        self._disk_path = disk_path
+        self._interval = interval
+        self._trace_python = trace_python
+        self._lock = threading.Lock()
+        self._heap_peaks = {}  # Puncak heap per tahap yang sedang berjalan
+        self._started_tracing = False
+        self.peaks = {}
+
+    # Puncak tracemalloc hanya satu untuk seluruh proses: sebelum di-reset, puncak interval
+    # terakhir dilipat ke semua tahap yang sedang berjalan agar puncak tahap lain tidak hilang
+    def _fold_heap_peak(self):
+        _, heap_peak = tracemalloc.get_traced_memory()
+        for token in self._heap_peaks:
+            self._heap_peaks[token] = max(self._heap_peaks[token], heap_peak)
+        tracemalloc.reset_peak()
+
+    def _start_tracing(self, token):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            self._fold_heap_peak()
+            self._heap_peaks[token] = tracemalloc.get_traced_memory()[0]
+
+    def _stop_tracing(self, token):
+        with self._lock:
+            self._fold_heap_peak()
+            heap_peak = self._heap_peaks.pop(token)
+            if not self._heap_peaks and self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+        return heap_peak
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        token = object()
+        if self._trace_python:
+            self._start_tracing(token)
+        baseline_rss = _current_rss()
+        baseline_disk = shutil.disk_usage(self._disk_path).used
+        peak = {'rss': baseline_rss, 'disk': baseline_disk}
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self._interval):
+                peak['rss'] = max(peak['rss'], _current_rss())
+                peak['disk'] = max(peak['disk'], shutil.disk_usage(self._disk_path).used)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        started = time.monotonic()
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            heap_peak = self._stop_tracing(token) if self._trace_python else None
+            self.peaks[name] = {
+                'seconds': round(time.monotonic() - started, 1),
+                'rss_peak_bytes': peak['rss'],
+                'rss_delta_bytes': peak['rss'] - baseline_rss,
+                'python_heap_peak_bytes': heap_peak,
+                'disk_delta_bytes': peak['disk'] - baseline_disk,
+            }
+
+
+# Riwayat rencana staging beserta pemakaian puncak yang sebenarnya, disimpan sebagai JSON di GCS
+class StagingHistory:
+    def __init__(self, storage_client, bucket_name):
+        self._storage_client = storage_client
+        self._bucket_name = bucket_name
+
+    def _blob(self):
+        return self._storage_client.bucket(self._bucket_name).blob(STAGING_HISTORY_BLOB)
+
+    def load(self):
+        try:
+            return json.loads(self._blob().download_as_bytes())
+        except NotFound:
+            return []
+
+    def record(self, plan, peaks):
+        entry = {'at': datetime.now(timezone.utc).isoformat(), 'plan': plan, 'stages': peaks}
+        try:
+            history = (self.load() + [entry])[-MAX_HISTORY_ENTRIES:]
+            self._blob().upload_from_string(json.dumps(history), content_type='application/json')
+        except Exception as e:
+            # Riwayat hanya untuk menyetel ambang, jangan gagalkan restore
+            logging.error(f"Gagal menyimpan riwayat staging: {e}")
+        staging = peaks.get('staging')
+        if staging:
+            logging.info(
+                f"Staging {plan['strategy']}: puncak RSS +{staging['rss_delta_bytes'] / 1024 ** 2:.0f} MB "
+                f"(perkiraan {plan['predicted_memory_bytes'] / 1024 ** 2:.0f} MB), disk "
+                f"+{staging['disk_delta_bytes'] / 1024 ** 2:.0f} MB (perkiraan {plan['predicted_disk_bytes'] / 1024 ** 2:.0f} MB)"
+            )
+
+    # Faktor memori strategi memory terbesar yang pernah teramati (puncak RSS / ukuran terkompresi)
+    def observed_memory_overhead(self):
+        try:
+            history = self.load()
+        except Exception as e:
+            logging.error(f"Gagal membaca riwayat staging: {e}")
+            return None
+        factors = [
+            entry['stages']['staging']['rss_delta_bytes'] / entry['plan']['compressed_bytes']
+            for entry in history
+            if entry['plan']['strategy'] == MEMORY and 'staging' in entry.get('stages', {})
+            and entry['plan']['compressed_bytes']
+        ]
+        return max(factors) if factors else None
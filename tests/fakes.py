@@ -0,0 +1,54 @@
+import io
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+
+class _FakeWriter(io.BytesIO):
+    def __init__(self, blob):
+        super().__init__()
+        self._blob = blob
+
+    def close(self):
+        if not self.closed:
+            self._blob.upload_from_string(self.getvalue())
+        super().close()
+
+
+# Bucket GCS di memori: object disimpan sebagai (isi, generation)
+class FakeBlob:
+    def __init__(self, objects, name):
+        self._objects = objects
+        self.name = name
+        self.generation = None
+
+    def download_as_bytes(self):
+        if self.name not in self._objects:
+            raise NotFound(self.name)
+        data, self.generation = self._objects[self.name]
+        return data
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None):
+        current = self._objects.get(self.name, (None, 0))[1]
+        if if_generation_match is not None and if_generation_match != current:
+            raise PreconditionFailed(self.name)
+        self._objects[self.name] = (data.encode() if isinstance(data, str) else data, current + 1)
+
+    def open(self, mode='rb', chunk_size=None):
+        if mode == 'rb':
+            return io.BytesIO(self.download_as_bytes())
+        return _FakeWriter(self)
+
+    def delete(self):
+        if self.name not in self._objects:
+            raise NotFound(self.name)
+        del self._objects[self.name]
+
+
+class FakeStorageClient:
+    def __init__(self):
+        self.objects = {}
+
+    def bucket(self, name):
+        return self
+
+    def blob(self, name):
+        return FakeBlob(self.objects, name)
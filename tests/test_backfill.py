@@ -0,0 +1,72 @@
+import types
+import pytest
+from backfill import BackfillItem, BackfillState, Progress, plan, run_scheduled
+from restore_scheduler import RestoreScheduler, ImportRateHistory
+
+MB = 1024 * 1024
+
+
+def test_plan_orders_dependencies_before_file_name():
+    items = [
+        BackfillItem('a', 'bucket', 'sea_uat_20240801.bak', 10, depends_on=['b']),
+        BackfillItem('b', 'bucket', 'sea_uat_20240802.bak', 10),
+        BackfillItem('c', 'bucket', 'sea_uat_20240803.bak', 10),
+    ]
+    groups = plan(items, ['instance-a'])
+    assert [item.item_id for item in groups['instance-a']] == ['b', 'a', 'c']
+
+
+def test_plan_assigns_unpinned_items_to_least_loaded_instance():
+    items = [
+        BackfillItem('pinned', 'bucket', 'a.bak', 100, instance_name='instance-a'),
+        BackfillItem('x', 'bucket', 'b.bak', 10),
+        BackfillItem('y', 'bucket', 'c.bak', 10),
+    ]
+    groups = plan(items, ['instance-a', 'instance-b'])
+    assert [item.item_id for item in groups['instance-a']] == ['pinned']
+    assert [item.item_id for item in groups['instance-b']] == ['x', 'y']
+
+
+def test_plan_rejects_cycles():
+    items = [
+        BackfillItem('a', 'bucket', 'a.bak', depends_on=['b']),
+        BackfillItem('b', 'bucket', 'b.bak', depends_on=['a']),
+    ]
+    with pytest.raises(ValueError):
+        plan(items, ['instance-a'])
+
+
+def test_run_scheduled_goes_through_restore_scheduler(capsys):
+    calls = []
+
+    def run_restore_job(item, instance_name):
+        calls.append(item.file_name)
+        if item.file_name == 'broken.bak':
+            raise RuntimeError('import gagal')
+
+    def create_restore_scheduler(instance_names=None, run_job=None):
+        return RestoreScheduler(instance_names, run_job or run_restore_job, ImportRateHistory())
+
+    app = types.SimpleNamespace(
+        project='project',
+        run_restore_job=run_restore_job,
+        create_restore_scheduler=create_restore_scheduler,
+        start_cloud_sql=lambda name, project: calls.append(f"start {name}"),
+        wait_until_sql_ready=lambda project, name: None,
+        stop_cloud_sql=lambda name, project: calls.append(f"stop {name}"),
+    )
+    items = [
+        BackfillItem('big', 'bucket', 'big.bak', 1000 * MB),
+        BackfillItem('broken', 'bucket', 'broken.bak', 500 * MB),
+        BackfillItem('small', 'bucket', 'small.bak', 10 * MB),
+    ]
+    state = BackfillState(None)
+    progress = Progress(items)
+    run_scheduled(app, items, ['instance-a'], state, progress, keep_running=False)
+
+    # Shortest-job-first: yang kecil lebih dulu
+    assert calls == ['start instance-a', 'small.bak', 'broken.bak', 'big.bak', 'stop instance-a']
+    assert state.completed == {'small', 'big'}
+    assert progress.failed == 1
+    assert all(item.done.is_set() for item in items)
+    assert 'perkiraan selesai' in capsys.readouterr().out
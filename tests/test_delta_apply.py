@@ -0,0 +1,143 @@
+import contextlib
+import gzip
+import io
+import json
+import pytest
+from delta_apply import DeltaApplier, normalize_table
+from fakes import FakeStorageClient
+
+DUMP = b"""CREATE TABLE [dbo].[orders] (id int)
+GO
+INSERT INTO [dbo].[orders] VALUES (1)
+INSERT INTO [dbo].[orders] VALUES (2)
+GO
+"""
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConnection:
+    def __init__(self, fail_on=None, referencing=()):
+        self.statements = []
+        self.queries = []
+        self._fail_on = fail_on
+        self._referencing = list(referencing)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+        if self._fail_on and self._fail_on in statement:
+            raise RuntimeError(f"gagal: {self._fail_on}")
+
+    def execute(self, query, params=None):
+        self.queries.append(str(query))
+        return FakeResult(self._referencing)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeEngine:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def connect(self):
+        return self._connection
+
+
+def _applier(storage_client, dump=DUMP, engine=None):
+    opened = []
+
+    def open_stream():
+        opened.append(1)
+        return contextlib.closing(io.BytesIO(gzip.compress(dump)))
+
+    return DeltaApplier(storage_client, 'bucket', 'sea_agi_db', engine, open_stream), opened
+
+
+def _save_previous(storage_client, dump):
+    applier, _ = _applier(storage_client, dump)
+    applier.save_fingerprints()
+
+
+def _fail_inserts(connection):
+    original = connection.exec_driver_sql
+
+    def exec_driver_sql(statement):
+        if statement.startswith('INSERT'):
+            raise RuntimeError('gagal: INSERT')
+        original(statement)
+
+    return exec_driver_sql
+
+
+def test_normalize_table():
+    assert normalize_table('[dbo].[Orders]') == 'dbo.orders'
+    assert normalize_table('Orders') == 'dbo.orders'
+
+
+def test_full_import_reuses_fingerprints():
+    storage_client = FakeStorageClient()
+    applier, opened = _applier(storage_client)
+    assert applier.apply() == 'full'
+    applier.save_fingerprints()
+    # Dump hanya dibaca sekali walaupun fingerprint disimpan setelah import penuh
+    assert len(opened) == 1
+    assert 'dbo.orders' in json.loads(storage_client.objects['_delta/sea_agi_db.json'][0])['data']
+
+
+def test_load_error_is_not_masked_by_constraint_check():
+    storage_client = FakeStorageClient()
+    _save_previous(storage_client, DUMP.replace(b'(2)', b'(3)'))
+    connection = FakeConnection(fail_on='CHECK CHECK CONSTRAINT')
+    connection.exec_driver_sql = _fail_inserts(connection)
+    applier, _ = _applier(storage_client, engine=FakeEngine(connection))
+
+    with pytest.raises(RuntimeError, match='INSERT'):
+        applier.apply()
+    assert any('CHECK CHECK CONSTRAINT' in s for s in connection.statements)
+
+
+def test_apply_changed_table():
+    storage_client = FakeStorageClient()
+    _save_previous(storage_client, DUMP.replace(b'(2)', b'(3)'))
+    connection = FakeConnection()
+    applier, _ = _applier(storage_client, engine=FakeEngine(connection))
+
+    assert applier.apply() == 'applied'
+    assert connection.statements[1] == 'TRUNCATE TABLE [dbo].[orders]'
+    assert 'VALUES (2)' in connection.statements[2]
+    assert 'CHECK CHECK CONSTRAINT' in connection.statements[-1]
+
+
+def test_constraints_limited_to_changed_and_referencing_tables():
+    storage_client = FakeStorageClient()
+    _save_previous(storage_client, DUMP.replace(b'(2)', b'(3)'))
+    connection = FakeConnection(referencing=[('dbo', 'Order_Items')])
+    applier, _ = _applier(storage_client, engine=FakeEngine(connection))
+
+    assert applier.apply() == 'applied'
+    assert "OBJECT_ID(N'[dbo].[orders]')" in connection.queries[0]
+    assert connection.statements[0] == (
+        "ALTER TABLE [dbo].[order_items] NOCHECK CONSTRAINT ALL\n"
+        "ALTER TABLE [dbo].[orders] NOCHECK CONSTRAINT ALL"
+    )
+    assert connection.statements[-1] == (
+        "ALTER TABLE [dbo].[order_items] WITH CHECK CHECK CONSTRAINT ALL\n"
+        "ALTER TABLE [dbo].[orders] WITH CHECK CHECK CONSTRAINT ALL"
+    )
+    assert not any('sp_MSforeachtable' in s for s in connection.statements)
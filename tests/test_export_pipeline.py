@@ -0,0 +1,106 @@
+import gzip
+from datetime import datetime
+import pytest
+from export_pipeline import ExportJob, ExportPipeline, backup_file_type, export_file_name, EXPORT_TMP_PREFIX
+from fakes import FakeStorageClient
+
+
+class FakeExportAdmin:
+    def __init__(self, storage_client):
+        self._storage_client = storage_client
+        self.exports = []
+
+    def _export(self, uri, database):
+        name = uri.split('/', 3)[3]
+        self.exports.append(name)
+        self._storage_client.objects[name] = (f"backup {database}".encode(), 1)
+        return {'name': f"op-{len(self.exports)}"}
+
+    def export_bak(self, project, instance_name, database, uri, striped=False, stripe_count=None, offload=True):
+        return self._export(uri, database)
+
+    def export_sql(self, project, instance_name, database, uri, offload=True):
+        return self._export(uri, database)
+
+    def wait_for_operation(self, project, operation):
+        return {'status': 'DONE'}
+
+
+def _pipeline():
+    storage_client = FakeStorageClient()
+    return ExportPipeline(FakeExportAdmin(storage_client), 'project', storage_client, 'exports'), storage_client
+
+
+def test_export_file_names():
+    day = datetime(2024, 8, 7)
+    assert export_file_name('SEA', 'UAT', day=day) == 'sea_uat_20240807.bak'
+    assert export_file_name('SEA', 'UAT', day=day, compress=True) == 'sea_uat_20240807.bak.gz'
+    assert export_file_name('SEA', 'UAT', 'SQL', day=day) == 'sea_uat_20240807.gz'
+
+
+@pytest.mark.parametrize('file_type, compress', [('BAK', False), ('BAK', True), ('SQL', False)])
+def test_export_names_restore_with_same_file_type(file_type, compress):
+    # Nama hasil export harus diimport kembali dengan tipe yang sama (.bak.gz tetap BAK)
+    name = export_file_name('sea', 'uat', file_type, day=datetime(2024, 8, 7), compress=compress)
+    assert backup_file_type(name) == file_type
+
+
+def test_backup_file_type_unknown():
+    assert backup_file_type('sea_uat_20240807.csv') is None
+
+
+def test_invalid_jobs_rejected():
+    with pytest.raises(ValueError):
+        ExportJob('instance-a', 'db', 'sea', 'uat', file_type='CSV')
+    with pytest.raises(ValueError):
+        ExportJob('instance-a', 'db', 'sea', 'uat', striped=True, compress=True)
+
+
+def test_duplicate_name_rejected():
+    pipeline, _ = _pipeline()
+    pipeline.submit(ExportJob('instance-a', 'db', 'sea', 'uat'))
+    with pytest.raises(ValueError):
+        pipeline.submit(ExportJob('instance-b', 'db', 'sea', 'uat'))
+    pipeline.join()
+
+
+def test_compressed_and_plain_bak_do_not_collide():
+    pipeline, storage_client = _pipeline()
+    plain = pipeline.submit(ExportJob('instance-a', 'plain_db', 'sea', 'uat'))
+    compressed = pipeline.submit(ExportJob('instance-b', 'gz_db', 'sea', 'uat', compress=True))
+    pipeline.join()
+
+    assert plain.error is None and compressed.error is None
+    assert storage_client.objects[plain.file_name][0] == b'backup plain_db'
+    assert gzip.decompress(storage_client.objects[compressed.file_name][0]) == b'backup gz_db'
+    # Object sementara sudah dihapus
+    assert not [name for name in storage_client.objects if name.startswith(EXPORT_TMP_PREFIX)]
+
+
+def test_temporary_object_removed_when_compression_fails(monkeypatch):
+    pipeline, storage_client = _pipeline()
+
+    def broken_compress(source_name, target_name):
+        raise RuntimeError('kompresi gagal')
+
+    monkeypatch.setattr(pipeline, '_compress', broken_compress)
+    with pytest.raises(RuntimeError):
+        pipeline.run_job(ExportJob('instance-a', 'db', 'sea', 'uat', compress=True))
+    assert storage_client.objects == {}
+
+
+def test_run_job_uses_name_reserved_at_submit():
+    pipeline, storage_client = _pipeline()
+    job = ExportJob('instance-a', 'db', 'sea', 'uat', compress=True)
+    # Nama dicadangkan sebelum tengah malam, export baru jalan setelah pergantian hari
+    job.file_name = 'sea_uat_20240807.bak.gz'
+    pipeline.run_job(job)
+    assert job.file_name == 'sea_uat_20240807.bak.gz'
+    assert gzip.decompress(storage_client.objects['sea_uat_20240807.bak.gz'][0]) == b'backup db'
+
+
+def test_submit_stores_reserved_name():
+    pipeline, _ = _pipeline()
+    job = pipeline.submit(ExportJob('instance-a', 'db', 'sea', 'uat', file_type='SQL'))
+    assert job.file_name == export_file_name('sea', 'uat', 'SQL')
+    pipeline.join()
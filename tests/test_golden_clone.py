@@ -0,0 +1,65 @@
+import re
+from golden_clone import GoldenCloner
+from fakes import FakeStorageClient
+
+
+class FakeAdminClient:
+    def __init__(self, golden_tier):
+        self.golden_tier = golden_tier
+        self.clones = []
+        self.patches = {}
+
+    def clone_instance(self, project, source, destination):
+        self.clones.append(destination)
+        return {'name': f'clone-{destination}'}
+
+    def wait_for_operation(self, project, operation, poll_interval=10, timeout=None):
+        return {'status': 'DONE'}
+
+    def get_instance_state(self, project, instance_name, use_cache=True):
+        return 'RUNNABLE'
+
+    def get_instance(self, project, instance_name, use_cache=True):
+        return {'connectionName': f'project:region:{instance_name}', 'settings': {'tier': self.golden_tier}}
+
+    def patch_instance(self, project, instance_name, body):
+        self.patches[instance_name] = body['settings']
+        return {'name': f'patch-{instance_name}'}
+
+    def list_users(self, project, instance_name):
+        return []
+
+
+def _cloner(admin_client, base_tier=None):
+    return GoldenCloner(admin_client, 'project', 'golden', FakeStorageClient(), 'bucket',
+                        connect=None, base_tier=base_tier)
+
+
+def test_clone_defaults_to_golden_base_tier():
+    # Golden sedang di-scale-up untuk restore, clone tidak boleh ikut tier besar
+    admin_client = FakeAdminClient('db-custom-16-65536')
+    cloner = _cloner(admin_client, base_tier='db-custom-2-8192')
+
+    results = cloner.refresh_all([
+        {'name': 'uat', 'instance_prefix': 'sea-uat'},
+        {'name': 'dev', 'instance_prefix': 'sea-dev', 'settings': {'tier': 'db-custom-1-3840'}},
+    ], 'sea_agi_db')
+
+    assert admin_client.patches[results['uat']['instance']]['tier'] == 'db-custom-2-8192'
+    assert admin_client.patches[results['dev']['instance']]['tier'] == 'db-custom-1-3840'
+
+
+def test_base_tier_read_from_golden_when_not_given():
+    admin_client = FakeAdminClient('db-custom-4-16384')
+    entry = _cloner(admin_client).refresh({'name': 'uat', 'instance_prefix': 'sea-uat'}, 'sea_agi_db')
+    assert admin_client.patches[entry['instance']]['tier'] == 'db-custom-4-16384'
+
+
+def test_destination_names_are_unique_within_a_minute():
+    admin_client = FakeAdminClient('db-custom-2-8192')
+    cloner = _cloner(admin_client)
+    for _ in range(3):
+        cloner.refresh({'name': 'uat', 'instance_prefix': 'sea-uat', 'keep_previous': True}, 'sea_agi_db')
+
+    assert len(set(admin_client.clones)) == 3
+    assert all(re.fullmatch(r'sea-uat-\d{14}-[0-9a-f]{4}', name) for name in admin_client.clones)
@@ -0,0 +1,171 @@
+import csv
+import pytest
+import partitioned_load
+from partitioned_load import PartitionedCsvLoader, find_partition_boundaries, read_partition_rows
+
+
+def _write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+
+def _rows(count):
+    return [[str(i), f'nama {i}', f'baris\n"kutip" {i}, dengan koma' if i % 3 == 0 else 'biasa'] for i in range(count)]
+
+
+@pytest.mark.parametrize('partitions', [1, 2, 3, 7])
+def test_partitions_cover_file_and_rows(tmp_path, partitions):
+    rows = _rows(200)
+    path = _write_csv(tmp_path / 'data.csv', rows)
+    ranges = find_partition_boundaries(path, partitions)
+
+    assert ranges[0][0] == 0
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert ranges[-1][1] == len(data)
+    # Setiap batas jatuh tepat setelah newline di luar field ber-quote
+    for start, _ in ranges[1:]:
+        assert data[start - 1:start] == b'\n'
+        assert data[:start].count(b'"') % 2 == 0
+
+    parsed = [row for start, end in ranges for row in read_partition_rows(path, start, end)]
+    assert parsed == rows
+
+
+def test_boundary_search_crosses_scan_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(partitioned_load, 'SCAN_CHUNK_SIZE', 16)
+    rows = _rows(50)
+    path = _write_csv(tmp_path / 'data.csv', rows)
+    ranges = find_partition_boundaries(path, 4)
+    parsed = [row for start, end in ranges for row in read_partition_rows(path, start, end)]
+    assert parsed == rows
+
+
+def test_small_file_collapses_partitions(tmp_path):
+    path = _write_csv(tmp_path / 'data.csv', [['1', 'a']])
+    assert find_partition_boundaries(path, 4) == [(0, len('1,a\r\n'))]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql):
+        self._conn.statements.append(sql)
+
+    def executemany(self, sql, rows):
+        self._conn.pending.extend(rows)
+
+
+class FakeConnection:
+    def __init__(self, table):
+        self._table = table
+        self.statements = []
+        self.pending = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self._table.extend(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        pass
+
+
+def test_connect_failure_is_retried(tmp_path):
+    path = _write_csv(tmp_path / 'data.csv', _rows(20))
+    table = []
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError('koneksi gagal')
+        return FakeConnection(table)
+
+    loader = PartitionedCsvLoader(connect, 'target', ['id', 'nama', 'catatan'], workers=1, max_attempts=2)
+    result = loader.load(path)
+    assert len(attempts) == 2
+    assert result['rows'] == 20
+    assert len(table) == 20
+
+
+def test_failed_partition_reraises_after_other_partitions(tmp_path):
+    path = _write_csv(tmp_path / 'data.csv', _rows(60))
+    table = []
+
+    def rows_from_partition(file_path, start, end, skip_header):
+        if start == 0:
+            raise ValueError('baris rusak')
+        return [list(read_partition_rows(file_path, start, end))]
+
+    loader = PartitionedCsvLoader(lambda: FakeConnection(table), 'target', ['id', 'nama', 'catatan'], workers=2,
+                                  max_attempts=2, rows_from_partition=rows_from_partition)
+    with pytest.raises(ValueError):
+        loader.load(path)
+    # Tanpa staging, partisi lain yang berhasil tetap tertulis (pemanggil yang mengosongkan)
+    assert 0 < len(table) < 60
+
+
+class DroppedConnection(FakeConnection):
+    def rollback(self):
+        raise ConnectionError('koneksi sudah putus')
+
+    def close(self):
+        raise ConnectionError('koneksi sudah putus')
+
+
+def test_failed_rollback_is_retried(tmp_path):
+    path = _write_csv(tmp_path / 'data.csv', _rows(20))
+    table = []
+    connections = []
+
+    def connect():
+        conn = DroppedConnection(table) if not connections else FakeConnection(table)
+        connections.append(conn)
+        return conn
+
+    def rows_from_partition(file_path, start, end, skip_header):
+        if len(connections) == 1:
+            raise ConnectionError('server pergi')
+        return [list(read_partition_rows(file_path, start, end, skip_header))]
+
+    loader = PartitionedCsvLoader(connect, 'target', ['id', 'nama', 'catatan'], workers=1, max_attempts=2,
+                                  rows_from_partition=rows_from_partition)
+    assert loader.load(path)['rows'] == 20
+    assert len(connections) == 2
+
+
+def test_failed_staging_load_drops_staging_tables(tmp_path):
+    path = _write_csv(tmp_path / 'data.csv', _rows(60))
+    table = []
+    connections = []
+
+    def connect():
+        connections.append(FakeConnection(table))
+        return connections[-1]
+
+    def rows_from_partition(file_path, start, end, skip_header):
+        if start == 0:
+            raise ValueError('baris rusak')
+        return [list(read_partition_rows(file_path, start, end))]
+
+    loader = PartitionedCsvLoader(connect, 'target', ['id', 'nama', 'catatan'], workers=2, max_attempts=1,
+                                  use_staging=True, rows_from_partition=rows_from_partition)
+    with pytest.raises(ValueError):
+        loader.load(path)
+    drops = connections[-1].statements
+    assert drops == ['DROP TABLE IF EXISTS `target__part_0`', 'DROP TABLE IF EXISTS `target__part_1`']
@@ -0,0 +1,152 @@
+import json
+from datetime import datetime, timedelta, timezone
+from prewarm import PrewarmScheduler, arrival_prefix, learn_window, next_window, PREWARM_STATE_BLOB
+from fakes import FakeStorageClient
+
+
+def _arrivals(*times):
+    return [datetime(2024, 8, day, hour, minute, tzinfo=timezone.utc).isoformat()
+            for day, (hour, minute) in enumerate(times, start=1)]
+
+
+class FakeAdminClient:
+    def __init__(self, activation_policy, state='RUNNABLE'):
+        self.instance = {'state': state, 'settings': {'activationPolicy': activation_policy}}
+        self.patches = []
+
+    def get_instance(self, project, instance_name, use_cache=True):
+        return self.instance
+
+    def patch_instance(self, project, instance_name, body):
+        self.patches.append(body)
+        return {'name': 'op-1'}
+
+    def wait_for_operation(self, project, operation, poll_interval=10, timeout=None):
+        return {'status': 'DONE'}
+
+
+def test_arrival_prefix():
+    assert arrival_prefix('sea_uat_20240807.bak') == 'sea_uat'
+    assert arrival_prefix('backup/SEA_UAT_20240807.gz') == 'backup/sea_uat'
+
+
+def test_learn_window_needs_min_samples():
+    assert learn_window(_arrivals((2, 0), (2, 10))) is None
+
+
+def test_learn_window_wraps_midnight():
+    window = learn_window(_arrivals((23, 50), (0, 10), (23, 55), (0, 5)))
+    # Rata-rata sirkular sekitar tengah malam, bukan sekitar tengah hari
+    assert min(window['mean_minute'], 1440 - window['mean_minute']) < 5
+    assert window['half_width_minutes'] >= 15
+    assert window['samples'] == 4
+
+
+def test_learn_window_uniform_arrivals_unpredictable():
+    assert learn_window(_arrivals((0, 0), (6, 0), (12, 0), (18, 0))) is None
+
+
+def test_next_window_today_and_tomorrow():
+    window = {'mean_minute': 120, 'half_width_minutes': 30}
+    now = datetime(2024, 8, 7, 1, 0, tzinfo=timezone.utc)
+    start, expected, end = next_window(window, now)
+    assert expected == datetime(2024, 8, 7, 2, 0, tzinfo=timezone.utc)
+    assert (start, end) == (expected - timedelta(minutes=30), expected + timedelta(minutes=30))
+
+    # Jendela hari ini sudah lewat, yang dipakai jendela besok
+    _, expected, _ = next_window(window, datetime(2024, 8, 7, 3, 0, tzinfo=timezone.utc))
+    assert expected == datetime(2024, 8, 8, 2, 0, tzinfo=timezone.utc)
+
+
+def test_next_window_still_open_from_yesterday():
+    window = {'mean_minute': 1430, 'half_width_minutes': 30}
+    _, expected, _ = next_window(window, datetime(2024, 8, 8, 0, 5, tzinfo=timezone.utc))
+    assert expected == datetime(2024, 8, 7, 23, 50, tzinfo=timezone.utc)
+
+
+def _scheduler(admin_client):
+    storage_client = FakeStorageClient()
+    state = PrewarmScheduler._empty_state()
+    state['prefixes']['sea_uat'] = {'arrivals': _arrivals((2, 0), (2, 5), (1, 55))}
+    storage_client.objects[PREWARM_STATE_BLOB] = (json.dumps(state).encode(), 1)
+    return PrewarmScheduler(storage_client, admin_client, 'project', 'instance', 'bucket'), storage_client
+
+
+def test_tick_starts_stopped_instance_and_records_activation():
+    # Instance yang dimatikan tetap RUNNABLE, activation policy yang menentukan
+    admin_client = FakeAdminClient('NEVER', state='RUNNABLE')
+    scheduler, storage_client = _scheduler(admin_client)
+
+    assert scheduler.tick(now=datetime(2024, 8, 10, 1, 55, tzinfo=timezone.utc)) == 'started'
+    assert admin_client.patches == [{'settings': {'activationPolicy': 'ALWAYS'}}]
+    state = json.loads(storage_client.objects[PREWARM_STATE_BLOB][0])
+    assert state['prewarm']['prefix'] == 'sea_uat'
+    assert state['activation_seconds'] is not None
+
+
+def test_tick_skips_instance_already_on():
+    admin_client = FakeAdminClient('ALWAYS')
+    scheduler, _ = _scheduler(admin_client)
+
+    assert scheduler.tick(now=datetime(2024, 8, 10, 1, 55, tzinfo=timezone.utc)) == 'already_running'
+    assert admin_client.patches == []
+
+
+def _state(storage_client):
+    return json.loads(storage_client.objects[PREWARM_STATE_BLOB][0])
+
+
+def test_hit_keeps_instance_on_until_restore_finishes():
+    admin_client = FakeAdminClient('NEVER')
+    scheduler, storage_client = _scheduler(admin_client)
+    scheduler._hourly_cost = 2.0
+    started = datetime(2024, 8, 10, 1, 55, tzinfo=timezone.utc)
+    scheduler.tick(now=started)
+
+    assert scheduler.record_arrival('sea_uat_20240810.bak', now=started + timedelta(minutes=10))
+    # Restore kedua datang saat yang pertama masih berjalan
+    assert scheduler.record_arrival('sea_uat_20240810b.bak', now=started + timedelta(minutes=20))
+    assert scheduler.tick(now=started + timedelta(minutes=30)) == 'serving'
+
+    assert not scheduler.finish_restore(now=started + timedelta(minutes=40))
+    assert admin_client.patches[-1] == {'settings': {'activationPolicy': 'ALWAYS'}}
+    assert scheduler.finish_restore(now=started + timedelta(minutes=70))
+    assert admin_client.patches[-1] == {'settings': {'activationPolicy': 'NEVER'}}
+
+    report = _state(storage_client)['report']
+    assert report['prewarm_hits'] == 1
+    assert report['extra_runtime_seconds'] == 600
+    # Runtime dihitung sampai instance dimatikan, bukan sampai upload datang
+    assert report['runtime_seconds'] == 4200
+    assert report['runtime_cost'] == 4200 / 3600 * 2.0
+
+
+def test_finish_without_prewarm_does_nothing():
+    admin_client = FakeAdminClient('ALWAYS')
+    scheduler, _ = _scheduler(admin_client)
+    assert not scheduler.record_arrival('sea_uat_20240810.bak')
+    assert not scheduler.finish_restore()
+    assert admin_client.patches == []
+
+
+def test_tick_stops_instance_when_restore_never_finishes():
+    admin_client = FakeAdminClient('NEVER')
+    scheduler, storage_client = _scheduler(admin_client)
+    started = datetime(2024, 8, 10, 1, 55, tzinfo=timezone.utc)
+    scheduler.tick(now=started)
+    scheduler.record_arrival('sea_uat_20240810.bak', now=started + timedelta(minutes=5))
+
+    assert scheduler.tick(now=started + timedelta(hours=7)) == 'stopped'
+    assert admin_client.patches[-1] == {'settings': {'activationPolicy': 'NEVER'}}
+    assert _state(storage_client)['serving'] is None
+
+
+def test_missed_window_counts_runtime_until_stop():
+    admin_client = FakeAdminClient('NEVER')
+    scheduler, storage_client = _scheduler(admin_client)
+    started = datetime(2024, 8, 10, 1, 55, tzinfo=timezone.utc)
+    scheduler.tick(now=started)
+    assert scheduler.tick(now=started + timedelta(hours=3)) == 'stopped'
+    report = _state(storage_client)['report']
+    assert report['prewarm_misses'] == 1
+    assert report['runtime_seconds'] == report['extra_runtime_seconds'] == 3 * 3600
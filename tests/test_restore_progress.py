@@ -0,0 +1,85 @@
+import pytest
+from restore_progress import AdaptiveDeadline, RestoreStalled, wait_for_import
+
+
+def _deadline(expected_seconds=None, started=0.0):
+    deadline = AdaptiveDeadline(expected_seconds, slack=2.0, min_timeout=100, stall_factor=10, min_stall=50)
+    deadline._started = deadline._last_change = started
+    return deadline
+
+
+def test_estimate_from_history_before_progress():
+    deadline = _deadline(expected_seconds=300)
+    assert deadline.estimated_total() == 300
+    assert deadline.timeout_seconds() == 600
+    assert deadline.stall_seconds() is None
+
+
+def test_estimate_follows_observed_progress():
+    deadline = _deadline(expected_seconds=300)
+    deadline.update(25, now=100)
+    assert deadline.estimated_total() == pytest.approx(400)
+    assert deadline.timeout_seconds() == pytest.approx(800)
+    # 4 detik per persen x 10, minimal 50
+    assert deadline.stall_seconds() == pytest.approx(50)
+    deadline.update(20, now=200)
+    assert deadline.estimated_total() == pytest.approx(400)
+
+
+def test_minimum_timeout():
+    assert _deadline(expected_seconds=10).timeout_seconds() == 100
+    assert _deadline().timeout_seconds() is None
+
+
+def test_stall_detected():
+    deadline = _deadline(expected_seconds=1000)
+    deadline.update(10, now=100)
+    deadline.check('db', now=150)
+    with pytest.raises(RestoreStalled, match='macet'):
+        deadline.check('db', now=1200)
+
+
+def test_no_stall_check_after_completion():
+    deadline = _deadline(expected_seconds=1000)
+    deadline.update(100, now=100)
+    assert deadline.stall_seconds() is None
+
+
+def test_timeout_with_progress_signal():
+    deadline = _deadline(expected_seconds=100)
+    deadline.update(0.0, now=10)
+    with pytest.raises(RestoreStalled, match='batas waktu'):
+        deadline.check('db', now=250)
+
+
+def test_timeout_without_progress_signal_only_warns(caplog):
+    deadline = _deadline(expected_seconds=100)
+    deadline.update(None, now=10)
+    deadline.check('db', now=250)
+    deadline.check('db', now=500)
+    warnings = [r for r in caplog.records if 'tanpa info progress' in r.getMessage()]
+    assert len(warnings) == 1
+
+
+class FakeOperationClient:
+    def __init__(self, polls_until_done):
+        self._polls = polls_until_done
+        self.cancelled = []
+
+    def get_operation(self, project, operation_name):
+        self._polls -= 1
+        return {'status': 'DONE'} if self._polls <= 0 else {'status': 'RUNNING'}
+
+    def cancel_operation(self, project, operation_name):
+        self.cancelled.append(operation_name)
+
+
+def test_wait_for_import_without_engine_does_not_cancel():
+    client = FakeOperationClient(polls_until_done=3)
+    deadline = AdaptiveDeadline(0, min_timeout=0)
+    events = []
+    result = wait_for_import(client, 'project', {'name': 'op-1'}, 'db', deadline=deadline,
+                             on_progress=events.append, poll_interval=0)
+    assert result == {'status': 'DONE'}
+    assert client.cancelled == []
+    assert events[-1]['status'] == 'done'
@@ -0,0 +1,127 @@
+import threading
+import time
+from fakes import FakeBlob, FakeStorageClient
+from restore_scheduler import RestoreScheduler, ImportRateHistory, IMPORT_OVERHEAD_SECONDS, DEFAULT_IMPORT_RATE
+
+MB = 1024 * 1024
+
+
+def _scheduler(run_job=None, aging_factor=0.5, instances=('instance-a',)):
+    return RestoreScheduler(list(instances), run_job or (lambda job, instance_name: None),
+                            ImportRateHistory(), aging_factor=aging_factor)
+
+
+def test_estimate_uses_default_rate_without_history():
+    rates = ImportRateHistory()
+    assert rates.estimate_seconds('instance-a', DEFAULT_IMPORT_RATE * 10) == IMPORT_OVERHEAD_SECONDS + 10
+
+
+def test_record_updates_moving_average():
+    rates = ImportRateHistory(smoothing=0.5)
+    rates.record('instance-a', 100 * MB, IMPORT_OVERHEAD_SECONDS + 10)
+    assert rates.rate('instance-a') == 10 * MB
+    rates.record('instance-a', 300 * MB, IMPORT_OVERHEAD_SECONDS + 10)
+    assert rates.rate('instance-a') == 20 * MB
+    # Import lebih cepat dari overhead tetap tidak dipakai
+    rates.record('instance-a', 300 * MB, IMPORT_OVERHEAD_SECONDS)
+    assert rates.rate('instance-a') == 20 * MB
+
+
+def test_shortest_job_first():
+    scheduler = _scheduler()
+    big = scheduler.submit('bucket', 'big.bak', 10_000 * MB)
+    small = scheduler.submit('bucket', 'small.bak', 10 * MB)
+    assert scheduler._next_job('instance-a') is small
+    assert scheduler._next_job('instance-a') is big
+
+
+def test_aging_lets_waiting_big_job_go_first():
+    scheduler = _scheduler(aging_factor=1.0)
+    big = scheduler.submit('bucket', 'big.bak', 2_000 * MB)
+    small = scheduler.submit('bucket', 'small.bak', 10 * MB)
+    # Selisih estimasi ~100 detik; job besar sudah menunggu jauh lebih lama
+    big.submitted_at -= 1000
+    assert scheduler._next_job('instance-a') is big
+    assert scheduler._next_job('instance-a') is small
+
+
+def test_predicted_completions_follow_schedule():
+    scheduler = _scheduler()
+    big = scheduler.submit('bucket', 'big.bak', 2_000 * MB)
+    small = scheduler.submit('bucket', 'small.bak', 10 * MB)
+    predictions = scheduler.predicted_completions()
+    assert predictions[small.job_id] < predictions[big.job_id]
+
+
+def test_run_order_and_one_import_per_instance():
+    order = []
+    running = set()
+    overlap = threading.Event()
+    lock = threading.Lock()
+
+    def run_job(job, instance_name):
+        with lock:
+            if instance_name in running:
+                overlap.set()
+            running.add(instance_name)
+            order.append(job.file_name)
+        time.sleep(0.01)
+        with lock:
+            running.discard(instance_name)
+        if job.file_name == 'broken.bak':
+            raise RuntimeError('import gagal')
+
+    scheduler = _scheduler(run_job)
+    for name, size in (('c.bak', 300), ('broken.bak', 200), ('a.bak', 100)):
+        scheduler.submit('bucket', name, size * MB)
+    done = scheduler.start().join()
+
+    assert order == ['a.bak', 'broken.bak', 'c.bak']
+    assert not overlap.is_set()
+    assert [job.file_name for job in done if job.error] == ['broken.bak']
+    assert scheduler.queue_depth() == {'pending': 0, 'running': 0, 'done': 3}
+
+
+def test_rates_not_recorded_when_run_job_records_them():
+    recorded = []
+
+    class RecordingRates(ImportRateHistory):
+        def record(self, instance_name, size_bytes, seconds):
+            recorded.append(instance_name)
+
+    for record_rates, expected in ((True, ['instance-a']), (False, [])):
+        recorded.clear()
+        scheduler = RestoreScheduler(['instance-a'], lambda job, instance_name: None, RecordingRates(),
+                                     record_rates=record_rates)
+        scheduler.submit('bucket', 'a.bak', 100 * MB)
+        scheduler.start().join()
+        assert recorded == expected
+
+
+def test_record_keeps_concurrent_writes():
+    storage_client = FakeStorageClient()
+    first = ImportRateHistory(storage_client, 'bucket')
+    second = ImportRateHistory(storage_client, 'bucket')
+    # Kedua proses membaca state kosong, lalu menulis bergantian
+    first.record('instance-a', 100 * MB, IMPORT_OVERHEAD_SECONDS + 10)
+    second.record('instance-b', 200 * MB, IMPORT_OVERHEAD_SECONDS + 10)
+    assert ImportRateHistory(storage_client, 'bucket')._load() == {'instance-a': 10 * MB, 'instance-b': 20 * MB}
+
+
+def test_record_retries_on_generation_conflict(monkeypatch):
+    storage_client = FakeStorageClient()
+    rates = ImportRateHistory(storage_client, 'bucket')
+    original = FakeBlob.upload_from_string
+    raced = []
+
+    def racing_upload(blob, data, content_type=None, if_generation_match=None):
+        if not raced:
+            # Proses lain menulis tepat sebelum upload pertama
+            raced.append(1)
+            original(blob, '{"instance-b": 1.0}')
+        return original(blob, data, content_type, if_generation_match)
+
+    monkeypatch.setattr(FakeBlob, 'upload_from_string', racing_upload)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    rates.record('instance-a', 100 * MB, IMPORT_OVERHEAD_SECONDS + 10)
+    assert rates._load() == {'instance-a': 10 * MB, 'instance-b': 1.0}
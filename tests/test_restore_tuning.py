@@ -0,0 +1,40 @@
+import restore_tuning
+from restore_tuning import MB, TuningHistory, bak_restore_options
+from fakes import FakeBlob, FakeStorageClient
+
+
+def test_report_compares_both_arms():
+    history = TuningHistory(FakeStorageClient(), 'bucket')
+    history.record('sql', False, 100 * MB, 100)
+    report = history.record('sql', True, 100 * MB, 50)
+    assert report == {
+        'before': {'imports': 1, 'mb_per_second': 1.0},
+        'after': {'imports': 1, 'mb_per_second': 2.0},
+        'speedup': 2.0,
+    }
+    # Jenis import lain tidak tercampur
+    assert history.report('bak') == {}
+
+
+def test_bak_restore_options_scale_with_data_files():
+    files = [{'logical_name': f'data{i}', 'type': 'D', 'size': MB} for i in range(3)]
+    assert bak_restore_options(files).startswith('BUFFERCOUNT = 12,')
+    assert bak_restore_options([]).startswith('BUFFERCOUNT = 8,')
+
+
+def test_record_retries_on_generation_conflict(monkeypatch):
+    storage_client = FakeStorageClient()
+    history = TuningHistory(storage_client, 'bucket')
+    original = FakeBlob.upload_from_string
+    raced = []
+
+    def racing_upload(blob, data, content_type=None, if_generation_match=None):
+        if not raced:
+            raced.append(1)
+            original(blob, '[{"kind": "bak", "tuned": false, "size_bytes": 1, "seconds": 1.0}]')
+        return original(blob, data, content_type, if_generation_match)
+
+    monkeypatch.setattr(FakeBlob, 'upload_from_string', racing_upload)
+    monkeypatch.setattr(restore_tuning.time, 'sleep', lambda seconds: None)
+    history.record('sql', True, MB, 1)
+    assert [entry['kind'] for entry in history._load()] == ['bak', 'sql']
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+import sqladmin_client
+from sqladmin_client import SqlAdminClient
+
+
+def _http_error(status):
+    return HttpError(httplib2.Response({'status': status}), b'error')
+
+
+class FakeRequest:
+    def __init__(self, outcomes):
+        self._outcomes = list(outcomes)
+        self.calls = 0
+
+    def execute(self, http=None):
+        self.calls += 1
+        outcome = self._outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class FakeCollection:
+    def __init__(self, service, name):
+        self._service = service
+        self._name = name
+
+    def __getattr__(self, method):
+        def build_request(**kwargs):
+            self._service.requests.append((self._name, method, kwargs))
+            return self._service.responses[(self._name, method)]
+        return build_request
+
+
+class FakeService:
+    def __init__(self):
+        self.responses = {}
+        self.requests = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda: FakeCollection(self, name)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    service = FakeService()
+    monkeypatch.setattr(sqladmin_client, 'build', lambda *args, **kwargs: service)
+    monkeypatch.setattr(sqladmin_client.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(sqladmin_client.google_auth_httplib2, 'AuthorizedHttp', lambda credentials, http: http)
+    admin = SqlAdminClient(credentials=None)
+    admin.fake_service = service
+    return admin
+
+
+def _now(offset_seconds=0):
+    return (datetime.now(timezone.utc) + timedelta(seconds=offset_seconds)).isoformat().replace('+00:00', 'Z')
+
+
+def test_reads_are_retried(client):
+    request = FakeRequest([_http_error(503), OSError('reset'), {'state': 'RUNNABLE'}])
+    client.fake_service.responses[('instances', 'get')] = request
+    assert client.get_instance_state('project', 'instance-a') == 'RUNNABLE'
+    assert request.calls == 3
+
+
+def test_mutation_retried_on_rate_limit(client):
+    request = FakeRequest([_http_error(429), {'name': 'op-1'}])
+    client.fake_service.responses[('instances', 'patch')] = request
+    assert client.set_activation_policy('project', 'instance-a', 'ALWAYS') == {'name': 'op-1'}
+    assert request.calls == 2
+
+
+def test_mutation_not_resent_when_operation_exists(client):
+    request = FakeRequest([_http_error(503)])
+    client.fake_service.responses[('instances', 'import_')] = request
+    client.fake_service.responses[('operations', 'list')] = FakeRequest([{'items': [
+        {'name': 'op-old', 'operationType': 'IMPORT', 'insertTime': _now(-3600),
+         'importContext': {'database': 'sea_agi_db'}},
+        {'name': 'op-other', 'operationType': 'IMPORT', 'insertTime': _now(),
+         'importContext': {'database': 'other_db'}},
+        {'name': 'op-1', 'operationType': 'IMPORT', 'insertTime': _now(),
+         'importContext': {'database': 'sea_agi_db'}},
+    ]}])
+    operation = client.import_('project', 'instance-a', {'importContext': {'database': 'sea_agi_db'}})
+    assert operation['name'] == 'op-1'
+    assert request.calls == 1
+
+
+def test_mutation_resent_when_no_operation_was_created(client):
+    request = FakeRequest([OSError('timeout'), {'name': 'op-2'}])
+    client.fake_service.responses[('databases', 'delete')] = request
+    client.fake_service.responses[('operations', 'list')] = FakeRequest([{'items': []}])
+    assert client.delete_database('project', 'instance-a', 'sea_agi_db') == {'name': 'op-2'}
+    assert request.calls == 2
+
+
+def test_mutation_not_resent_when_lookup_fails(client):
+    request = FakeRequest([_http_error(500)])
+    client.fake_service.responses[('instances', 'delete')] = request
+    client.fake_service.responses[('operations', 'list')] = FakeRequest([_http_error(403)])
+    with pytest.raises(HttpError) as raised:
+        client.delete_instance('project', 'instance-a')
+    assert raised.value.resp.status == 500
+    assert request.calls == 1
+
+
+def test_clone_found_on_source_when_destination_missing(client):
+    request = FakeRequest([_http_error(502)])
+    client.fake_service.responses[('instances', 'clone')] = request
+    client.fake_service.responses[('operations', 'list')] = FakeRequest([
+        _http_error(404),
+        {'items': [{'name': 'op-clone', 'operationType': 'CLONE', 'insertTime': _now(), 'targetId': 'golden'}]},
+    ])
+    assert client.clone_instance('project', 'golden', 'golden-uat')['name'] == 'op-clone'
+    assert request.calls == 1
@@ -0,0 +1,114 @@
+import gzip
+import tracemalloc
+import pytest
+import staging_planner
+from staging_planner import (
+    ResourceProfiler, StagingPlanner, uncompressed_size, COPY_CHUNK, DIRECT, GCS_STREAM, LOCAL_DISK, MEMORY
+)
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+
+class FakeGcsBlob:
+    def __init__(self, name, size, metadata=None, trailer=b''):
+        self.name = name
+        self.size = size
+        self.metadata = metadata
+        self._trailer = trailer  # 4 byte terakhir object (ISIZE gzip)
+
+    def download_as_bytes(self, start=None, end=None):
+        assert (start, end) == (self.size - 4, self.size - 1)
+        return self._trailer
+
+
+def _gz_blob(name, size, isize):
+    return FakeGcsBlob(name, size, trailer=(isize % 2 ** 32).to_bytes(4, 'little'))
+
+
+@pytest.fixture
+def resources(monkeypatch):
+    available = {'memory': 0, 'disk': 0, 'memory_backed': False}
+    monkeypatch.setattr(staging_planner, 'available_memory', lambda: available['memory'])
+    monkeypatch.setattr(staging_planner, 'available_disk', lambda path: available['disk'])
+    monkeypatch.setattr(staging_planner, 'is_memory_backed', lambda path: available['memory_backed'])
+    return available
+
+
+def _plan(blob, needs_extraction=True):
+    return StagingPlanner('/tmp', headroom=1.0, memory_overhead=1.0).plan(blob, needs_extraction)
+
+
+def test_uncompressed_size_from_metadata():
+    blob = FakeGcsBlob('a.bak.gz', 100, metadata={'uncompressed-size': '12345'})
+    assert uncompressed_size(blob) == 12345
+
+
+def test_uncompressed_size_from_isize():
+    data = gzip.compress(b'x' * 5000)
+    assert uncompressed_size(FakeGcsBlob('a.bak.gz', len(data), trailer=data[-4:])) == 5000
+
+
+def test_uncompressed_size_isize_wraps_above_4gb():
+    # 2 GB terkompresi, asli 9 GB: ISIZE hanya menyimpan modulo 2^32
+    blob = _gz_blob('a.bak.gz', 2 * GB, 9 * GB)
+    assert uncompressed_size(blob) == 9 * GB
+
+
+def test_uncompressed_size_not_gzip():
+    assert uncompressed_size(FakeGcsBlob('a.bak', 100)) == 100
+
+
+def test_direct_without_extraction(resources):
+    assert _plan(FakeGcsBlob('a.bak', GB), needs_extraction=False)['strategy'] == DIRECT
+
+
+def test_memory_when_object_fits(resources):
+    resources.update(memory=GB, disk=GB)
+    plan = _plan(_gz_blob('a.bak.gz', 10 * MB, 50 * MB))
+    assert plan['strategy'] == MEMORY
+    assert plan['predicted_memory_bytes'] == 10 * MB + 2 * COPY_CHUNK
+    assert plan['predicted_disk_bytes'] == 50 * MB
+
+
+def test_local_disk_when_memory_is_short(resources):
+    resources.update(memory=10 * MB, disk=GB)
+    plan = _plan(_gz_blob('a.bak.gz', 100 * MB, 500 * MB))
+    assert plan['strategy'] == LOCAL_DISK
+    assert plan['predicted_disk_bytes'] == 600 * MB
+
+
+def test_gcs_stream_when_nothing_fits(resources):
+    resources.update(memory=10 * MB, disk=100 * MB)
+    assert _plan(_gz_blob('a.bak.gz', 100 * MB, 500 * MB))['strategy'] == GCS_STREAM
+
+
+def test_memory_backed_disk_counts_against_memory(resources):
+    # /tmp di Cloud Functions memakai memori: hasil ekstraksi ikut mengurangi memori
+    resources.update(memory=100 * MB, disk=10 * GB, memory_backed=True)
+    assert _plan(_gz_blob('a.bak.gz', 20 * MB, 90 * MB))['strategy'] == GCS_STREAM
+    assert _plan(_gz_blob('a.bak.gz', 10 * MB, 40 * MB))['strategy'] == MEMORY
+
+
+def test_uncompressed_size_too_small_for_trailer():
+    assert uncompressed_size(FakeGcsBlob('a.bak.gz', 10)) == 10
+
+
+def test_profiler_keeps_heap_peak_of_overlapping_stages(tmp_path):
+    profiler = ResourceProfiler(str(tmp_path), interval=60, trace_python=True)
+    with profiler.stage('download'):
+        buffer = bytearray(8 * 1024 * 1024)
+        del buffer
+        # Tahap lain mulai setelah puncak download, puncak download tidak boleh di-reset
+        with profiler.stage('plan'):
+            pass
+    assert profiler.peaks['download']['python_heap_peak_bytes'] >= 8 * 1024 * 1024
+    assert profiler.peaks['plan']['python_heap_peak_bytes'] < 8 * 1024 * 1024
+    assert not tracemalloc.is_tracing()
+
+
+def test_profiler_skips_heap_tracing_by_default(tmp_path):
+    profiler = ResourceProfiler(str(tmp_path), interval=60)
+    with profiler.stage('download'):
+        assert not tracemalloc.is_tracing()
+    assert profiler.peaks['download']['python_heap_peak_bytes'] is None
@@ -0,0 +1,68 @@
+import json
+import pytest
+from restore_scheduler import IMPORT_RATES_BLOB
+from tier_scaling import GB, SCALING_REPORT_BLOB, TierScaler
+from fakes import FakeStorageClient
+
+THRESHOLDS = [{'min_bytes': 10 * GB, 'tier': 'db-custom-8-32768'}]
+
+
+class FakeAdminClient:
+    def __init__(self, tier='db-custom-2-8192', fail_wait=False):
+        self.settings = {'tier': tier}
+        self.patches = []
+        self._fail_wait = fail_wait
+
+    def get_instance(self, project, instance_name, use_cache=True):
+        return {'settings': dict(self.settings)}
+
+    def get_instance_state(self, project, instance_name, use_cache=True):
+        return 'RUNNABLE'
+
+    def patch_instance(self, project, instance_name, body):
+        self.patches.append(body['settings'])
+        self.settings.update(body['settings'])
+        return {'name': f'op-{len(self.patches)}'}
+
+    def wait_for_operation(self, project, operation, poll_interval=10, timeout=None):
+        if self._fail_wait and operation['name'] == 'op-1':
+            raise TimeoutError('operasi patch terlalu lama')
+        return {'status': 'DONE'}
+
+
+def _report(storage_client):
+    return json.loads(storage_client.objects[SCALING_REPORT_BLOB][0])
+
+
+def test_savings_omitted_without_measured_baseline():
+    storage_client = FakeStorageClient()
+    scaler = TierScaler(FakeAdminClient(), 'project', storage_client, 'bucket', THRESHOLDS)
+    snapshot = scaler.scale_up('instance', 20 * GB)
+    scaler.scale_down('instance', snapshot)
+
+    entry = scaler.record('instance', 20 * GB, 600, snapshot)
+    assert 'saved_seconds' not in entry
+    assert 'estimated_baseline_seconds' not in entry
+    assert _report(storage_client) == [entry]
+
+
+def test_savings_reported_against_measured_baseline():
+    storage_client = FakeStorageClient()
+    baseline_rate = 10 * 1024 * 1024
+    storage_client.objects[IMPORT_RATES_BLOB] = (
+        json.dumps({'instance:db-custom-2-8192': baseline_rate}).encode(), 1
+    )
+    scaler = TierScaler(FakeAdminClient(), 'project', storage_client, 'bucket', THRESHOLDS)
+    snapshot = scaler.scale_up('instance', 20 * GB)
+
+    entry = scaler.record('instance', 20 * GB, 600, snapshot)
+    assert entry['estimated_baseline_seconds'] == pytest.approx(60 + 20 * GB / baseline_rate, abs=0.1)
+    assert entry['saved_seconds'] < entry['estimated_baseline_seconds']
+
+
+def test_failed_scale_up_restores_original_tier():
+    admin_client = FakeAdminClient(fail_wait=True)
+    scaler = TierScaler(admin_client, 'project', FakeStorageClient(), 'bucket', THRESHOLDS)
+    with pytest.raises(TimeoutError):
+        scaler.scale_up('instance', 20 * GB)
+    assert admin_client.patches[-1] == {'tier': 'db-custom-2-8192'}
@@ -0,0 +1,95 @@
+import csv
+import os
+from datetime import date, datetime
+import pytest
+from typed_csv import TypedCsvParser, infer_type
+
+COLUMNS = ['id', 'amount', 'active', 'day', 'created', 'note']
+ROWS = [
+    ['1', '10.5', 'true', '2024-08-07', '2024-08-07T10:00:00', 'a'],
+    ['2', '', 'N', '', '', ''],
+    ['3', '7', 'YES', '2024-08-08', '2024-08-08T11:30:00', 'NULL'],
+]
+EXPECTED = [
+    (1, 10.5, True, date(2024, 8, 7), datetime(2024, 8, 7, 10, 0), 'a'),
+    (2, None, False, None, None, ''),
+    (3, 7.0, True, date(2024, 8, 8), datetime(2024, 8, 8, 11, 30), 'NULL'),
+]
+
+
+@pytest.mark.parametrize('values, expected', [
+    (['1', '-2', ''], 'int'),
+    (['1', '2.5'], 'float'),
+    (['true', 'F', 'yes'], 'bool'),
+    (['2024-08-07', ''], 'date'),
+    (['2024-08-07T10:00:00', '2024-08-07'], 'datetime'),
+    (['1', 'abc'], 'str'),
+    (['NULL', '1'], 'str'),
+    (['', ''], 'str'),
+])
+def test_infer_type(values, expected):
+    assert infer_type(values) == expected
+
+
+def _write_csv(tmp_path, rows, header=None):
+    path = tmp_path / 'data.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_schema_inferred_from_sample_and_declared_types_kept(tmp_path):
+    path = _write_csv(tmp_path, ROWS, header=COLUMNS)
+    parser = TypedCsvParser(COLUMNS, schema={'id': 'str'}, has_header=True, backend='python')
+    assert parser.schema_for(path) == {
+        'id': 'str', 'amount': 'float', 'active': 'bool', 'day': 'date', 'created': 'datetime', 'note': 'str',
+    }
+
+
+def test_unknown_declared_type_rejected():
+    with pytest.raises(ValueError):
+        TypedCsvParser(COLUMNS, schema={'id': 'integer'})
+
+
+def _parse(path, backend, batch_size=2):
+    parser = TypedCsvParser(COLUMNS, batch_size=batch_size, backend=backend)
+    return [row for batch in parser.batches(path, 0, os.path.getsize(path), False) for row in batch]
+
+
+def test_python_backend_converts_and_keeps_empty_strings(tmp_path):
+    assert _parse(_write_csv(tmp_path, ROWS), 'python') == EXPECTED
+
+
+def test_python_backend_reports_bad_value(tmp_path):
+    path = _write_csv(tmp_path, ROWS)
+    parser = TypedCsvParser(COLUMNS, schema={'note': 'int'}, backend='python')
+    with pytest.raises(ValueError, match='Kolom note'):
+        list(parser.batches(path, 0, 10 ** 6, False))
+
+
+@pytest.mark.parametrize('backend, module', [('numpy', 'numpy'), ('arrow', 'pyarrow')])
+def test_backends_match_python(tmp_path, backend, module):
+    pytest.importorskip(module)
+    path = _write_csv(tmp_path, ROWS)
+    assert _parse(path, backend) == _parse(path, 'python')
+
+
+def test_arrow_does_not_treat_null_text_as_null(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = _write_csv(tmp_path, [['1', 'NA', 'true', '', '', 'x']])
+    parser = TypedCsvParser(COLUMNS, schema={'amount': 'float'}, backend='arrow')
+    # Backend python menolak 'NA' untuk kolom float, arrow juga harus menolak
+    with pytest.raises(Exception):
+        list(parser.batches(path, 0, 10 ** 6, False))
+
+
+@pytest.mark.parametrize('backend, module', [('numpy', 'numpy'), ('arrow', 'pyarrow')])
+def test_backends_pad_short_rows_like_python(tmp_path, backend, module):
+    pytest.importorskip(module)
+    # Baris pertama pendek, baris lain lengkap atau kelebihan kolom
+    path = _write_csv(tmp_path, [['1', '2.5'], ROWS[0], ROWS[2] + ['lebih'], ['4']])
+    assert sorted(_parse(path, backend)) == sorted(_parse(path, 'python'))
+    assert len(_parse(path, backend)) == 4
@@ -0,0 +1,66 @@
+import json
+import pytest
+import verify_restore
+from verify_restore import RestoreVerifier, compare_stats, manifest_name
+from fakes import FakeStorageClient
+
+
+def _stats(**tables):
+    return {name.replace('__', '.'): {'rows': rows, 'checksum': checksum} for name, (rows, checksum) in tables.items()}
+
+
+def test_manifest_name_is_internal_object():
+    # Object yang diawali '_' dilewati hello_gcs, jadi upload manifest tidak memicu restore
+    assert manifest_name('sea_uat_20240807.bak') == '_manifests/sea_uat_20240807.bak.manifest.json'
+
+
+def test_compare_exact_matches():
+    expected = _stats(dbo__orders=(10, 123), dbo__items=(5, None))
+    assert compare_stats(_stats(dbo__orders=(10, 123), dbo__items=(5, 999)), expected) == []
+
+
+def test_compare_exact_reports_differences():
+    expected = _stats(dbo__orders=(10, 123), dbo__items=(5, 1), dbo__gone=(1, 1))
+    actual = _stats(dbo__orders=(9, 123), dbo__items=(5, 2), dbo__extra=(1, 1))
+    problems = compare_stats(actual, expected)
+    assert sorted(problems) == sorted([
+        'dbo.orders: 9 baris, seharusnya 10',
+        'dbo.items: checksum berbeda',
+        'dbo.gone: tabel tidak ada',
+        'dbo.extra: tidak ada di manifest',
+    ])
+
+
+def test_compare_previous_allows_normal_change():
+    expected = _stats(dbo__orders=(100, 1), dbo__items=(100, 1), dbo__logs=(100, 1))
+    actual = _stats(dbo__orders=(120, 2), dbo__items=(60, 3), dbo__logs=(0, None), dbo__new=(5, 1))
+    problems = compare_stats(actual, expected, exact=False, max_row_drop=0.5)
+    assert problems == ['dbo.logs: kosong, sebelumnya 100 baris']
+
+
+def test_compare_previous_reports_large_drop():
+    problems = compare_stats(_stats(dbo__orders=(10, 1)), _stats(dbo__orders=(100, 1)), exact=False)
+    assert problems == ['dbo.orders: 10 baris, turun dari 100']
+
+
+def test_verify_uses_manifest_and_saves_history(monkeypatch):
+    storage_client = FakeStorageClient()
+    stats = _stats(dbo__orders=(10, 123))
+    storage_client.objects[manifest_name('sea_uat_20240807.bak')] = (json.dumps({'tables': stats}).encode(), 1)
+    monkeypatch.setattr(verify_restore, 'collect_table_stats', lambda engine, workers, checksum: stats)
+
+    verifier = RestoreVerifier(storage_client, 'bucket')
+    assert verifier.verify(None, 'sea_agi_db', 'bucket', 'sea_uat_20240807.bak') == stats
+    assert json.loads(storage_client.objects['_verify/sea_agi_db.json'][0])['tables'] == stats
+
+
+def test_verify_fails_against_previous_restore(monkeypatch):
+    storage_client = FakeStorageClient()
+    previous = {'database': 'sea_agi_db', 'tables': _stats(dbo__orders=(100, 1))}
+    storage_client.objects['_verify/sea_agi_db.json'] = (json.dumps(previous).encode(), 1)
+    monkeypatch.setattr(verify_restore, 'collect_table_stats', lambda engine, workers, checksum: _stats(dbo__orders=(0, None)))
+
+    with pytest.raises(RuntimeError):
+        RestoreVerifier(storage_client, 'bucket').verify(None, 'sea_agi_db', 'bucket', 'sea_uat_20240807.bak')
+    # Hasil yang gagal tidak menggantikan acuan
+    assert json.loads(storage_client.objects['_verify/sea_agi_db.json'][0]) == previous
@@ -0,0 +1,131 @@
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from google.api_core.exceptions import NotFound
+from restore_scheduler import ImportRateHistory
+
+GB = 1024 ** 3
+
+# Riwayat keputusan scale-up (waktu yang dihemat vs biaya tambahan)
+SCALING_REPORT_BLOB = '_scaling/report.json'
+MAX_REPORT_ENTRIES = 200
+
+# Field settings storage yang ikut di-patch dan dikembalikan setelah restore
+STORAGE_FIELDS = ('dataDiskProvisionedIops', 'dataDiskProvisionedThroughput')
+
+
+# Scale-up sementara tier instance selama import lalu dikembalikan setelah verifikasi.
+# thresholds: daftar dict {'min_bytes', 'tier', opsional field STORAGE_FIELDS}, dipilih
+# entry dengan min_bytes terbesar yang masih <= ukuran backup.
+# hourly_costs: biaya per jam tiap tier, untuk laporan biaya tambahan.
+class TierScaler:
+    def __init__(self, admin_client, project, storage_client, bucket_name, thresholds, hourly_costs=None):
+        self._admin_client = admin_client
+        self._project = project
+        self._storage_client = storage_client
+        self._bucket_name = bucket_name
+        self._thresholds = sorted(thresholds, key=lambda t: t['min_bytes'])
+        self._hourly_costs = hourly_costs or {}
+        self._rates = ImportRateHistory(storage_client, bucket_name)
+
+    def choose(self, size_bytes):
+        chosen = None
+        for threshold in self._thresholds:
+            if size_bytes >= threshold['min_bytes']:
+                chosen = threshold
+        return chosen
+
+    def _patch_and_wait(self, instance_name, settings):
+        operation = self._admin_client.patch_instance(self._project, instance_name, body={'settings': settings})
+        self._admin_client.wait_for_operation(self._project, operation)
+        # Patch tier me-restart instance, tunggu sampai bisa dipakai lagi
+        while self._admin_client.get_instance_state(self._project, instance_name, use_cache=False) != 'RUNNABLE':
+            time.sleep(10)
+
+    # Fungsi untuk scale-up sebelum restore. Mengembalikan snapshot settings asli
+    # (dipakai scale_down), atau None jika tidak perlu scale-up.
+    def scale_up(self, instance_name, size_bytes):
+        target = self.choose(size_bytes)
+        settings = self._admin_client.get_instance(self._project, instance_name, use_cache=False)['settings']
+        if not target or target['tier'] == settings['tier']:
+            return None
+
+        original = {'tier': settings['tier']}
+        patch = {'tier': target['tier']}
+        for field in STORAGE_FIELDS:
+            if field in target:
+                original[field] = settings.get(field)
+                patch[field] = target[field]
+
+        started = time.monotonic()
+        logging.warning(
+            f"=========== Scale-up {instance_name}: {settings['tier']} -> {target['tier']} "
+            f"(backup {size_bytes / GB:.1f} GB)"
+        )
+        try:
+            self._patch_and_wait(instance_name, patch)
+        except Exception:
+            # Patch bisa sudah diterapkan walaupun menunggunya gagal, kembalikan settings asli
+            try:
+                self.scale_down(instance_name, {'original': original, 'scale_seconds': 0})
+            except Exception as e:
+                logging.error(f"=========== Gagal mengembalikan settings {instance_name} setelah scale-up gagal: {e}")
+            raise
+        return {'original': original, 'scaled': patch, 'scale_seconds': time.monotonic() - started}
+
+    # Fungsi untuk mengembalikan tier dan storage ke settings asli
+    def scale_down(self, instance_name, snapshot):
+        started = time.monotonic()
+        original = {field: value for field, value in snapshot['original'].items() if value is not None}
+        logging.warning(f"=========== Scale-down {instance_name} ke {original['tier']}")
+        self._patch_and_wait(instance_name, original)
+        snapshot['scale_seconds'] += time.monotonic() - started
+
+    # Fungsi untuk mencatat durasi import dan menghitung waktu yang dihemat vs biaya tambahan.
+    # Kecepatan import dicatat per instance dan tier agar baseline tier kecil tetap terukur;
+    # selama baseline belum pernah terukur, waktu yang dihemat tidak dilaporkan.
+    def record(self, instance_name, size_bytes, restore_seconds, snapshot=None):
+        tier = snapshot['scaled']['tier'] if snapshot else None
+        if tier is None:
+            tier = self._admin_client.get_instance(self._project, instance_name)['settings']['tier']
+        self._rates.record(f"{instance_name}:{tier}", size_bytes, restore_seconds)
+        if not snapshot:
+            return None
+
+        baseline_tier = snapshot['original']['tier']
+        baseline_key = f"{instance_name}:{baseline_tier}"
+        # Waktu patch tier (scale-up + scale-down) ikut dihitung sebagai biaya
+        total_seconds = restore_seconds + snapshot['scale_seconds']
+        extra_cost = (
+            self._hourly_costs.get(tier, 0) - self._hourly_costs.get(baseline_tier, 0)
+        ) * total_seconds / 3600
+        entry = {
+            'at': datetime.now(timezone.utc).isoformat(),
+            'instance': instance_name,
+            'size_bytes': size_bytes,
+            'baseline_tier': baseline_tier,
+            'scaled_tier': tier,
+            'restore_seconds': round(restore_seconds, 1),
+            'scale_seconds': round(snapshot['scale_seconds'], 1),
+            'extra_cost': round(extra_cost, 4),
+        }
+        if self._rates.measured(baseline_key):
+            baseline_seconds = self._rates.estimate_seconds(baseline_key, size_bytes)
+            entry['estimated_baseline_seconds'] = round(baseline_seconds, 1)
+            entry['saved_seconds'] = round(baseline_seconds - total_seconds, 1)
+            saved = f"hemat {entry['saved_seconds'] / 60:.1f} menit"
+        else:
+            saved = f"baseline {baseline_tier} belum terukur"
+        self._append_report(entry)
+        logging.warning(f"=========== Scale-up {tier}: {saved}, biaya tambahan {entry['extra_cost']:.2f}")
+        return entry
+
+    def _append_report(self, entry):
+        blob = self._storage_client.bucket(self._bucket_name).blob(SCALING_REPORT_BLOB)
+        try:
+            report = json.loads(blob.download_as_bytes())
+        except NotFound:
+            report = []
+        report = (report + [entry])[-MAX_REPORT_ENTRIES:]
+        blob.upload_from_string(json.dumps(report), content_type='application/json')
@@ -0,0 +1,27 @@
+import sqlalchemy
+
+
+# Fungsi untuk mengutip nama object SQL Server (database/tabel/kolom) dengan aman
+def quote_name(name):
+    return '[' + name.replace(']', ']]') + ']'
+
+
+# Fungsi untuk membuat literal string unicode T-SQL, contoh: O'Brien -> N'O''Brien'
+def quote_string(value):
+    return "N'" + value.replace("'", "''") + "'"
+
+
+# Fungsi untuk mengutip nama tabel yang mungkin berisi schema, contoh: dbo.orders -> [dbo].[orders]
+def quote_table(schema, table):
+    return f"{quote_name(schema)}.{quote_name(table)}"
+
+
+# Fungsi untuk membuka koneksi autocommit. Perintah seperti ALTER DATABASE,
+# RESTORE dan DBCC tidak boleh dijalankan di dalam transaksi.
+def autocommit_connection(engine):
+    return engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+
+
+# Fungsi untuk menjalankan query dan mengembalikan semua baris
+def fetch_all(connection, query, **params):
+    return connection.execute(sqlalchemy.text(query), params).fetchall()
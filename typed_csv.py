@@ -0,0 +1,233 @@
+import csv
+import io
+import logging
+import threading
+from datetime import date, datetime
+from partitioned_load import open_partition, DEFAULT_BATCH_SIZE
+
+# pyarrow dan numpy opsional: tanpa keduanya parser memakai modul csv + konversi per nilai
+try:
+    import pyarrow
+    import pyarrow.csv as pyarrow_csv
+except ImportError:
+    pyarrow = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BLOCK_SIZE = 16 * 1024 * 1024  # Ukuran blok baca parser
+SAMPLE_ROWS = 1000  # Jumlah baris untuk inferensi schema
+TYPES = ('int', 'float', 'bool', 'date', 'datetime', 'str')
+TRUE_VALUES = ('true', 't', 'yes', 'y')
+FALSE_VALUES = ('false', 'f', 'no', 'n')
+
+
+def _parse_bool(value):
+    lowered = value.strip().lower()
+    if lowered in TRUE_VALUES:
+        return True
+    if lowered in FALSE_VALUES:
+        return False
+    raise ValueError(f"'{value}' bukan boolean")
+
+
+CONVERTERS = {
+    'int': int,
+    'float': float,
+    'bool': _parse_bool,
+    'date': date.fromisoformat,
+    'datetime': datetime.fromisoformat,
+}
+
+
+# Fungsi untuk menebak tipe kolom dari sampel nilai (nilai kosong dianggap NULL).
+# Urutan dicoba dari tipe paling sempit; jika tidak ada yang cocok, kolom jadi str.
+def infer_type(values):
+    values = [v for v in values if v != '']
+    if not values:
+        return 'str'
+    for type_name in TYPES[:-1]:
+        try:
+            for value in values:
+                CONVERTERS[type_name](value)
+        except ValueError:
+            continue
+        return type_name
+    return 'str'
+
+
+# Konversi satu kolom per nilai (fallback tanpa numpy, atau jika konversi vektor gagal)
+def _convert_python(values, type_name):
+    if type_name == 'str':
+        return list(values)
+    convert = CONVERTERS[type_name]
+    return [None if value == '' else convert(value) for value in values]
+
+
+# Konversi satu kolom sekaligus dengan numpy; nilai kosong menjadi None
+def _convert_numpy(values, type_name):
+    if type_name == 'str':
+        return list(values)
+    array = numpy.array(values, dtype=str)
+    missing = array == ''
+    if type_name == 'bool':
+        lowered = numpy.char.lower(numpy.char.strip(array))
+        is_true = numpy.isin(lowered, TRUE_VALUES)
+        if not (is_true | numpy.isin(lowered, FALSE_VALUES) | missing).all():
+            raise ValueError("Nilai bukan boolean")
+        result = is_true.tolist()
+    elif type_name in ('date', 'datetime'):
+        # NaT menjadi None saat tolist()
+        unit = 'datetime64[D]' if type_name == 'date' else 'datetime64[us]'
+        return numpy.where(missing, 'NaT', array).astype(unit).tolist()
+    else:
+        filled = numpy.where(missing, '0', array)
+        result = filled.astype(numpy.int64 if type_name == 'int' else numpy.float64).tolist()
+    for index in numpy.flatnonzero(missing):
+        result[index] = None
+    return result
+
+
+def _arrow_type(type_name):
+    return {
+        'int': pyarrow.int64(),
+        'float': pyarrow.float64(),
+        'bool': pyarrow.bool_(),
+        'date': pyarrow.date32(),
+        'datetime': pyarrow.timestamp('us'),
+        'str': pyarrow.string(),
+    }[type_name]
+
+
+# Parser CSV bertipe untuk PartitionedCsvLoader (dipasang sebagai rows_from_partition).
+# Setiap partisi dibaca per blok besar dengan parser yang quote-aware, setiap kolom
+# dikonversi ke tipenya sekaligus (batch kolom), lalu batch baris bertipe dikirim ke loader.
+# Backend: pyarrow.csv (streaming, multi-thread) jika tersedia, lalu numpy, lalu modul csv.
+# schema: dict kolom -> salah satu TYPES; kolom yang tidak dideklarasikan ditebak dari sampel.
+class TypedCsvParser:
+    def __init__(self, columns, schema=None, has_header=False, batch_size=DEFAULT_BATCH_SIZE, block_size=BLOCK_SIZE,
+                 backend=None):
+        self._columns = list(columns)
+        self._has_header = has_header
+        self._schema = dict(schema or {})
+        for column, type_name in self._schema.items():
+            if type_name not in TYPES:
+                raise ValueError(f"Tipe {type_name} untuk kolom {column} tidak dikenal (pilihan: {', '.join(TYPES)})")
+        self._batch_size = batch_size
+        self._block_size = block_size
+        self._backend = backend or ('arrow' if pyarrow else 'numpy' if numpy else 'python')
+        self._lock = threading.Lock()
+        self._schemas = {}  # file_path -> schema lengkap (hasil deklarasi + inferensi)
+
+    # Fungsi untuk melengkapi schema dari sampel awal file. Dipanggil sekali per file agar
+    # semua partisi memakai tipe yang sama.
+    def schema_for(self, file_path):
+        with self._lock:
+            if file_path in self._schemas:
+                return self._schemas[file_path]
+            schema = dict(self._schema)
+            missing = [c for c in self._columns if c not in schema]
+            if missing:
+                with open(file_path, newline='', encoding='utf-8') as f:
+                    reader = csv.reader(f)
+                    if self._has_header:
+                        next(reader, None)
+                    sample = [row for _, row in zip(range(SAMPLE_ROWS), reader) if row]
+                for column in missing:
+                    index = self._columns.index(column)
+                    schema[column] = infer_type([row[index] if index < len(row) else '' for row in sample])
+                logging.info(f"Schema {file_path}: {schema}")
+            self._schemas[file_path] = schema
+            return schema
+
+    # Hook rows_from_partition: mengembalikan generator batch baris bertipe
+    def batches(self, file_path, start, end, skip_header):
+        schema = self.schema_for(file_path)
+        types = [schema[c] for c in self._columns]
+        if self._backend == 'arrow':
+            return self._arrow_batches(file_path, start, end, skip_header, types)
+        return self._block_batches(file_path, start, end, skip_header, types)
+
+    def _arrow_batches(self, file_path, start, end, skip_header, types):
+        width = len(self._columns)
+        names = [f"f{i}" for i in range(width)]
+        # Baris dengan jumlah kolom berbeda ditolak pyarrow; baris itu dikumpulkan lalu
+        # dipadatkan/dipotong dan dikonversi seperti backend python
+        invalid_rows = []
+
+        def handle_invalid_row(row):
+            invalid_rows.append(row.text)
+            return 'skip'
+
+        reader = pyarrow_csv.open_csv(
+            open_partition(file_path, start, end),
+            read_options=pyarrow_csv.ReadOptions(
+                block_size=self._block_size, column_names=names, skip_rows=1 if skip_header else 0
+            ),
+            parse_options=pyarrow_csv.ParseOptions(newlines_in_values=True, invalid_row_handler=handle_invalid_row),
+            # NULL hanya dari nilai kosong dan kolom str tetap '' seperti backend lain;
+            # default pyarrow juga membaca 'NULL', 'NA', 'NaN' dll. sebagai NULL
+            convert_options=pyarrow_csv.ConvertOptions(
+                include_columns=names,
+                column_types={name: _arrow_type(t) for name, t in zip(names, types)},
+                null_values=[''],
+                strings_can_be_null=False,
+                true_values=[v for value in TRUE_VALUES for v in (value, value.upper(), value.capitalize())],
+                false_values=[v for value in FALSE_VALUES for v in (value, value.upper(), value.capitalize())],
+            ),
+        )
+        for record_batch in reader:
+            columns = [record_batch.column(i).to_pylist() for i in range(width)]
+            rows = list(zip(*columns))
+            for offset in range(0, len(rows), self._batch_size):
+                yield rows[offset:offset + self._batch_size]
+            if invalid_rows:
+                yield from self._padded_batches(invalid_rows, types)
+        if invalid_rows:
+            yield from self._padded_batches(invalid_rows, types)
+
+    def _padded_batches(self, row_texts, types):
+        width = len(self._columns)
+        block = []
+        for row in csv.reader(io.StringIO('\n'.join(row_texts), newline='')):
+            if row:
+                block.append(row[:width] if len(row) >= width else row + [''] * (width - len(row)))
+        row_texts.clear()
+        for offset in range(0, len(block), self._batch_size):
+            chunk = block[offset:offset + self._batch_size]
+            yield list(zip(*self._convert_columns(list(zip(*chunk)), types)))
+
+    def _convert_columns(self, raw_columns, types):
+        converted = []
+        for column, values, type_name in zip(self._columns, raw_columns, types):
+            try:
+                if self._backend == 'numpy':
+                    try:
+                        converted.append(_convert_numpy(values, type_name))
+                        continue
+                    except (ValueError, OverflowError):
+                        # Nilai di luar jangkauan int64 atau format yang tidak dikenal numpy
+                        pass
+                converted.append(_convert_python(values, type_name))
+            except ValueError as e:
+                raise ValueError(f"Kolom {column} ({type_name}): {e}") from e
+        return converted
+
+    def _block_batches(self, file_path, start, end, skip_header, types):
+        width = len(self._columns)
+        stream = open_partition(file_path, start, end, buffer_size=self._block_size)
+        with io.TextIOWrapper(stream, encoding='utf-8', newline='') as text:
+            reader = csv.reader(text)
+            if skip_header:
+                next(reader, None)
+            block = []
+            for row in reader:
+                if not row:
+                    continue
+                block.append(row[:width] if len(row) >= width else row + [''] * (width - len(row)))
+                if len(block) >= self._batch_size:
+                    yield list(zip(*self._convert_columns(list(zip(*block)), types)))
+                    block = []
+            if block:
+                yield list(zip(*self._convert_columns(list(zip(*block)), types)))
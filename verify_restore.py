@@ -0,0 +1,141 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from google.api_core.exceptions import NotFound
+from tsql import quote_table, autocommit_connection, fetch_all
+
+# Lokasi hasil verifikasi restore sebelumnya (dipakai jika tidak ada manifest backup)
+VERIFY_HISTORY_PREFIX = '_verify'
+# Manifest backup disimpan di bawah prefix '_' agar upload manifest ke bucket trigger
+# tidak dianggap backup baru oleh hello_gcs
+MANIFEST_PREFIX = '_manifests'
+MANIFEST_SUFFIX = '.manifest.json'
+
+TABLES_QUERY = """
+SELECT s.name, t.name
+FROM sys.tables t
+JOIN sys.schemas s ON s.schema_id = t.schema_id
+WHERE t.is_ms_shipped = 0
+"""
+
+# Jumlah baris dari metadata partisi (instan, tanpa scan tabel)
+FAST_COUNTS_QUERY = """
+SELECT s.name, t.name, SUM(ps.row_count)
+FROM sys.dm_db_partition_stats ps
+JOIN sys.tables t ON t.object_id = ps.object_id
+JOIN sys.schemas s ON s.schema_id = t.schema_id
+WHERE t.is_ms_shipped = 0 AND ps.index_id IN (0, 1)
+GROUP BY s.name, t.name
+"""
+
+
+# Nama file manifest untuk sebuah object backup, contoh: _manifests/sea_uat_20240807.bak.manifest.json
+def manifest_name(file_name):
+    return f"{MANIFEST_PREFIX}/{file_name}{MANIFEST_SUFFIX}"
+
+
+# Fungsi untuk menghitung jumlah baris dan checksum satu tabel
+def _table_stats(engine, schema, table):
+    with autocommit_connection(engine) as connection:
+        rows, checksum = fetch_all(
+            connection,
+            f"SELECT COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM {quote_table(schema, table)} WITH (NOLOCK)",
+        )[0]
+    return f"{schema}.{table}", {'rows': rows, 'checksum': checksum}
+
+
+# Fungsi untuk mengumpulkan statistik per tabel secara paralel dengan jumlah koneksi terbatas.
+# checksum=False hanya memakai jumlah baris dari metadata (paling cepat).
+def collect_table_stats(engine, workers=8, checksum=True):
+    started = time.monotonic()
+    with autocommit_connection(engine) as connection:
+        if not checksum:
+            stats = {f"{s}.{t}": {'rows': rows, 'checksum': None} for s, t, rows in fetch_all(connection, FAST_COUNTS_QUERY)}
+            logging.info(f"Statistik {len(stats)} tabel (metadata) dalam {time.monotonic() - started:.1f} detik")
+            return stats
+        tables = fetch_all(connection, TABLES_QUERY)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        stats = dict(executor.map(lambda t: _table_stats(engine, t[0], t[1]), tables))
+    logging.info(f"Statistik {len(stats)} tabel (checksum) dalam {time.monotonic() - started:.1f} detik")
+    return stats
+
+
+# Fungsi untuk membandingkan statistik hasil restore dengan acuan.
+# exact=True (manifest backup): jumlah baris dan checksum harus sama persis.
+# exact=False (restore sebelumnya): data boleh berubah, hanya tabel hilang, tabel
+# kosong, atau penurunan jumlah baris lebih dari max_row_drop yang dianggap masalah.
+def compare_stats(actual, expected, exact=True, max_row_drop=0.5):
+    problems = []
+    for table, reference in expected.items():
+        current = actual.get(table)
+        if current is None:
+            problems.append(f"{table}: tabel tidak ada")
+            continue
+        if exact:
+            if current['rows'] != reference['rows']:
+                problems.append(f"{table}: {current['rows']} baris, seharusnya {reference['rows']}")
+            elif reference.get('checksum') is not None and current['checksum'] is not None \
+                    and current['checksum'] != reference['checksum']:
+                problems.append(f"{table}: checksum berbeda")
+        else:
+            if reference['rows'] > 0 and current['rows'] == 0:
+                problems.append(f"{table}: kosong, sebelumnya {reference['rows']} baris")
+            elif reference['rows'] > 0 and current['rows'] < reference['rows'] * (1 - max_row_drop):
+                problems.append(f"{table}: {current['rows']} baris, turun dari {reference['rows']}")
+    if exact:
+        for table in actual.keys() - expected.keys():
+            problems.append(f"{table}: tidak ada di manifest")
+    return problems
+
+
+# Verifikasi hasil restore terhadap manifest backup (jika ada) atau hasil restore sebelumnya
+class RestoreVerifier:
+    def __init__(self, storage_client, history_bucket, workers=8, checksum=True):
+        self._storage_client = storage_client
+        self._history_bucket = history_bucket
+        self._workers = workers
+        self._checksum = checksum
+
+    def _load_json(self, bucket_name, blob_name):
+        try:
+            return json.loads(self._storage_client.bucket(bucket_name).blob(blob_name).download_as_bytes())
+        except NotFound:
+            return None
+
+    def _history_blob(self, database_name):
+        return f"{VERIFY_HISTORY_PREFIX}/{database_name}.json"
+
+    # Fungsi untuk verifikasi. engine terhubung ke database yang diverifikasi.
+    # Mengembalikan daftar masalah dan melempar RuntimeError jika ada masalah.
+    def verify(self, engine, database_name, bucket_name=None, file_name=None):
+        started = time.monotonic()
+        actual = collect_table_stats(engine, workers=self._workers, checksum=self._checksum)
+
+        manifest = self._load_json(bucket_name, manifest_name(file_name)) if bucket_name and file_name else None
+        if manifest:
+            problems = compare_stats(actual, manifest['tables'], exact=True)
+            source = 'manifest backup'
+        else:
+            previous = self._load_json(self._history_bucket, self._history_blob(database_name))
+            problems = compare_stats(actual, previous['tables'], exact=False) if previous else []
+            source = 'restore sebelumnya' if previous else 'tidak ada acuan'
+
+        elapsed = time.monotonic() - started
+        if problems:
+            for problem in problems:
+                logging.error(f"Verifikasi {database_name}: {problem}")
+            raise RuntimeError(f"Verifikasi {database_name} gagal ({len(problems)} masalah, acuan: {source})")
+
+        # Simpan hasil sebagai acuan restore berikutnya
+        self._storage_client.bucket(self._history_bucket).blob(self._history_blob(database_name)).upload_from_string(
+            json.dumps({'database': database_name, 'tables': actual}), content_type='application/json'
+        )
+        logging.info(f"Verifikasi {database_name} OK: {len(actual)} tabel, acuan: {source}, {elapsed:.1f} detik")
+        return actual
+
+
+# Fungsi untuk membuat manifest dari database sumber (dijalankan saat backup dibuat)
+def build_manifest(engine, database_name, workers=8):
+    return {'database': database_name, 'tables': collect_table_stats(engine, workers=workers, checksum=True)}
@@ -0,0 +1,136 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import sqlalchemy
+from tsql import quote_name, quote_table, autocommit_connection, fetch_all
+
+# Query untuk mengambil daftar tabel user
+TABLES_QUERY = """
+SELECT s.name, t.name
+FROM sys.tables t
+JOIN sys.schemas s ON s.schema_id = t.schema_id
+WHERE t.is_ms_shipped = 0
+"""
+
+# Query untuk mencari index yang terfragmentasi (mode LIMITED agar cepat)
+FRAGMENTED_INDEXES_QUERY = """
+SELECT s.name, t.name, i.name, ps.avg_fragmentation_in_percent, ps.page_count
+FROM sys.dm_db_index_physical_stats(DB_ID(), NULL, NULL, NULL, 'LIMITED') ps
+JOIN sys.indexes i ON i.object_id = ps.object_id AND i.index_id = ps.index_id
+JOIN sys.tables t ON t.object_id = ps.object_id
+JOIN sys.schemas s ON s.schema_id = t.schema_id
+WHERE i.name IS NOT NULL
+  AND ps.alloc_unit_type_desc = 'IN_ROW_DATA'
+  AND ps.avg_fragmentation_in_percent >= :threshold
+  AND ps.page_count >= :min_pages
+ORDER BY ps.page_count DESC
+"""
+
+# Jumlah page yang dibaca oleh session saat ini
+SESSION_READS_QUERY = "SELECT reads, logical_reads FROM sys.dm_exec_sessions WHERE session_id = @@SPID"
+
+
+# Fungsi untuk menjalankan satu perintah dan mengukur waktu serta page yang dibaca
+def _run_measured(engine, label, query):
+    with autocommit_connection(engine) as connection:
+        reads_before, logical_before = fetch_all(connection, SESSION_READS_QUERY)[0]
+        started = time.monotonic()
+        result = connection.execute(sqlalchemy.text(query))
+        if result.returns_rows:
+            # Hasil query priming harus dibaca habis supaya semua page benar-benar dibaca
+            for _ in result:
+                pass
+        elapsed = time.monotonic() - started
+        reads_after, logical_after = fetch_all(connection, SESSION_READS_QUERY)[0]
+    return {
+        'label': label,
+        'seconds': round(elapsed, 3),
+        'physical_reads': reads_after - reads_before,
+        'logical_reads': logical_after - logical_before,
+    }
+
+
+# Tahap warm-up setelah restore: refresh statistik, rebuild index yang terfragmentasi,
+# dan priming buffer pool, supaya query produksi pertama tidak lambat.
+class PostRestoreWarmup:
+    def __init__(self, engine, workers=4, fullscan=False, fragmentation_threshold=30,
+                 min_index_pages=1000, hot_tables=None, priming_queries=None):
+        self._engine = engine  # Engine yang terhubung ke database hasil restore
+        self._workers = workers
+        self._fullscan = fullscan
+        self._fragmentation_threshold = fragmentation_threshold
+        self._min_index_pages = min_index_pages
+        self._hot_tables = hot_tables or []  # Contoh: ['dbo.orders', 'dbo.customers']
+        self._priming_queries = priming_queries or []
+
+    def _parallel(self, tasks):
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = [executor.submit(_run_measured, self._engine, label, query) for label, query in tasks]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logging.error(f"Warm-up gagal: {e}")
+            return results
+
+    def _tables(self):
+        with autocommit_connection(self._engine) as connection:
+            return [tuple(row) for row in fetch_all(connection, TABLES_QUERY)]
+
+    # Fungsi untuk update statistik semua tabel secara paralel
+    def update_statistics(self):
+        option = ' WITH FULLSCAN' if self._fullscan else ''
+        tasks = [
+            (f"{schema}.{table}", f"UPDATE STATISTICS {quote_table(schema, table)}{option}")
+            for schema, table in self._tables()
+        ]
+        return self._parallel(tasks)
+
+    # Fungsi untuk rebuild index yang fragmentasinya tinggi
+    def rebuild_fragmented_indexes(self):
+        with autocommit_connection(self._engine) as connection:
+            indexes = fetch_all(
+                connection, FRAGMENTED_INDEXES_QUERY,
+                threshold=self._fragmentation_threshold, min_pages=self._min_index_pages,
+            )
+        tasks = [
+            (f"{schema}.{table}.{index} ({fragmentation:.0f}%)",
+             f"ALTER INDEX {quote_name(index)} ON {quote_table(schema, table)} REBUILD")
+            for schema, table, index, fragmentation, _ in indexes
+        ]
+        return self._parallel(tasks)
+
+    # Fungsi untuk memuat tabel panas dan menjalankan query priming ke buffer pool
+    def prime(self):
+        tasks = []
+        for name in self._hot_tables:
+            schema, _, table = name.rpartition('.')
+            # COUNT_BIG dengan INDEX(0) memaksa scan clustered index/heap
+            tasks.append((name, f"SELECT COUNT_BIG(*) FROM {quote_table(schema or 'dbo', table)} WITH (INDEX(0))"))
+        for i, query in enumerate(self._priming_queries, start=1):
+            tasks.append((f"query_{i}", query))
+        return self._parallel(tasks)
+
+    # Fungsi untuk menjalankan seluruh tahap warm-up dan membuat laporan
+    def run(self):
+        report = {}
+        for stage, step in (
+            ('update_statistics', self.update_statistics),
+            ('rebuild_indexes', self.rebuild_fragmented_indexes),
+            ('prime', self.prime),
+        ):
+            started = time.monotonic()
+            results = step()
+            report[stage] = {
+                'seconds': round(time.monotonic() - started, 3),
+                'items': len(results),
+                'physical_reads': sum(r['physical_reads'] for r in results),
+                'logical_reads': sum(r['logical_reads'] for r in results),
+                'details': results,
+            }
+            logging.info(
+                f"Warm-up {stage}: {report[stage]['items']} item, {report[stage]['seconds']} detik, "
+                f"{report[stage]['physical_reads']} page dibaca dari disk"
+            )
+        return report